@@ -9,4 +9,4 @@ budget_bp = Blueprint(
     static_url_path='/budget/static'
 )
 
-from . import routes
+from . import routes, cli
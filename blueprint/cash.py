@@ -0,0 +1,135 @@
+"""Cash position: running balance over the ledger, projected balance and runway.
+
+Balances are read from `balance_checkpoints` (see rollups.py) plus the
+transactions since the nearest checkpoint, so no read scans more than a
+month of the ledger. `BUDGET_OPENING_BALANCE` is the cash on hand before
+the first recorded transaction.
+"""
+from decimal import Decimal
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select, func
+from .models import db, Transaction, BalanceCheckpoint
+from .rollups import rebuild_balance_checkpoints, write_balance_checkpoints, next_checkpoint
+from .utils import get_forecast_data
+
+CASH_HISTORY_WEEKS = (13, 26, 52)
+RUNWAY_MONTHS = 3
+
+def opening_balance():
+    return Decimal(str(current_app.config.get('BUDGET_OPENING_BALANCE') or 0))
+
+def ensure_checkpoints(through=None):
+    """Add checkpoints for months that have started since the last one, and for
+    months before the first one if older transactions have been entered since.
+
+    Each new checkpoint is the previous one plus that month's transactions.
+    An empty table is rebuilt from the ledger. The caller commits.
+    """
+    through = (through or datetime.utcnow().date()).replace(day=1)
+    first, last = db.session.execute(
+        select(func.min(BalanceCheckpoint.checkpoint_date), func.max(BalanceCheckpoint.checkpoint_date))
+    ).one()
+    if last is None:
+        return rebuild_balance_checkpoints(through)
+
+    added = 0
+    earliest = db.session.scalar(select(func.min(Transaction.date)))
+    if earliest is not None and earliest < first:
+        # Only the backdated entries ahead of the first checkpoint are read.
+        added += write_balance_checkpoints(first - timedelta(days=1), before=first)
+
+    last = db.session.get(BalanceCheckpoint, last)
+    checkpoint, balance = last.checkpoint_date, last.balance
+    while checkpoint < through:
+        balance += _ledger_sum(checkpoint, next_checkpoint(checkpoint) - timedelta(days=1))
+        checkpoint = next_checkpoint(checkpoint)
+        db.session.add(BalanceCheckpoint(checkpoint_date=checkpoint, balance=balance))
+        added += 1
+    return added
+
+def _ledger_sum(start, end):
+    """Sum of transactions dated `start`..`end` (start=None for everything up to `end`)."""
+    query = select(func.coalesce(func.sum(Transaction.amount), 0)).where(Transaction.date <= end)
+    if start is not None:
+        query = query.where(Transaction.date >= start)
+    return Decimal(str(db.session.scalar(query))).quantize(Decimal('0.01'))
+
+def _checkpoint_before(day):
+    """(checkpoint date, balance) of the latest checkpoint on or before `day`; (None, 0) if there is none."""
+    row = db.session.execute(
+        select(BalanceCheckpoint.checkpoint_date, BalanceCheckpoint.balance)
+        .where(BalanceCheckpoint.checkpoint_date <= day)
+        .order_by(BalanceCheckpoint.checkpoint_date.desc()).limit(1)
+    ).first()
+    return (row[0], Decimal(str(row[1]))) if row else (None, Decimal('0'))
+
+def balance_on(day):
+    """Cash balance at the end of `day`."""
+    checkpoint, balance = _checkpoint_before(day)
+    return opening_balance() + balance + _ledger_sum(checkpoint, day)
+
+def balance_timeline(start, end, step_days=7):
+    """(dates, balances) at the end of every `step_days`-th day from `start` through `end`.
+
+    Seeded with the balance the day before `start`, then one windowed query
+    (a running SUM over daily totals) for the range itself.
+    """
+    base = balance_on(start - timedelta(days=1))
+    daily = func.sum(Transaction.amount)
+    running = db.session.execute(
+        select(Transaction.date, func.sum(daily).over(order_by=Transaction.date))
+        .where(Transaction.date.between(start, end))
+        .group_by(Transaction.date)
+        .order_by(Transaction.date)
+    ).all()
+
+    dates, balances = [], []
+    i, total = 0, Decimal('0')
+    day = start + timedelta(days=step_days - 1)
+    while day <= end:
+        while i < len(running) and running[i][0] <= day:
+            total = Decimal(str(running[i][1]))
+            i += 1
+        dates.append(day)
+        balances.append((base + total).quantize(Decimal('0.01')))
+        day += timedelta(days=step_days)
+    return dates, balances
+
+def monthly_burn(months=RUNWAY_MONTHS):
+    """Average net outflow per month over the last `months` complete months (negative when cash grew)."""
+    this_month = datetime.utcnow().date().replace(day=1)
+    start = this_month
+    for _ in range(months):
+        start = (start - timedelta(days=1)).replace(day=1)
+    _, start_balance = _checkpoint_before(start)
+    _, end_balance = _checkpoint_before(this_month)
+    return ((start_balance - end_balance) / months).quantize(Decimal('0.01'))
+
+def cash_position(history_weeks=26, forecast_weeks=13):
+    """Everything the Cash page shows: balance history, projection, burn and runway."""
+    ensure_checkpoints()
+    today = datetime.utcnow().date()
+    history_dates, history = balance_timeline(today - timedelta(weeks=history_weeks) + timedelta(days=1), today)
+    current = balance_on(today)
+
+    # Project forward with the same retainer/recurring forecast as the dashboard.
+    forecast = get_forecast_data(weeks=forecast_weeks, granularity='week')
+    projected, balance = [], current
+    for income, expenses in zip(forecast['income'], forecast['expenses']):
+        balance += Decimal(str(income)) - Decimal(str(expenses))
+        projected.append(balance.quantize(Decimal('0.01')))
+    cash_out = next((label for label, value in zip(forecast['labels'], projected) if value < 0), None)
+
+    burn = monthly_burn()
+    return {
+        'current': current,
+        'history_labels': [d.strftime('%b %d') for d in history_dates],
+        'history': [float(v) for v in history],
+        'forecast_labels': forecast['labels'],
+        'projected': [float(v) for v in projected],
+        'projected_end': projected[-1] if projected else current,
+        'cash_out': cash_out,
+        'burn': burn,
+        'runway_months': (current / burn).quantize(Decimal('0.1')) if burn > 0 and current > 0 else None,
+    }
@@ -0,0 +1,197 @@
+"""Learned categorization for imported rows.
+
+A token-frequency model: for every description token it counts the
+categories, pass-through flags and projects of the ledger entries it
+appeared in. Categories are predicted with multinomial naive Bayes over
+those counts; pass-through and projects by majority vote of the tokens.
+
+The model is a small JSON file that is updated incrementally as entries are
+saved and deleted. Retraining over the whole ledger only happens from
+`flask budget train-categorizer`.
+"""
+import os
+import json
+import math
+import threading
+from flask import current_app
+from sqlalchemy import select, update
+from .models import db, Transaction, ImportRow, transaction_projects
+from .utils import normalize_description
+from .importers import amount_sign
+
+MAX_VOCABULARY = 20000
+TRAINING_CHUNK_SIZE = 1000
+
+_lock = threading.Lock()
+_cache = {'path': None, 'mtime': None, 'model': None, 'tables': None}
+
+def tokenize(description):
+    """Distinct description tokens, minus bare numbers and single characters."""
+    return {token for token in normalize_description(description).split() if len(token) > 1 and not token.isdigit()}
+
+def _empty_model():
+    # tokens: {token: {'n': docs, 'pt': pass-through docs, 'c': {category: docs}, 'p': {project_id: docs}}}
+    return {'docs': 0, 'categories': {}, 'category_tokens': {}, 'tokens': {}}
+
+def model_path():
+    path = current_app.config.get('BUDGET_CATEGORIZER_PATH')
+    return path or os.path.join(current_app.instance_path, 'budget_categorizer.json')
+
+def _build_tables(model):
+    """Log-likelihood lookups used by `suggest`, derived once per model load."""
+    vocabulary = max(len(model['tokens']), 1)
+    categories = model['categories']
+    priors = {c: math.log(n / model['docs']) for c, n in categories.items() if n}
+    unseen = {c: -math.log(model['category_tokens'].get(c, 0) + vocabulary) for c in categories}
+    return {'priors': priors, 'unseen': unseen}
+
+def load_model():
+    """The current model, re-read only when the file on disk has changed."""
+    path = model_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        mtime = None
+    if _cache['path'] != path or _cache['mtime'] != mtime or _cache['model'] is None:
+        model = _empty_model()
+        if mtime is not None:
+            with open(path, encoding='utf-8') as f:
+                model = json.load(f)
+        _cache.update(path=path, mtime=mtime, model=model, tables=_build_tables(model))
+    return _cache['model']
+
+def save_model(model):
+    """Write the model atomically so readers never see a partial file."""
+    path = model_path()
+    if len(model['tokens']) > MAX_VOCABULARY:
+        # Drop one-off tokens first; they carry almost no signal.
+        model['tokens'] = {t: stats for t, stats in model['tokens'].items() if stats['n'] > 1}
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(model, f, separators=(',', ':'))
+    os.replace(tmp_path, path)
+    _cache.update(path=path, mtime=os.path.getmtime(path), model=model, tables=_build_tables(model))
+
+def _bump(counts, key, delta):
+    """Add `delta` to counts[key], dropping the key once it reaches zero."""
+    value = counts.get(key, 0) + delta
+    if value > 0:
+        counts[key] = value
+    else:
+        counts.pop(key, None)
+
+def _learn_into(model, entries, sign=1):
+    for description, category, is_pass_through, project_ids in entries:
+        if not category:
+            continue
+        tokens = tokenize(description)
+        model['docs'] += sign
+        _bump(model['categories'], category, sign)
+        _bump(model['category_tokens'], category, sign * len(tokens))
+        for token in tokens:
+            stats = model['tokens'].setdefault(token, {'n': 0, 'pt': 0, 'c': {}, 'p': {}})
+            stats['n'] += sign
+            stats['pt'] += sign if is_pass_through else 0
+            _bump(stats['c'], category, sign)
+            for pid in project_ids:
+                _bump(stats['p'], str(pid), sign)
+            if stats['n'] <= 0:
+                del model['tokens'][token]
+
+def learn(entries, sign=1):
+    """Fold saved entries into the model on disk; sign=-1 takes deleted entries back out.
+
+    `entries` are (description, category, is_pass_through, project_ids)
+    tuples. Call after the ledger commit, so the model only learns what was
+    actually saved.
+    """
+    entries = list(entries)
+    if not entries:
+        return
+    try:
+        with _lock:
+            model = load_model()
+            _learn_into(model, entries, sign)
+            save_model(model)
+    except (OSError, ValueError):
+        # The entries are already saved; a stale model only costs suggestion quality.
+        current_app.logger.exception('Could not update the categorization model.')
+
+def suggest(description, sign=0):
+    """(category, is_pass_through, project_ids) for a description, or None if no token is known.
+
+    The saved amount takes its sign from the category, so with `sign` set
+    only consistent categories are scored: Income for a credit (1), anything
+    else for a debit (-1). None if the model knows no such category.
+    """
+    model = load_model()
+    tables = _cache['tables']
+    known = [model['tokens'][t] for t in tokenize(description) if t in model['tokens']]
+    if not known:
+        return None
+
+    scores = {}
+    for category, prior in tables['priors'].items():
+        if (sign > 0 and category != 'Income') or (sign < 0 and category == 'Income'):
+            continue
+        unseen = tables['unseen'][category]
+        score = prior
+        for stats in known:
+            # Laplace-smoothed P(token | category) = (count + 1) / (category tokens + vocabulary)
+            score += math.log(stats['c'].get(category, 0) + 1) + unseen
+        scores[category] = score
+    if not scores:
+        return None
+    category = max(scores, key=scores.get)
+
+    docs = sum(stats['n'] for stats in known)
+    is_pass_through = sum(stats['pt'] for stats in known) * 2 > docs
+    project_votes = {}
+    for stats in known:
+        for pid, n in stats['p'].items():
+            project_votes[pid] = project_votes.get(pid, 0) + n
+    project_ids = sorted(int(pid) for pid, n in project_votes.items() if n * 2 > docs)
+    return category, is_pass_through, project_ids
+
+def suggest_for_batch(batch):
+    """Pre-fill category, pass-through and projects on a batch's staged rows. Returns rows filled."""
+    filled = []
+    for row_id, description, amount_raw in db.session.execute(
+        select(ImportRow.id, ImportRow.description, ImportRow.amount_raw).where(ImportRow.batch_id == batch.id)
+    ):
+        guess = suggest(description, amount_sign(amount_raw))
+        if guess:
+            category, is_pass_through, project_ids = guess
+            filled.append({
+                'id': row_id,
+                'category': category,
+                'is_pass_through': is_pass_through,
+                'project_ids': ','.join(str(pid) for pid in project_ids)
+            })
+    if filled:
+        db.session.execute(update(ImportRow), filled)
+    return len(filled)
+
+def train_from_ledger():
+    """Rebuild the model from every manually categorized ledger entry. Offline use only."""
+    links = {}
+    for transaction_id, project_id in db.session.execute(
+        select(transaction_projects.c.transaction_id, transaction_projects.c.project_id)
+    ):
+        links.setdefault(transaction_id, []).append(project_id)
+
+    model = _empty_model()
+    entries = db.session.execute(
+        select(Transaction.id, Transaction.description, Transaction.category, Transaction.is_pass_through)
+        # Recurring postings repeat their template; they would drown out real history.
+        .where(Transaction.recurring_transaction_id.is_(None))
+        .execution_options(yield_per=TRAINING_CHUNK_SIZE)
+    )
+    _learn_into(model, (
+        (description, category, is_pass_through, links.get(transaction_id, []))
+        for transaction_id, description, category, is_pass_through in entries
+    ))
+    with _lock:
+        save_model(model)
+    return model['docs']
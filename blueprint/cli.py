@@ -0,0 +1,101 @@
+import click
+from . import budget_bp
+from .models import db, ScheduledOccurrence
+from .utils import process_recurring_transactions, extend_schedule, rebuild_allocations, rebuild_fingerprints, bump_ledger_version
+from .rollups import rebuild_rollup, rebuild_time_rollup, rebuild_balance_checkpoints
+from .search import rebuild_search_index
+from .forecasting import refit_forecast
+from .categorizer import train_from_ledger
+from .migrations import upgrade_database, applied_versions, MIGRATIONS
+from .diagnostics import route_queries, explain_query_plan
+
+# Commands live under the blueprint's CLI group: `flask budget <command>`.
+
+@budget_bp.cli.command('run-recurring')
+@click.option('--batch-size', type=int, default=None, help='Recurring templates processed per commit.')
+def run_recurring(batch_size):
+    """Post every due recurring transaction to the ledger."""
+    created = process_recurring_transactions(batch_size=batch_size)
+    click.echo(f'Created {created} recurring transaction(s).')
+
+@budget_bp.cli.command('rebuild-schedule')
+def rebuild_schedule():
+    """Re-materialize scheduled occurrences for every recurring template."""
+    ScheduledOccurrence.query.delete()
+    added = extend_schedule()
+    db.session.commit()
+    click.echo(f'Scheduled {added} occurrence(s).')
+
+@budget_bp.cli.command('rebuild-allocations')
+def rebuild_allocations_command():
+    """Backfill equal-split project allocations from transaction_projects."""
+    written = rebuild_allocations()
+    # Project shares moved, so the per-project rollup rows and ledger caches follow.
+    rebuild_rollup()
+    bump_ledger_version()
+    db.session.commit()
+    click.echo(f'Wrote {written} allocation(s).')
+
+@budget_bp.cli.command('rebuild-rollup')
+def rebuild_rollup_command():
+    """Recompute the monthly ledger rollup and the weekly/monthly time rollup."""
+    written = rebuild_rollup()
+    bump_ledger_version()
+    time_written = rebuild_time_rollup()
+    db.session.commit()
+    click.echo(f'Wrote {written} ledger rollup row(s) and {time_written} time rollup row(s).')
+
+@budget_bp.cli.command('rebuild-balances')
+def rebuild_balances_command():
+    """Recompute the monthly balance checkpoints behind the cash position."""
+    written = rebuild_balance_checkpoints()
+    db.session.commit()
+    click.echo(f'Wrote {written} balance checkpoint(s).')
+
+@budget_bp.cli.command('refit-forecast')
+@click.option('--full', is_flag=True, help='Discard the fitted state and refit from the first ledger week.')
+def refit_forecast_command(full):
+    """Fold closed weeks into the history-based forecast baselines."""
+    weeks = refit_forecast(full=full)
+    db.session.commit()
+    click.echo(f'Fitted {weeks} week(s).')
+
+@budget_bp.cli.command('rebuild-fingerprints')
+def rebuild_fingerprints_command():
+    """Recompute duplicate-detection fingerprints and the description trigram index."""
+    indexed = rebuild_fingerprints()
+    db.session.commit()
+    click.echo(f'Indexed {indexed} transaction(s).')
+
+@budget_bp.cli.command('rebuild-search')
+def rebuild_search_command():
+    """Rebuild the full-text search index from the transactions table."""
+    indexed = rebuild_search_index()
+    db.session.commit()
+    click.echo(f'Indexed {indexed} transaction(s).')
+
+@budget_bp.cli.command('train-categorizer')
+def train_categorizer():
+    """Retrain the import categorization model from the whole ledger."""
+    trained = train_from_ledger()
+    click.echo(f'Trained on {trained} transaction(s).')
+
+@budget_bp.cli.command('migrate')
+@click.option('--status', is_flag=True, help='List migrations without applying them.')
+def migrate(status):
+    """Create missing tables and apply pending schema migrations."""
+    if status:
+        applied = applied_versions()
+        for version, description, _ in sorted(MIGRATIONS, key=lambda m: m[0]):
+            click.echo(f"[{'x' if version in applied else ' '}] {version:03d} {description}")
+        return
+    newly_applied = upgrade_database()
+    click.echo(f'Applied migrations: {newly_applied}' if newly_applied else 'Database is up to date.')
+
+@budget_bp.cli.command('explain')
+def explain():
+    """Print EXPLAIN QUERY PLAN for every route query (look for SCAN lines)."""
+    for name, statement in route_queries():
+        click.echo(name)
+        for detail in explain_query_plan(statement):
+            click.echo(f'    {detail}')
@@ -0,0 +1,72 @@
+"""EXPLAIN QUERY PLAN for the queries behind each budget route."""
+from datetime import datetime, timedelta
+from sqlalchemy import select, func
+from .models import (
+    db, Transaction, Project, TimeEntry, RecurringTransaction, ScheduledOccurrence,
+    TransactionAllocation, Asset, LedgerRollup, transaction_projects
+)
+from .utils import project_summary_query, ledger_query, LEDGER_PAGE_SIZE
+from .search import search_query
+
+def route_queries():
+    """(name, statement) pairs mirroring what the routes and jobs execute.
+
+    Sample parameters stand in for request values; the plan shape is what matters.
+    """
+    today = datetime.utcnow().date()
+    sample_cursor = (today, 1_000_000)
+    return [
+        ('dashboard: recent transactions',
+         select(Transaction).order_by(Transaction.date.desc()).limit(10)),
+        ('dashboard: active projects',
+         select(Project).where(Project.status == 'ACTIVE')),
+        ('dashboard: forecast retainers',
+         select(Project.monthly_retainer).where(Project.status == 'ACTIVE', Project.monthly_retainer > 0)),
+        ('dashboard: forecast occurrences',
+         select(ScheduledOccurrence.occurrence_date, ScheduledOccurrence.amount)
+         .where(ScheduledOccurrence.occurrence_date.between(today, today + timedelta(weeks=52)))),
+        ('dashboard/time-tracking: project hours',
+         select(TimeEntry.project_id, func.sum(TimeEntry.hours))
+         .where(TimeEntry.project_id.in_([1, 2, 3])).group_by(TimeEntry.project_id)),
+        ('projects: summary list',
+         project_summary_query(show_inactive=False, sort='margin_asc')),
+        ('projects: summary list (inactive, over planned)',
+         project_summary_query(show_inactive=True, sort='burn_desc', filter_key='over_planned')),
+        ('project details: allocation totals',
+         select(TransactionAllocation.project_id, func.sum(TransactionAllocation.amount))
+         .where(TransactionAllocation.project_id.in_([1])).group_by(TransactionAllocation.project_id)),
+        ('project details: ledger first page',
+         ledger_query(project_id=1)),
+        ('project details: ledger deep page, filtered',
+         ledger_query({'category': 'Software', 'start': today - timedelta(days=365)}, cursor=sample_cursor, project_id=1)),
+        ('ledger: search',
+         search_query('"semrush"* "invoice"*', {'start': today - timedelta(days=365)})),
+        ('project details: linked transactions (association)',
+         select(transaction_projects.c.transaction_id).where(transaction_projects.c.project_id == 1)),
+        ('time tracking: recent entries',
+         select(TimeEntry).order_by(TimeEntry.date.desc()).limit(50)),
+        ('recurring: due templates',
+         select(RecurringTransaction).where(RecurringTransaction.next_date <= today)),
+        ('recurring: due occurrences',
+         select(ScheduledOccurrence.recurring_transaction_id)
+         .where(ScheduledOccurrence.occurrence_date <= today, ScheduledOccurrence.recurring_transaction_id > 0)
+         .group_by(ScheduledOccurrence.recurring_transaction_id).limit(100)),
+        ('roi: software templates',
+         select(RecurringTransaction).where(RecurringTransaction.category == 'Software')),
+        ('reports: monthly P&L',
+         select(LedgerRollup.period, func.sum(LedgerRollup.income), func.sum(LedgerRollup.expenses))
+         .where(LedgerRollup.period >= f'{today.year - 1:04d}-{today.month:02d}').group_by(LedgerRollup.period)),
+        ('cash: balance since checkpoint',
+         select(func.sum(Transaction.amount)).where(Transaction.date.between(today.replace(day=1), today))),
+        ('cash: running balance (window)',
+         select(Transaction.date, func.sum(func.sum(Transaction.amount)).over(order_by=Transaction.date))
+         .where(Transaction.date.between(today - timedelta(weeks=26), today)).group_by(Transaction.date)),
+        ('assets: list',
+         select(Asset).order_by(Asset.purchase_date.desc())),
+    ]
+
+def explain_query_plan(statement):
+    """SQLite's EXPLAIN QUERY PLAN detail lines for a SQLAlchemy statement."""
+    sql = str(statement.compile(dialect=db.engine.dialect, compile_kwargs={'literal_binds': True}))
+    with db.engine.connect() as conn:
+        return [row[-1] for row in conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql)]
@@ -0,0 +1,159 @@
+"""History-based forecast: per-category weekly baselines fitted from the ledger.
+
+Non-recurring ledger entries are summed per category and week from the
+cached column snapshot (`pivot.ledger_columns`) and fitted with additive
+exponential smoothing: a level, 12 month-of-year seasonal offsets and an
+exponentially weighted variance of the one-step errors. The state lives in
+`category_forecasts`. A refit folds in only the weeks that have closed since
+`fitted_through`, one week at a time but vectorized across categories, so
+it ends in the same state a full refit would reach. Ledger writes dated on
+or before `fitted_through` (backdated statement imports, deletions) move
+`ledger_summary.forecast_stale_from` back, and the next refit starts over.
+
+The forecast is those baselines plus the scheduled recurring occurrences.
+Entries generated from templates are left out of the fit, so they are not
+counted twice. The band comes from the summed category variances.
+"""
+import json
+from datetime import date, datetime
+import numpy as np
+from sqlalchemy import delete, select, update, func
+from .models import db, CategoryForecast, LedgerSummary
+from .pivot import ledger_columns
+from .utils import get_forecast_data, LEDGER_SUMMARY_ID
+
+FORECAST_MODES = ('schedule', 'history')
+LEVEL_SMOOTHING = 0.2
+SEASON_SMOOTHING = 0.3
+# Normal quantile for the P10/P90 band
+BAND_Z = 1.2816
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+_EPOCH_MONDAY = date(1970, 1, 5).toordinal()
+
+def week_index(day):
+    """Weeks (Monday to Sunday) since 1970-01-05."""
+    return (day.toordinal() - _EPOCH_MONDAY) // 7
+
+def week_start(index):
+    return date.fromordinal(_EPOCH_MONDAY + 7 * index)
+
+def _months(ordinals):
+    """Month of year (0-11) for an array of day ordinals."""
+    days = np.asarray(ordinals, dtype=np.int64) - _EPOCH_ORDINAL
+    return days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64) % 12
+
+def weekly_series(first_week, last_week):
+    """(categories, totals): non-recurring net per category and week, in dollars.
+
+    `totals` has one row per category and one column per week from
+    `first_week` through `last_week`.
+    """
+    columns = ledger_columns()
+    weeks = (columns['day'].astype(np.int64) - _EPOCH_MONDAY) // 7
+    mask = ~columns['recurring'] & (weeks >= first_week) & (weeks <= last_week)
+    week_count = last_week - first_week + 1
+    category_count = len(columns['categories'])
+    index = columns['category'][mask].astype(np.int64) * week_count + (weeks[mask] - first_week)
+    totals = np.bincount(index, weights=columns['cents'][mask], minlength=category_count * week_count)
+    return list(columns['categories']), totals.reshape(category_count, week_count) / 100
+
+def fit_weeks(level, variance, seasonal, series, months):
+    """Fold weekly observations (columns of `series`) into the state arrays, in place."""
+    for week, month in enumerate(months):
+        observed = series[:, week]
+        error = observed - (level + seasonal[:, month])
+        variance += LEVEL_SMOOTHING * (error ** 2 - variance)
+        level += LEVEL_SMOOTHING * (observed - seasonal[:, month] - level)
+        seasonal[:, month] += SEASON_SMOOTHING * (observed - level - seasonal[:, month])
+
+def refit_forecast(full=False, today=None):
+    """Bring `category_forecasts` up to the last closed week; returns the number of weeks folded in.
+
+    With `full`, or when a ledger write since the last fit is dated in a
+    week already fitted, the state is discarded and refitted from the first
+    ledger week. The caller commits.
+    """
+    last_closed = week_index(today or datetime.utcnow().date()) - 1
+    stale_from = db.session.scalar(
+        select(LedgerSummary.forecast_stale_from).where(LedgerSummary.id == LEDGER_SUMMARY_ID)
+    )
+    if stale_from is not None:
+        fitted_through = db.session.scalar(select(func.max(CategoryForecast.fitted_through)))
+        full = full or (fitted_through is not None and week_index(stale_from) <= week_index(fitted_through))
+        db.session.execute(
+            update(LedgerSummary).where(LedgerSummary.id == LEDGER_SUMMARY_ID).values(forecast_stale_from=None)
+        )
+    if full:
+        db.session.execute(delete(CategoryForecast))
+    states = {row.category: row for row in CategoryForecast.query}
+    fitted = [row.fitted_through for row in states.values() if row.fitted_through]
+
+    if fitted:
+        first_week = week_index(min(fitted)) + 1
+    else:
+        columns = ledger_columns()
+        days = columns['day'][~columns['recurring']]
+        if not len(days):
+            return 0
+        first_week = (int(days.min()) - _EPOCH_MONDAY) // 7
+    if first_week > last_closed:
+        return 0
+
+    categories, series = weekly_series(first_week, last_closed)
+    keep = [i for i, category in enumerate(categories) if category in states or series[i].any()]
+    categories, series = [categories[i] for i in keep], series[keep]
+    level = np.array([states[c].level if c in states else 0.0 for c in categories])
+    variance = np.array([states[c].variance if c in states else 0.0 for c in categories])
+    seasonal = np.array([json.loads(states[c].seasonal) if c in states else [0.0] * 12 for c in categories]).reshape(-1, 12)
+
+    week_count = last_closed - first_week + 1
+    fit_weeks(level, variance, seasonal, series, _months(_EPOCH_MONDAY + 7 * np.arange(first_week, last_closed + 1)))
+
+    for i, category in enumerate(categories):
+        row = states.get(category)
+        if row is None:
+            row = CategoryForecast(category=category, weeks=0)
+            db.session.add(row)
+        row.level = float(level[i])
+        row.variance = float(variance[i])
+        row.seasonal = json.dumps(seasonal[i].tolist())
+        row.weeks = (row.weeks or 0) + week_count
+        row.fitted_through = week_start(last_closed)
+    return week_count
+
+def get_history_forecast_data(weeks=13, granularity='week'):
+    """Like `get_forecast_data`, but with income and expenses from the fitted history plus recurring items.
+
+    Adds 'mean' (expected net per bucket) and 'lower'/'upper' (its P10/P90
+    band) to the usual labels/income/expenses. Refits first if a week has
+    closed since the last fit, so the caller should commit.
+    """
+    refit_forecast()
+    forecast = get_forecast_data(weeks=weeks, granularity=granularity, retainers=False)
+    bucket_days = 1 if granularity == 'day' else 7
+    bucket_count = len(forecast['labels'])
+
+    states = CategoryForecast.query.all()
+    level = np.array([s.level for s in states]).reshape(-1, 1)
+    variance = np.array([s.variance for s in states])
+    seasonal = np.array([json.loads(s.seasonal) for s in states]).reshape(-1, 12)
+
+    # Weekly baselines scaled to the bucket; daily buckets get a seventh of a week.
+    scale = bucket_days / 7
+    today = datetime.utcnow().date().toordinal()
+    months = _months(today + bucket_days * np.arange(bucket_count))
+    baseline = (level + seasonal[:, months]) * scale
+    income = np.array(forecast['income']) + np.clip(baseline, 0, None).sum(axis=0)
+    expenses = np.array(forecast['expenses']) + np.clip(-baseline, 0, None).sum(axis=0)
+    mean = income - expenses
+    spread = BAND_Z * np.sqrt(variance.sum() * scale)
+
+    return {
+        'labels': forecast['labels'],
+        'income': np.round(income, 2).tolist(),
+        'expenses': np.round(expenses, 2).tolist(),
+        'mean': np.round(mean, 2).tolist(),
+        'lower': np.round(mean - spread, 2).tolist(),
+        'upper': np.round(mean + spread, 2).tolist(),
+    }
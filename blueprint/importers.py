@@ -0,0 +1,290 @@
+"""Server-side staging, review and commit for statement imports (parsers live in `statements`)."""
+from decimal import Decimal, InvalidOperation
+from datetime import datetime, timedelta
+from sqlalchemy import insert, select, update, func, or_
+from sqlalchemy.orm import joinedload
+from sqlalchemy.exc import SQLAlchemyError
+from .models import db, ImportBatch, ImportRow, Project, Transaction, TransactionNgram, transaction_projects
+from .rollups import rollup_entry, apply_rollup_delta
+from .utils import (
+    apply_ledger_delta, allocation_rows, allocate_transactions,
+    transaction_fingerprint, description_ngrams, index_transaction_ngrams
+)
+
+STAGING_CHUNK_SIZE = 500
+REVIEW_PAGE_SIZE = 50
+COMMIT_CHUNK_SIZE = 1000
+DATE_FORMATS = ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y')
+DATE_SAMPLE_SIZE = 200
+DUPLICATE_CHUNK_SIZE = 500
+FUZZY_DATE_WINDOW_DAYS = 3
+FUZZY_MATCH_THRESHOLD = 0.6
+
+def stage_import(rows, filename=None, chunk_size=STAGING_CHUNK_SIZE):
+    """Write parsed rows into a new ImportBatch, `chunk_size` rows per bulk INSERT."""
+    batch = ImportBatch(filename=filename)
+    db.session.add(batch)
+    db.session.flush()
+
+    chunk = []
+    line_no = 0
+    for row in rows:
+        line_no += 1
+        chunk.append({
+            'batch_id': batch.id,
+            'line_no': line_no,
+            'date_raw': (row['date'] or '').strip()[:50],
+            'description': (row['description'] or '').strip()[:255],
+            'amount_raw': (row['amount'] or '').strip()[:50],
+        })
+        if len(chunk) >= chunk_size:
+            db.session.execute(insert(ImportRow), chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(insert(ImportRow), chunk)
+
+    batch.row_count = line_no
+    return batch
+
+def review_page(batch, page, page_size=REVIEW_PAGE_SIZE):
+    """Staged rows for one review page; line numbers are contiguous, so this is an index range seek."""
+    first = (page - 1) * page_size + 1
+    return ImportRow.query.options(joinedload(ImportRow.duplicate_of)).filter(
+        ImportRow.batch_id == batch.id,
+        ImportRow.line_no.between(first, first + page_size - 1)
+    ).order_by(ImportRow.line_no).all()
+
+def _similarity(a, b):
+    """Jaccard similarity of two trigram sets."""
+    return len(a & b) / len(a | b) if a and b else 0
+
+def flag_duplicates(batch, fuzzy=True, chunk_size=DUPLICATE_CHUNK_SIZE):
+    """Mark staged rows that repeat an existing ledger entry and untick them.
+
+    Exact matches are one fingerprint IN (...) lookup per chunk of rows. With
+    `fuzzy`, rows left over are matched through the trigram index instead:
+    same amount, a date within FUZZY_DATE_WINDOW_DAYS and descriptions whose
+    trigram overlap reaches FUZZY_MATCH_THRESHOLD. Only postings for the
+    chunk's trigrams are read, so the cost follows the batch, not the ledger.
+    Returns the number of rows flagged.
+    """
+    staged = db.session.execute(
+        select(ImportRow.id, ImportRow.date_raw, ImportRow.amount_raw, ImportRow.description)
+        .where(ImportRow.batch_id == batch.id)
+        .order_by(ImportRow.line_no)
+    ).all()
+    date_format = detect_date_format([row.date_raw for row in staged[:DATE_SAMPLE_SIZE]])
+
+    keyed = []
+    for row in staged:
+        try:
+            date = parse_import_date(row.date_raw, date_format)
+            amount = abs(parse_import_amount(row.amount_raw, None)).quantize(Decimal('0.01'))
+        except ValueError:
+            # Left for the reviewer; commit_import reports it.
+            continue
+        keyed.append((row, date, amount, transaction_fingerprint(date, amount, row.description)))
+
+    updates = []
+    for start in range(0, len(keyed), chunk_size):
+        chunk = keyed[start:start + chunk_size]
+        exact = dict(db.session.execute(
+            select(Transaction.fingerprint, func.min(Transaction.id))
+            .where(Transaction.fingerprint.in_({fingerprint for *_, fingerprint in chunk}))
+            .group_by(Transaction.fingerprint)
+        ).all())
+
+        near = {}
+        unmatched = [(row, date, amount) for row, date, amount, fingerprint in chunk if fingerprint not in exact]
+        if fuzzy and unmatched:
+            grams = {row.id: description_ngrams(row.description) for row, _, _ in unmatched}
+            amounts = {amount for _, _, amount in unmatched}
+            window = timedelta(days=FUZZY_DATE_WINDOW_DAYS)
+            candidates = {}
+            for candidate in db.session.execute(
+                select(Transaction.id, Transaction.date, Transaction.amount, Transaction.description)
+                .join(TransactionNgram, TransactionNgram.transaction_id == Transaction.id)
+                .where(
+                    TransactionNgram.ngram.in_(set().union(*grams.values())),
+                    Transaction.date.between(min(d for _, d, _ in unmatched) - window, max(d for _, d, _ in unmatched) + window),
+                    or_(Transaction.amount.in_(amounts), Transaction.amount.in_({-a for a in amounts}))
+                )
+                .group_by(Transaction.id)
+            ):
+                candidates.setdefault(abs(candidate.amount), []).append(
+                    (candidate.id, candidate.date, description_ngrams(candidate.description))
+                )
+            for row, date, amount in unmatched:
+                scored = [
+                    (_similarity(grams[row.id], candidate_grams), -transaction_id)
+                    for transaction_id, candidate_date, candidate_grams in candidates.get(amount, [])
+                    if abs((candidate_date - date).days) <= FUZZY_DATE_WINDOW_DAYS
+                ]
+                if scored and max(scored)[0] >= FUZZY_MATCH_THRESHOLD:
+                    near[row.id] = -max(scored)[1]
+
+        for row, date, amount, fingerprint in chunk:
+            match_id, match = (exact[fingerprint], 'EXACT') if fingerprint in exact else (near.get(row.id), 'FUZZY')
+            updates.append({
+                'id': row.id,
+                'fingerprint': fingerprint,
+                'duplicate_of_id': match_id,
+                'duplicate_match': match if match_id else None,
+                'selected': match_id is None
+            })
+
+    if updates:
+        db.session.execute(update(ImportRow), updates)
+    return sum(1 for u in updates if u['duplicate_of_id'])
+
+def apply_review_edits(form, batch):
+    """Store the reviewer's edits for the rows posted from one review page."""
+    row_ids = [int(i) for i in form.getlist('row_id')]
+    if not row_ids:
+        return
+    for row in ImportRow.query.filter(ImportRow.batch_id == batch.id, ImportRow.id.in_(row_ids)):
+        row.selected = f'save_{row.id}' in form
+        row.date_raw = form.get(f'date_{row.id}', row.date_raw)
+        row.description = form.get(f'description_{row.id}', row.description)
+        row.amount_raw = form.get(f'amount_{row.id}', row.amount_raw)
+        row.category = form.get(f'category_{row.id}', row.category)
+        row.is_pass_through = f'is_pass_through_{row.id}' in form
+        row.project_ids = ','.join(form.getlist(f'project_ids_{row.id}'))
+
+def detect_date_format(values, formats=DATE_FORMATS):
+    """The format that parses the most sample values (first listed wins ties)."""
+    best, best_hits = formats[0], -1
+    for fmt in formats:
+        hits = 0
+        for value in values:
+            try:
+                datetime.strptime(value, fmt)
+                hits += 1
+            except (TypeError, ValueError):
+                pass
+        if hits > best_hits:
+            best, best_hits = fmt, hits
+    return best
+
+def parse_import_date(value, preferred, formats=DATE_FORMATS):
+    """Parse with the file's detected format, trying the others only if it fails."""
+    for fmt in (preferred,) + tuple(f for f in formats if f != preferred):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except (TypeError, ValueError):
+            continue
+    raise ValueError(f'Unrecognised date: {value!r}')
+
+def amount_sign(value):
+    """1 for a credit, -1 for a debit, 0 if the staged amount is zero, blank or unreadable."""
+    try:
+        amount = Decimal((value or '').replace(',', '').replace('$', '').strip())
+    except InvalidOperation:
+        return 0
+    return (amount > 0) - (amount < 0) if amount.is_finite() else 0
+
+def parse_import_amount(value, category):
+    """Decimal amount with the sign the category implies."""
+    try:
+        amount = Decimal((value or '').replace(',', '').replace('$', '').strip())
+    except InvalidOperation:
+        raise ValueError(f'Invalid amount: {value!r}')
+    # Ensure sign matches category
+    return abs(amount) if category == 'Income' else -abs(amount)
+
+def _insert_transactions(rows):
+    """Bulk insert transaction dicts plus their project links, allocations and rollup; returns the new ids."""
+    transaction_ids = db.session.execute(
+        insert(Transaction).returning(Transaction.id, sort_by_parameter_order=True),
+        [{k: v for k, v in row.items() if k != 'project_ids'} for row in rows]
+    ).scalars().all()
+    index_transaction_ngrams(zip(transaction_ids, (row['description'] for row in rows)))
+    links = [
+        {'transaction_id': transaction_id, 'project_id': project_id}
+        for transaction_id, row in zip(transaction_ids, rows)
+        for project_id in row['project_ids']
+    ]
+    allocations = [
+        allocation_rows(transaction_id, row['date'], row['amount'], row['project_ids'])
+        for transaction_id, row in zip(transaction_ids, rows)
+    ]
+    if links:
+        db.session.execute(transaction_projects.insert(), links)
+        allocate_transactions([allocation for shares in allocations for allocation in shares])
+    apply_rollup_delta(
+        rollup_entry(row['date'], row['amount'], row['category'], row['is_pass_through'], shares)
+        for row, shares in zip(rows, allocations)
+    )
+    return transaction_ids
+
+def commit_import(batch, chunk_size=COMMIT_CHUNK_SIZE):
+    """Post a batch's selected rows that are not yet saved to the ledger.
+
+    Projects are resolved and the date format detected once per batch; rows
+    go in with bulk INSERTs, `chunk_size` at a time. Each chunk runs in a
+    savepoint, and if it fails the chunk is retried row by row, each in its
+    own savepoint, so a bad row is marked ERROR without losing the rest.
+    Returns (posted, error_count), where `posted` holds the inserted rows'
+    values. The caller commits.
+    """
+    known_projects = set(db.session.execute(select(Project.id)).scalars())
+    pending = db.session.execute(
+        select(ImportRow.id, ImportRow.date_raw, ImportRow.description, ImportRow.amount_raw,
+               ImportRow.category, ImportRow.is_pass_through, ImportRow.project_ids)
+        .where(ImportRow.batch_id == batch.id, ImportRow.status != 'SAVED', ImportRow.selected.is_(True))
+        .order_by(ImportRow.line_no)
+    ).all()
+    date_format = detect_date_format([row.date_raw for row in pending[:DATE_SAMPLE_SIZE]])
+
+    saved_ids = []
+    errors = {}
+    posted = []
+    for start in range(0, len(pending), chunk_size):
+        chunk = []
+        for row in pending[start:start + chunk_size]:
+            try:
+                date = parse_import_date(row.date_raw, date_format)
+                amount = parse_import_amount(row.amount_raw, row.category)
+                chunk.append((row.id, {
+                    'date': date,
+                    'description': row.description,
+                    'amount': amount,
+                    'fingerprint': transaction_fingerprint(date, amount, row.description),
+                    'category': row.category,
+                    'is_pass_through': row.is_pass_through,
+                    'project_ids': [pid for pid in dict.fromkeys(
+                        int(pid) for pid in (row.project_ids or '').split(',') if pid
+                    ) if pid in known_projects]
+                }))
+            except ValueError as e:
+                errors[row.id] = str(e)[:255]
+        if not chunk:
+            continue
+
+        try:
+            with db.session.begin_nested():
+                _insert_transactions([values for _, values in chunk])
+            saved_ids.extend(row_id for row_id, _ in chunk)
+            posted.extend(values for _, values in chunk)
+        except SQLAlchemyError:
+            for row_id, values in chunk:
+                try:
+                    with db.session.begin_nested():
+                        _insert_transactions([values])
+                    saved_ids.append(row_id)
+                    posted.append(values)
+                except SQLAlchemyError as e:
+                    errors[row_id] = str(e.orig if getattr(e, 'orig', None) else e)[:255]
+
+    apply_ledger_delta(posted)
+    if saved_ids:
+        db.session.execute(
+            update(ImportRow).where(ImportRow.id.in_(saved_ids)).values(status='SAVED', error=None)
+            .execution_options(synchronize_session=False)
+        )
+    if errors:
+        db.session.execute(
+            update(ImportRow),
+            [{'id': row_id, 'status': 'ERROR', 'error': message} for row_id, message in errors.items()]
+        )
+    return posted, len(errors)
@@ -0,0 +1,151 @@
+"""Schema migrations for the budget database.
+
+`db.create_all()` only creates missing tables; it never adds columns or
+indexes to tables that already exist. Each step below is applied once, in
+order, and recorded in `budget_schema_migrations`. Steps are idempotent, so
+they are also safe on a database that `create_all()` just built from scratch.
+"""
+from datetime import datetime
+from sqlalchemy import inspect, text
+from .models import db
+from .utils import rebuild_allocations, rebuild_fingerprints
+from .rollups import rebuild_rollup, rebuild_time_rollup, rebuild_balance_checkpoints
+from .search import create_search_index, rebuild_search_index
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(step):
+        MIGRATIONS.append((version, description, step))
+        return step
+    return register
+
+def _columns(conn, table):
+    return {column['name'] for column in inspect(conn).get_columns(table)}
+
+def _add_column(conn, table, ddl):
+    """Add a column (given as '<name> <type>') unless the table already has it."""
+    if ddl.split()[0] not in _columns(conn, table):
+        conn.execute(text(f'ALTER TABLE {table} ADD COLUMN {ddl}'))
+
+def _create_declared_indexes(conn, tables):
+    """Create any index declared on the models for `tables` that the database lacks.
+
+    Indexes over columns a later step has yet to add are left for that step.
+    """
+    for table in tables:
+        existing = _columns(conn, table)
+        for index in db.metadata.tables[table].indexes:
+            if all(column.name in existing for column in index.columns):
+                index.create(conn, checkfirst=True)
+
+@migration(1, 'Recurring occurrence keys on transactions')
+def _recurring_occurrence_keys(conn):
+    _add_column(conn, 'transactions', 'recurring_transaction_id INTEGER REFERENCES recurring_transactions(id) ON DELETE SET NULL')
+    _add_column(conn, 'transactions', 'occurrence_date DATE')
+    _create_declared_indexes(conn, ['transactions'])
+
+@migration(2, 'Secondary indexes for ledger, recurring, time and project queries')
+def _secondary_indexes(conn):
+    _create_declared_indexes(conn, [
+        'transactions', 'transaction_projects', 'recurring_transaction_projects',
+        'recurring_transactions', 'time_entries', 'projects',
+        'transaction_allocations', 'scheduled_occurrences'
+    ])
+    # Give the query planner fresh statistics for the new indexes.
+    conn.execute(text('ANALYZE'))
+
+@migration(3, 'Backfill project allocations for linked transactions')
+def _backfill_allocations(conn):
+    # rebuild_allocations() writes the date column that step 12 introduced.
+    _add_column(conn, 'transaction_allocations', 'date DATE')
+    if not conn.execute(text('SELECT 1 FROM transaction_allocations LIMIT 1')).first():
+        rebuild_allocations()
+
+@migration(4, 'Transaction fingerprints and trigram index for duplicate detection')
+def _duplicate_detection(conn):
+    _add_column(conn, 'transactions', 'fingerprint VARCHAR(40)')
+    _add_column(conn, 'import_rows', 'fingerprint VARCHAR(40)')
+    _add_column(conn, 'import_rows', 'duplicate_of_id INTEGER REFERENCES transactions(id) ON DELETE SET NULL')
+    _add_column(conn, 'import_rows', 'duplicate_match VARCHAR(10)')
+    _create_declared_indexes(conn, ['transactions', 'transaction_ngrams'])
+    if conn.execute(text('SELECT 1 FROM transactions WHERE fingerprint IS NULL LIMIT 1')).first():
+        rebuild_fingerprints()
+
+@migration(5, 'Cleared flag on transactions for bank reconciliation')
+def _cleared_flag(conn):
+    _add_column(conn, 'transactions', 'is_cleared BOOLEAN NOT NULL DEFAULT 0')
+
+@migration(6, 'Backfill the monthly ledger rollup')
+def _backfill_rollup(conn):
+    if not conn.execute(text('SELECT 1 FROM ledger_rollup LIMIT 1')).first():
+        rebuild_rollup()
+
+@migration(7, 'Ledger version counter for cache invalidation')
+def _ledger_version(conn):
+    _add_column(conn, 'ledger_summary', 'version INTEGER NOT NULL DEFAULT 0')
+
+@migration(8, 'Full-text search index over transaction descriptions')
+def _search_index(conn):
+    create_search_index(conn)
+    rebuild_search_index()
+
+@migration(9, 'Backfill the weekly and monthly time rollup')
+def _backfill_time_rollup(conn):
+    if not conn.execute(text('SELECT 1 FROM time_rollup LIMIT 1')).first():
+        rebuild_time_rollup()
+
+@migration(10, 'Monthly balance checkpoints for the cash position')
+def _backfill_balance_checkpoints(conn):
+    if not conn.execute(text('SELECT 1 FROM balance_checkpoints LIMIT 1')).first():
+        rebuild_balance_checkpoints()
+
+@migration(11, 'Track backdated ledger writes for the history forecast')
+def _forecast_stale_from(conn):
+    _add_column(conn, 'ledger_summary', 'forecast_stale_from DATE')
+
+@migration(12, 'Allocation dates and index for project ledger pages')
+def _allocation_dates(conn):
+    _add_column(conn, 'transaction_allocations', 'date DATE')
+    conn.execute(text(
+        'UPDATE transaction_allocations SET date = '
+        '(SELECT date FROM transactions WHERE transactions.id = transaction_allocations.transaction_id) '
+        'WHERE date IS NULL'
+    ))
+    _create_declared_indexes(conn, ['transaction_allocations'])
+    conn.execute(text('ANALYZE transaction_allocations'))
+
+def _ensure_version_table(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS budget_schema_migrations '
+        '(version INTEGER PRIMARY KEY, description VARCHAR(255), applied_at DATETIME)'
+    ))
+
+def applied_versions():
+    conn = db.session.connection()
+    _ensure_version_table(conn)
+    versions = {row[0] for row in conn.execute(text('SELECT version FROM budget_schema_migrations'))}
+    db.session.commit()
+    return versions
+
+def upgrade_database():
+    """Create missing tables, then apply pending migrations. Returns the versions applied.
+
+    Steps run on the session's connection, one commit per step, so data
+    backfills can reuse the ORM helpers in `utils`.
+    """
+    db.create_all()
+    applied = applied_versions()
+    newly_applied = []
+    for version, description, step in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        conn = db.session.connection()
+        step(conn)
+        conn.execute(
+            text('INSERT INTO budget_schema_migrations (version, description, applied_at) VALUES (:v, :d, :t)'),
+            {'v': version, 'd': description, 't': datetime.utcnow()}
+        )
+        db.session.commit()
+        newly_applied.append(version)
+    return newly_applied
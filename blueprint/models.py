@@ -4,14 +4,17 @@ from datetime import datetime
 db = SQLAlchemy()
 
 # Association tables for many-to-many relationships
+# Each gets a reverse (project_id, ...) index so "everything linked to project X" is a seek.
 transaction_projects = db.Table('transaction_projects',
     db.Column('transaction_id', db.Integer, db.ForeignKey('transactions.id'), primary_key=True),
-    db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), primary_key=True),
+    db.Index('ix_transaction_projects_project', 'project_id', 'transaction_id')
 )
 
 recurring_transaction_projects = db.Table('recurring_transaction_projects',
     db.Column('recurring_transaction_id', db.Integer, db.ForeignKey('recurring_transactions.id'), primary_key=True),
-    db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    db.Column('project_id', db.Integer, db.ForeignKey('projects.id'), primary_key=True),
+    db.Index('ix_recurring_transaction_projects_project', 'project_id', 'recurring_transaction_id')
 )
 
 class Project(db.Model):
@@ -20,8 +23,8 @@ class Project(db.Model):
     name = db.Column(db.String(100), nullable=False)
     monthly_retainer = db.Column(db.Numeric(10, 2), default=0.0)
     cost_rate = db.Column(db.Numeric(10, 2), default=0.0)
-    status = db.Column(db.String(20), default='ACTIVE')  # ACTIVE, COMPLETED, CANCELLED
-    planned_hours = db.Column(db.Numeric(10, 2), default=0.0)
+    status = db.Column(db.String(20), default='ACTIVE', index=True)  # ACTIVE, COMPLETED, CANCELLED
+    planned_hours = db.Column(db.Numeric(10, 2), default=0.0)  # per month, like monthly_retainer
 
     time_entries = db.relationship('TimeEntry', backref='project', lazy=True)
 
@@ -40,18 +43,137 @@ class Transaction(db.Model):
     category = db.Column(db.String(100))
     is_pass_through = db.Column(db.Boolean, default=False)
 
+    # Set on entries generated from a RecurringTransaction; the unique pair makes posting idempotent.
+    recurring_transaction_id = db.Column(db.Integer, db.ForeignKey('recurring_transactions.id', ondelete='SET NULL'))
+    occurrence_date = db.Column(db.Date)
+    # Hash of (date, |amount|, normalized description); see utils.transaction_fingerprint.
+    fingerprint = db.Column(db.String(40))
+    # Matched to a bank statement line by reconciliation
+    is_cleared = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('uq_transactions_recurring_occurrence', 'recurring_transaction_id', 'occurrence_date', unique=True),
+        db.Index('ix_transactions_fingerprint', 'fingerprint'),
+        # Ledger pages sort by (date, id); SQLite appends the rowid to every index.
+        db.Index('ix_transactions_date', 'date'),
+        db.Index('ix_transactions_category_date', 'category', 'date'),
+        db.Index('ix_transactions_pass_through_amount', 'is_pass_through', 'amount'),
+    )
+
     def __repr__(self):
         return f'<Transaction {self.description} - {self.amount}>'
 
+class TransactionAllocation(db.Model):
+    """A transaction's share for one linked project.
+
+    Written whenever a transaction is linked to projects, so per-project totals
+    are a SUM ... GROUP BY project_id instead of re-splitting every request.
+    """
+    __tablename__ = 'transaction_allocations'
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id', ondelete='CASCADE'), primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    weight = db.Column(db.Numeric(10, 4), nullable=False, default=1)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+    # Copy of transactions.date, so a project's ledger pages walk this table's index in order
+    date = db.Column(db.Date, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_transaction_allocations_project_amount', 'project_id', 'amount'),
+        # Read backwards for newest-first pages: WHERE project_id = ? ORDER BY date DESC, transaction_id DESC
+        db.Index('ix_transaction_allocations_project_date', 'project_id', 'date', 'transaction_id'),
+    )
+
+    def __repr__(self):
+        return f'<TransactionAllocation {self.transaction_id} -> {self.project_id}: {self.amount}>'
+
+class TransactionNgram(db.Model):
+    """Inverted index of description trigrams, used to find near-duplicate transactions."""
+    __tablename__ = 'transaction_ngrams'
+    ngram = db.Column(db.String(3), primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transactions.id', ondelete='CASCADE'), primary_key=True)
+
+    __table_args__ = (
+        db.Index('ix_transaction_ngrams_transaction', 'transaction_id'),
+    )
+
+    def __repr__(self):
+        return f'<TransactionNgram {self.ngram!r} -> {self.transaction_id}>'
+
+class LedgerSummary(db.Model):
+    """Running ledger totals so the AGI gauge never has to scan `transactions`."""
+    __tablename__ = 'ledger_summary'
+    id = db.Column(db.Integer, primary_key=True)
+    total_revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    total_pass_through = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    # Incremented on every ledger write (see utils.ledger_version)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    # Earliest non-recurring entry date written since the history forecast was last fitted
+    forecast_stale_from = db.Column(db.Date)
+
+    def __repr__(self):
+        return f'<LedgerSummary revenue={self.total_revenue} pass_through={self.total_pass_through}>'
+
+class LedgerRollup(db.Model):
+    """Monthly income/expense sums per category, pass-through flag and project (0 = not linked)."""
+    __tablename__ = 'ledger_rollup'
+    period = db.Column(db.String(7), primary_key=True)  # YYYY-MM
+    category = db.Column(db.String(100), primary_key=True)
+    is_pass_through = db.Column(db.Boolean, primary_key=True)
+    project_id = db.Column(db.Integer, primary_key=True)
+    income = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    expenses = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<LedgerRollup {self.period} {self.category} project={self.project_id}>'
+
+class BalanceCheckpoint(db.Model):
+    """Sum of every transaction dated before `checkpoint_date` (the 1st of a month)."""
+    __tablename__ = 'balance_checkpoints'
+    checkpoint_date = db.Column(db.Date, primary_key=True)
+    balance = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<BalanceCheckpoint {self.checkpoint_date}: {self.balance}>'
+
+class CategoryForecast(db.Model):
+    """Exponential-smoothing state for one category's weekly non-recurring total.
+
+    `seasonal` is a JSON list of 12 additive month-of-year offsets. The state
+    covers every closed week up to and including the one starting `fitted_through`.
+    """
+    __tablename__ = 'category_forecasts'
+    category = db.Column(db.String(100), primary_key=True)
+    level = db.Column(db.Float, nullable=False, default=0)
+    variance = db.Column(db.Float, nullable=False, default=0)
+    seasonal = db.Column(db.Text, nullable=False, default='[]')
+    weeks = db.Column(db.Integer, nullable=False, default=0)
+    fitted_through = db.Column(db.Date)
+
+    def __repr__(self):
+        return f'<CategoryForecast {self.category!r} level={self.level:.2f} through {self.fitted_through}>'
+
+class TimeRollup(db.Model):
+    """Hours logged per project per week (period_start = Monday) and per month (period_start = the 1st)."""
+    __tablename__ = 'time_rollup'
+    grain = db.Column(db.String(5), primary_key=True)  # week, month
+    period_start = db.Column(db.Date, primary_key=True)
+    project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), primary_key=True)
+    hours = db.Column(db.Numeric(10, 2), nullable=False, default=0)
+    entry_count = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return f'<TimeRollup {self.grain} {self.period_start} project={self.project_id}: {self.hours}h>'
+
 class RecurringTransaction(db.Model):
     __tablename__ = 'recurring_transactions'
     id = db.Column(db.Integer, primary_key=True)
     description = db.Column(db.String(255), nullable=False)
     amount = db.Column(db.Numeric(10, 2), nullable=False)
-    category = db.Column(db.String(100))
+    category = db.Column(db.String(100), index=True)
     frequency = db.Column(db.String(50), default='MONTHLY')  # MONTHLY, ANNUAL, WEEKLY
     is_pass_through = db.Column(db.Boolean, default=False)
-    next_date = db.Column(db.Date, nullable=False, default=datetime.utcnow)
+    next_date = db.Column(db.Date, nullable=False, default=datetime.utcnow, index=True)
 
     # Relationship for projects (many-to-many)
     projects = db.relationship('Project', secondary=recurring_transaction_projects, backref='recurring_transactions')
@@ -59,6 +181,26 @@ class RecurringTransaction(db.Model):
     def __repr__(self):
         return f'<RecurringTransaction {self.description} - {self.amount} ({self.frequency})>'
 
+class ScheduledOccurrence(db.Model):
+    """Expanded future instances of each RecurringTransaction, out to a rolling horizon.
+
+    Forecasting reads these by date range; posting a due occurrence deletes its row.
+    """
+    __tablename__ = 'scheduled_occurrences'
+    id = db.Column(db.Integer, primary_key=True)
+    recurring_transaction_id = db.Column(db.Integer, db.ForeignKey('recurring_transactions.id', ondelete='CASCADE'), nullable=False)
+    occurrence_date = db.Column(db.Date, nullable=False, index=True)
+    amount = db.Column(db.Numeric(10, 2), nullable=False)
+
+    recurring_transaction = db.relationship('RecurringTransaction')
+
+    __table_args__ = (
+        db.Index('uq_scheduled_occurrences_recurring_date', 'recurring_transaction_id', 'occurrence_date', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<ScheduledOccurrence {self.recurring_transaction_id} on {self.occurrence_date}>'
+
 class TimeEntry(db.Model):
     __tablename__ = 'time_entries'
     id = db.Column(db.Integer, primary_key=True)
@@ -67,9 +209,59 @@ class TimeEntry(db.Model):
     description = db.Column(db.String(255))
     project_id = db.Column(db.Integer, db.ForeignKey('projects.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_time_entries_project_date', 'project_id', 'date'),
+        db.Index('ix_time_entries_date', 'date'),
+    )
+
     def __repr__(self):
         return f'<TimeEntry {self.hours}h for Project {self.project_id}>'
 
+class ImportBatch(db.Model):
+    """One uploaded statement, staged server-side while it is reviewed."""
+    __tablename__ = 'import_batches'
+    id = db.Column(db.Integer, primary_key=True)
+    filename = db.Column(db.String(255))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    row_count = db.Column(db.Integer, nullable=False, default=0)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, COMMITTED
+
+    def __repr__(self):
+        return f'<ImportBatch {self.id} {self.filename} ({self.row_count} rows)>'
+
+class ImportRow(db.Model):
+    """A parsed statement line plus the reviewer's edits, waiting to become a Transaction."""
+    __tablename__ = 'import_rows'
+    id = db.Column(db.Integer, primary_key=True)
+    batch_id = db.Column(db.Integer, db.ForeignKey('import_batches.id', ondelete='CASCADE'), nullable=False)
+    line_no = db.Column(db.Integer, nullable=False)  # 1-based position within the batch
+    date_raw = db.Column(db.String(50))
+    description = db.Column(db.String(255))
+    amount_raw = db.Column(db.String(50))
+    category = db.Column(db.String(100))
+    is_pass_through = db.Column(db.Boolean, nullable=False, default=False)
+    project_ids = db.Column(db.String(255), nullable=False, default='')  # comma-separated
+    selected = db.Column(db.Boolean, nullable=False, default=True)
+    status = db.Column(db.String(20), nullable=False, default='PENDING')  # PENDING, SAVED, ERROR
+    error = db.Column(db.String(255))
+    fingerprint = db.Column(db.String(40))
+    # Existing ledger entry this row appears to repeat; match is EXACT (same fingerprint) or FUZZY.
+    duplicate_of_id = db.Column(db.Integer, db.ForeignKey('transactions.id', ondelete='SET NULL'))
+    duplicate_match = db.Column(db.String(10))
+
+    duplicate_of = db.relationship('Transaction')
+
+    __table_args__ = (
+        db.Index('ix_import_rows_batch_line', 'batch_id', 'line_no'),
+    )
+
+    @property
+    def project_id_list(self):
+        return [int(pid) for pid in self.project_ids.split(',') if pid]
+
+    def __repr__(self):
+        return f'<ImportRow {self.batch_id}:{self.line_no} {self.description}>'
+
 class Asset(db.Model):
     __tablename__ = 'assets'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,164 @@
+"""Ad-hoc pivot reports over a columnar, in-memory copy of the ledger.
+
+The snapshot has one row per ledger share, with the same semantics as
+`ledger_rollup`: linked entries contribute one row per project allocation,
+unlinked entries one row under project 0. Columns are NumPy arrays (amounts
+as int64 cents, dates as day ordinals, categories as small integer codes),
+so every pivot is a handful of vectorized passes. The snapshot is rebuilt
+only when the ledger version moves; the history forecast reads it too.
+"""
+import threading
+from datetime import date
+import numpy as np
+from sqlalchemy import select, func, cast, Integer, literal, true
+from .models import db, Transaction, TransactionAllocation, Project
+from .utils import ledger_version
+
+PIVOT_DIMENSIONS = {
+    'month': 'Month',
+    'quarter': 'Quarter',
+    'year': 'Year',
+    'category': 'Category',
+    'project': 'Project',
+    'pass_through': 'Pass-Through',
+}
+PIVOT_MEASURES = {
+    'net': 'Net',
+    'income': 'Income',
+    'expenses': 'Expenses',
+    'count': 'Entries',
+}
+
+_EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+# SQLite julianday() of 0001-01-01 is 1721425.5, whose Python ordinal is 1.
+_JULIAN_OFFSET = 1721424.5
+
+_lock = threading.Lock()
+_snapshot = {'version': None, 'columns': None}
+
+def _load_columns():
+    """Read the share-level columns with two queries and pack them into arrays."""
+    day = cast(func.julianday(Transaction.date) - _JULIAN_OFFSET, Integer)
+    linked = select(TransactionAllocation.transaction_id).scalar_subquery()
+    unlinked = db.session.execute(
+        select(
+            day, cast(func.round(Transaction.amount * 100), Integer), func.coalesce(Transaction.category, ''),
+            func.coalesce(Transaction.is_pass_through, False), literal(0), true(),
+            Transaction.recurring_transaction_id.is_not(None)
+        ).where(Transaction.id.not_in(linked))
+    ).all()
+    # The first share of each transaction is its "primary" row, used for entry counts.
+    first_share = func.row_number().over(
+        partition_by=TransactionAllocation.transaction_id, order_by=TransactionAllocation.project_id
+    ) == 1
+    shares = db.session.execute(
+        select(
+            day, cast(func.round(TransactionAllocation.amount * 100), Integer), func.coalesce(Transaction.category, ''),
+            func.coalesce(Transaction.is_pass_through, False), TransactionAllocation.project_id, first_share,
+            Transaction.recurring_transaction_id.is_not(None)
+        ).join(Transaction, Transaction.id == TransactionAllocation.transaction_id)
+    ).all()
+
+    rows = unlinked + shares
+    categories = sorted({row[2] for row in rows})
+    category_codes = {name: code for code, name in enumerate(categories)}
+    return {
+        'day': np.fromiter((row[0] for row in rows), dtype=np.int32, count=len(rows)),
+        'cents': np.fromiter((row[1] for row in rows), dtype=np.int64, count=len(rows)),
+        'category': np.fromiter((category_codes[row[2]] for row in rows), dtype=np.int16, count=len(rows)),
+        'pass_through': np.fromiter((bool(row[3]) for row in rows), dtype=np.bool_, count=len(rows)),
+        'project': np.fromiter((row[4] for row in rows), dtype=np.int32, count=len(rows)),
+        'primary': np.fromiter((bool(row[5]) for row in rows), dtype=np.bool_, count=len(rows)),
+        'recurring': np.fromiter((bool(row[6]) for row in rows), dtype=np.bool_, count=len(rows)),
+        'categories': categories,
+    }
+
+def ledger_columns():
+    """The cached column snapshot, reloaded if the ledger has been written since."""
+    # Keyed by database as well, since two apps in one process may share a version number.
+    version = (str(db.engine.url), ledger_version())
+    with _lock:
+        if _snapshot['version'] != version or _snapshot['columns'] is None:
+            _snapshot.update(version=version, columns=_load_columns())
+        return _snapshot['columns']
+
+def _months(day):
+    """Months since 1970-01 for an array of day ordinals."""
+    return (day - _EPOCH_ORDINAL).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+
+def _dimension(columns, name, mask):
+    """(codes, labels) for one dimension over the masked rows."""
+    if name == 'category':
+        codes = columns['category'][mask].astype(np.int64)
+        return codes, list(columns['categories'])
+    if name == 'pass_through':
+        return columns['pass_through'][mask].astype(np.int64), ['Regular', 'Pass-Through']
+
+    if name == 'project':
+        values = columns['project'][mask].astype(np.int64)
+    elif name == 'month':
+        values = _months(columns['day'][mask])
+    elif name == 'quarter':
+        values = _months(columns['day'][mask]) // 3
+    else:
+        values = _months(columns['day'][mask]) // 12
+    keys, codes = np.unique(values, return_inverse=True)
+
+    if name == 'project':
+        names = dict(db.session.execute(select(Project.id, Project.name).where(Project.id.in_(keys.tolist()))).all())
+        labels = [names.get(pid, 'No Project') if pid else 'No Project' for pid in keys.tolist()]
+    elif name == 'month':
+        labels = [f'{1970 + k // 12:04d}-{k % 12 + 1:02d}' for k in keys.tolist()]
+    elif name == 'quarter':
+        labels = [f'{1970 + k // 4:04d}-Q{k % 4 + 1}' for k in keys.tolist()]
+    else:
+        labels = [str(1970 + k) for k in keys.tolist()]
+    return codes, labels
+
+def pivot(rows='month', cols='category', measure='net', start=None, end=None):
+    """Pivot the ledger: `rows` x `cols` dimensions, one measure, optional date range.
+
+    Returns {'row_labels', 'col_labels', 'values' (cents, list of lists),
+    'row_totals', 'col_totals', 'total'}. `cols` may be None for a single column.
+    """
+    columns = ledger_columns()
+    mask = np.ones(len(columns['cents']), dtype=np.bool_)
+    if start:
+        mask &= columns['day'] >= start.toordinal()
+    if end:
+        mask &= columns['day'] <= end.toordinal()
+
+    cents = columns['cents'][mask]
+    if measure == 'income':
+        weights = np.where(cents > 0, cents, 0)
+    elif measure == 'expenses':
+        weights = np.where(cents < 0, -cents, 0)
+    elif measure == 'count':
+        # Shares of one transaction only count once unless projects are being compared.
+        weights = np.ones_like(cents) if 'project' in (rows, cols) else columns['primary'][mask].astype(np.int64)
+    else:
+        weights = cents
+
+    row_codes, row_labels = _dimension(columns, rows, mask)
+    if cols:
+        col_codes, col_labels = _dimension(columns, cols, mask)
+    else:
+        col_codes, col_labels = np.zeros_like(row_codes), [PIVOT_MEASURES[measure]]
+
+    cells = len(row_labels) * len(col_labels)
+    # float64 sums are exact for integers below 2**53 cents.
+    grid = np.rint(np.bincount(row_codes * len(col_labels) + col_codes, weights=weights, minlength=cells))
+    grid = grid.astype(np.int64).reshape(len(row_labels), len(col_labels))
+
+    # Drop rows and columns the filter left empty (e.g. categories outside the range).
+    present_rows = np.bincount(row_codes, minlength=len(row_labels)) > 0
+    present_cols = np.bincount(col_codes, minlength=len(col_labels)) > 0
+    grid = grid[present_rows][:, present_cols]
+    return {
+        'row_labels': [label for label, keep in zip(row_labels, present_rows) if keep],
+        'col_labels': [label for label, keep in zip(col_labels, present_cols) if keep],
+        'values': grid.tolist(),
+        'row_totals': grid.sum(axis=1).tolist(),
+        'col_totals': grid.sum(axis=0).tolist(),
+        'total': int(grid.sum()),
+    }
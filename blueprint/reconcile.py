@@ -0,0 +1,91 @@
+"""Bank reconciliation: match statement lines to ledger entries and mark them cleared."""
+from decimal import Decimal, InvalidOperation
+from datetime import timedelta
+from sqlalchemy import select, update
+from .models import db, Transaction
+from .importers import detect_date_format, parse_import_date, DATE_SAMPLE_SIZE
+
+RECONCILE_TOLERANCE_DAYS = 3
+CLEAR_CHUNK_SIZE = 500
+
+def _statement_lines(rows):
+    """(date, amount, description) per parsed statement row, plus the rows that could not be read."""
+    rows = list(rows)
+    date_format = detect_date_format([row['date'] for row in rows[:DATE_SAMPLE_SIZE]])
+    lines, unreadable = [], []
+    for row in rows:
+        try:
+            date = parse_import_date(row['date'], date_format)
+            amount = Decimal(row['amount']).quantize(Decimal('0.01'))
+        except (ValueError, InvalidOperation):
+            unreadable.append(row)
+            continue
+        lines.append((date, amount, row['description']))
+    return lines, unreadable
+
+def _merge(statement, ledger, tolerance):
+    """Sort-merge one amount bucket; both sides sorted by date.
+
+    Each statement line takes the earliest unmatched ledger entry dated within
+    `tolerance` of it. Ledger entries that fall behind the window can no
+    longer match anything and are passed over for good, so a bucket costs
+    O(len(statement) + len(ledger)).
+    """
+    matches, unmatched_statement, unmatched_ledger = [], [], []
+    i = 0
+    for line in statement:
+        while i < len(ledger) and ledger[i].date < line[0] - tolerance:
+            unmatched_ledger.append(ledger[i])
+            i += 1
+        if i < len(ledger) and ledger[i].date <= line[0] + tolerance:
+            matches.append((line, ledger[i]))
+            i += 1
+        else:
+            unmatched_statement.append(line)
+    unmatched_ledger.extend(ledger[i:])
+    return matches, unmatched_statement, unmatched_ledger
+
+def reconcile_statement(rows, tolerance_days=RECONCILE_TOLERANCE_DAYS):
+    """Match parsed statement rows against the ledger and mark matched entries cleared.
+
+    Ledger entries are read once for the statement's date range (plus the
+    tolerance) through the date index, bucketed by amount (a hash join on
+    amount) and merged by date within each bucket. The caller commits.
+    """
+    lines, unreadable = _statement_lines(rows)
+    result = {'matched': [], 'unmatched_statement': [], 'unmatched_ledger': [], 'unreadable': unreadable}
+    if not lines:
+        return result
+
+    tolerance = timedelta(days=tolerance_days)
+    start = min(line[0] for line in lines)
+    end = max(line[0] for line in lines)
+    statement_buckets = {}
+    for line in sorted(lines, key=lambda l: (l[1], l[0])):
+        statement_buckets.setdefault(line[1], []).append(line)
+    ledger_buckets = {}
+    for entry in db.session.execute(
+        select(Transaction.id, Transaction.date, Transaction.amount, Transaction.description, Transaction.is_cleared)
+        .where(Transaction.date.between(start - tolerance, end + tolerance))
+        .order_by(Transaction.date, Transaction.id)
+    ):
+        ledger_buckets.setdefault(Decimal(entry.amount).quantize(Decimal('0.01')), []).append(entry)
+
+    for amount in statement_buckets.keys() | ledger_buckets.keys():
+        matches, unmatched_statement, unmatched_ledger = _merge(
+            statement_buckets.get(amount, []), ledger_buckets.get(amount, []), tolerance
+        )
+        result['matched'].extend(matches)
+        result['unmatched_statement'].extend(unmatched_statement)
+        # Entries only inside the tolerance margin are outside this statement's period.
+        result['unmatched_ledger'].extend(e for e in unmatched_ledger if start <= e.date <= end)
+
+    cleared_ids = [entry.id for _, entry in result['matched'] if not entry.is_cleared]
+    for i in range(0, len(cleared_ids), CLEAR_CHUNK_SIZE):
+        db.session.execute(
+            update(Transaction).where(Transaction.id.in_(cleared_ids[i:i + CLEAR_CHUNK_SIZE])).values(is_cleared=True)
+            .execution_options(synchronize_session=False)
+        )
+    result['unmatched_statement'].sort(key=lambda line: line[0])
+    result['unmatched_ledger'].sort(key=lambda entry: (entry.date, entry.id))
+    return result
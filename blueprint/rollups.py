@@ -0,0 +1,311 @@
+"""Monthly ledger rollup and the reports built on it.
+
+`ledger_rollup` holds one row per (month, category, pass-through, project)
+with income/expense sums and entry counts. Linked entries are rolled up
+per project from their allocation shares; unlinked entries go under
+project 0. Every amount therefore lands in the table exactly once, so
+summing over projects gives ledger totals. Write paths call
+`apply_rollup_delta` in the same DB transaction as the ledger change.
+
+`time_rollup` does the same for logged hours, per project and per week
+and month, so period AHR, margin and budget burn never re-sum
+`time_entries`.
+
+`balance_checkpoints` holds the cumulative ledger total at the start of
+each month, so a running balance is a checkpoint plus at most a month of
+transactions.
+"""
+from decimal import Decimal
+from datetime import datetime, timedelta
+from sqlalchemy import select, update, delete, func, case, literal, insert, cast, Integer
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import db, Transaction, TransactionAllocation, LedgerRollup, TimeRollup, TimeEntry, BalanceCheckpoint
+
+REPORT_MONTHS = (6, 12, 24)
+
+def period_key(date):
+    return f'{date.year:04d}-{date.month:02d}'
+
+def rollup_entry(date, amount, category, is_pass_through, allocations=()):
+    """(key, amount) deltas for one ledger entry: its project shares, or the whole amount under project 0."""
+    base = (period_key(date), category or '', bool(is_pass_through))
+    if allocations:
+        return [(base + (allocation['project_id'],), allocation['amount']) for allocation in allocations]
+    return [(base + (0,), amount)]
+
+def apply_rollup_delta(entries, sign=1):
+    """Fold rollup deltas (lists from `rollup_entry`) into `ledger_rollup`; sign=-1 removes them."""
+    totals = {}
+    for deltas in entries:
+        for key, amount in deltas:
+            income, expenses, count = totals.get(key, (Decimal('0'), Decimal('0'), 0))
+            amount = Decimal(str(amount))
+            if amount > 0:
+                income += amount
+            else:
+                expenses -= amount
+            totals[key] = (income, expenses, count + 1)
+    if not totals:
+        return
+
+    stmt = sqlite_insert(LedgerRollup)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['period', 'category', 'is_pass_through', 'project_id'],
+            set_={
+                'income': LedgerRollup.income + stmt.excluded.income,
+                'expenses': LedgerRollup.expenses + stmt.excluded.expenses,
+                'entry_count': LedgerRollup.entry_count + stmt.excluded.entry_count,
+            }
+        ),
+        [{
+            'period': period, 'category': category, 'is_pass_through': is_pass_through, 'project_id': project_id,
+            'income': income * sign, 'expenses': expenses * sign, 'entry_count': count * sign
+        } for (period, category, is_pass_through, project_id), (income, expenses, count) in totals.items()]
+    )
+    if sign < 0:
+        db.session.execute(delete(LedgerRollup).where(LedgerRollup.entry_count <= 0))
+
+def next_checkpoint(date):
+    """The first checkpoint after `date`: the 1st of the following month."""
+    return (date.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+def apply_balance_delta(transactions, sign=1):
+    """Shift every checkpoint dated after each transaction by its amount; sign=-1 removes them.
+
+    Amounts are grouped by the first checkpoint they reach, so a statement
+    spanning two years costs about 24 small UPDATEs. Transactions dated
+    after the last checkpoint touch nothing; readers add them as the delta.
+    """
+    deltas = {}
+    for t in transactions:
+        date, amount = (t['date'], t['amount']) if isinstance(t, dict) else (t.date, t.amount)
+        boundary = next_checkpoint(date)
+        deltas[boundary] = deltas.get(boundary, Decimal('0')) + Decimal(str(amount))
+    for boundary, amount in sorted(deltas.items()):
+        if amount:
+            db.session.execute(
+                update(BalanceCheckpoint).where(BalanceCheckpoint.checkpoint_date >= boundary)
+                .values(balance=BalanceCheckpoint.balance + sign * amount)
+            )
+
+def write_balance_checkpoints(through, before=None):
+    """Insert checkpoints from the first transaction's month through `through`.
+
+    Only transactions dated before `before` are read (None for all), which
+    lets the caller prepend checkpoints ahead of existing ones. Monthly sums
+    come from one GROUP BY, accumulated with a window SUM.
+    """
+    month = func.date(Transaction.date, 'start of month')
+    query = select(month, func.sum(func.sum(Transaction.amount)).over(order_by=month)).group_by(month)
+    if before is not None:
+        query = query.where(Transaction.date < before)
+    running = {
+        datetime.strptime(start, '%Y-%m-%d').date(): Decimal(str(total))
+        for start, total in db.session.execute(query)
+    }
+    if not running:
+        return 0
+
+    checkpoints = []
+    checkpoint, balance = min(running), Decimal('0')
+    while checkpoint <= through:
+        checkpoints.append({'checkpoint_date': checkpoint, 'balance': balance})
+        # Months without transactions keep the previous running total.
+        balance = running.get(checkpoint, balance)
+        checkpoint = next_checkpoint(checkpoint)
+    if checkpoints:
+        db.session.execute(insert(BalanceCheckpoint), checkpoints)
+    return len(checkpoints)
+
+def rebuild_balance_checkpoints(through=None):
+    """Recompute monthly checkpoints from the first transaction's month through `through` (default today)."""
+    db.session.execute(delete(BalanceCheckpoint))
+    return write_balance_checkpoints((through or datetime.utcnow().date()).replace(day=1))
+
+def rebuild_rollup():
+    """Recompute `ledger_rollup` from transactions and allocations (backfill)."""
+    db.session.execute(delete(LedgerRollup))
+    period = func.strftime('%Y-%m', Transaction.date)
+    category = func.coalesce(Transaction.category, '')
+    is_pass_through = func.coalesce(Transaction.is_pass_through, False)
+    linked = select(TransactionAllocation.transaction_id).scalar_subquery()
+    unlinked = (
+        select(
+            period, category, is_pass_through, literal(0),
+            func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)),
+            func.sum(case((Transaction.amount < 0, -Transaction.amount), else_=0)),
+            func.count()
+        )
+        .where(Transaction.id.not_in(linked))
+        .group_by(period, category, is_pass_through)
+    )
+    shares = (
+        select(
+            period, category, is_pass_through, TransactionAllocation.project_id,
+            func.sum(case((TransactionAllocation.amount > 0, TransactionAllocation.amount), else_=0)),
+            func.sum(case((TransactionAllocation.amount < 0, -TransactionAllocation.amount), else_=0)),
+            func.count()
+        )
+        .join(Transaction, Transaction.id == TransactionAllocation.transaction_id)
+        .group_by(period, category, is_pass_through, TransactionAllocation.project_id)
+    )
+    columns = ['period', 'category', 'is_pass_through', 'project_id', 'income', 'expenses', 'entry_count']
+    for query in (unlinked, shares):
+        db.session.execute(insert(LedgerRollup).from_select(columns, query))
+    return db.session.scalar(select(func.count()).select_from(LedgerRollup))
+
+def _first_period(months):
+    today = datetime.utcnow().date()
+    month_index = today.year * 12 + today.month - 1 - (months - 1)
+    return f'{month_index // 12:04d}-{month_index % 12 + 1:02d}'
+
+def _money(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+def monthly_pnl(months=12, project_id=None):
+    """Income, expenses, net, pass-through and AGI per month for the last `months` months.
+
+    AGI follows `compute_agi_totals`: all income minus pass-through expenses.
+    With `project_id`, only that project's allocated shares are counted.
+    """
+    query = (
+        select(
+            LedgerRollup.period,
+            func.sum(LedgerRollup.income),
+            func.sum(LedgerRollup.expenses),
+            func.sum(case((LedgerRollup.is_pass_through, LedgerRollup.expenses), else_=0))
+        )
+        .where(LedgerRollup.period >= _first_period(months))
+        .group_by(LedgerRollup.period)
+        .order_by(LedgerRollup.period)
+    )
+    if project_id is not None:
+        query = query.where(LedgerRollup.project_id == project_id)
+    rows = []
+    for period, income, expenses, pass_through in db.session.execute(query):
+        income, expenses, pass_through = _money(income), _money(expenses), _money(pass_through)
+        rows.append({
+            'period': period,
+            'label': datetime.strptime(period, '%Y-%m').strftime('%b %Y'),
+            'income': income,
+            'expenses': expenses,
+            'net': income - expenses,
+            'pass_through': pass_through,
+            'agi': income - pass_through
+        })
+    return rows
+
+def category_trends(months=12):
+    """{'periods': [...], 'categories': {category: [net per period]}} for the last `months` months."""
+    periods = []
+    values = {}
+    for period, category, net in db.session.execute(
+        select(LedgerRollup.period, LedgerRollup.category, func.sum(LedgerRollup.income - LedgerRollup.expenses))
+        .where(LedgerRollup.period >= _first_period(months))
+        .group_by(LedgerRollup.period, LedgerRollup.category)
+        .order_by(LedgerRollup.period)
+    ):
+        if not periods or periods[-1] != period:
+            periods.append(period)
+        values[(period, category)] = _money(net)
+    categories = sorted({category for _, category in values})
+    return {
+        'periods': periods,
+        'labels': [datetime.strptime(p, '%Y-%m').strftime('%b %y') for p in periods],
+        'categories': {c: [values.get((p, c), Decimal('0.00')) for p in periods] for c in categories}
+    }
+
+TIME_GRAINS = ('week', 'month')
+# Retainers and planned hours are monthly figures; a week is budgeted 12/52 of a month.
+GRAIN_SHARE = {'week': Decimal(12) / Decimal(52), 'month': Decimal(1)}
+BURN_WARNING = 80
+
+def period_start(date, grain):
+    """Monday of the week, or the 1st of the month, containing `date`."""
+    if grain == 'week':
+        return date - timedelta(days=date.weekday())
+    return date.replace(day=1)
+
+def time_rollup_entry(project_id, date, hours):
+    """(key, hours) deltas for one time entry: its week and its month."""
+    return [((grain, period_start(date, grain), int(project_id)), hours) for grain in TIME_GRAINS]
+
+def apply_time_rollup_delta(entries, sign=1):
+    """Fold time rollup deltas (lists from `time_rollup_entry`) into `time_rollup`; sign=-1 removes them."""
+    totals = {}
+    for deltas in entries:
+        for key, hours in deltas:
+            total, count = totals.get(key, (Decimal('0'), 0))
+            totals[key] = (total + Decimal(str(hours)), count + 1)
+    if not totals:
+        return
+
+    stmt = sqlite_insert(TimeRollup)
+    db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['grain', 'period_start', 'project_id'],
+            set_={
+                'hours': TimeRollup.hours + stmt.excluded.hours,
+                'entry_count': TimeRollup.entry_count + stmt.excluded.entry_count,
+            }
+        ),
+        [{
+            'grain': grain, 'period_start': start, 'project_id': project_id,
+            'hours': hours * sign, 'entry_count': count * sign
+        } for (grain, start, project_id), (hours, count) in totals.items()]
+    )
+    if sign < 0:
+        db.session.execute(delete(TimeRollup).where(TimeRollup.entry_count <= 0))
+
+def rebuild_time_rollup():
+    """Recompute `time_rollup` from time entries (backfill)."""
+    db.session.execute(delete(TimeRollup))
+    starts = {
+        'month': func.date(TimeEntry.date, 'start of month'),
+        # strftime('%w') counts from Sunday; step back to that week's Monday.
+        'week': func.date(TimeEntry.date, func.printf('-%d days', (cast(func.strftime('%w', TimeEntry.date), Integer) + 6) % 7)),
+    }
+    for grain, start in starts.items():
+        db.session.execute(insert(TimeRollup).from_select(
+            ['grain', 'period_start', 'project_id', 'hours', 'entry_count'],
+            select(literal(grain), start, TimeEntry.project_id, func.sum(TimeEntry.hours), func.count())
+            .group_by(start, TimeEntry.project_id)
+        ))
+    return db.session.scalar(select(func.count()).select_from(TimeRollup))
+
+def project_period_stats(projects, grain='month', on=None):
+    """Hours, AHR, margin and budget burn per project for the week or month containing `on`.
+
+    The retainer and planned hours are scaled to the period (see GRAIN_SHARE).
+    `burn` is None for projects without planned hours. Returns
+    (stats by project id, period start, previous period start).
+    """
+    current = period_start(on or datetime.utcnow().date(), grain)
+    previous = period_start(current - timedelta(days=1), grain)
+    project_ids = [p.id for p in projects]
+    hours = {
+        (project_id, start): Decimal(str(total))
+        for project_id, start, total in db.session.execute(
+            select(TimeRollup.project_id, TimeRollup.period_start, TimeRollup.hours)
+            .where(TimeRollup.grain == grain, TimeRollup.period_start.in_([current, previous]),
+                   TimeRollup.project_id.in_(project_ids))
+        )
+    } if project_ids else {}
+
+    share = GRAIN_SHARE[grain]
+    stats = {}
+    for p in projects:
+        period_hours = hours.get((p.id, current), Decimal('0'))
+        retainer = (p.monthly_retainer or Decimal('0')) * share
+        planned = (p.planned_hours or Decimal('0')) * share
+        cost = period_hours * (p.cost_rate or Decimal('0'))
+        stats[p.id] = {
+            'hours': period_hours,
+            'previous_hours': hours.get((p.id, previous), Decimal('0')),
+            'planned_hours': planned,
+            'ahr': retainer / period_hours if period_hours > 0 else Decimal('0'),
+            'margin': (retainer - cost) / retainer * 100 if retainer > 0 else Decimal('0'),
+            'burn': period_hours / planned * 100 if planned > 0 else None,
+        }
+    return stats, current, previous
@@ -1,17 +1,42 @@
 import os
-import csv
-import io
-from flask import render_template, request, redirect, url_for, session, flash, current_app
+import math
+import time
+from flask import render_template, request, redirect, url_for, session, flash, current_app, jsonify
 from werkzeug.security import check_password_hash
 from . import budget_bp
-from .models import db, Transaction, Project, TimeEntry, RecurringTransaction, Asset
+from .models import (
+    db, Transaction, Project, TimeEntry, RecurringTransaction, Asset, TransactionAllocation,
+    TransactionNgram, ImportBatch, ImportRow
+)
+from .statements import PARSERS, accepted_extensions, detect_parser
+from .rollups import (
+    rollup_entry, apply_rollup_delta, monthly_pnl, category_trends, REPORT_MONTHS,
+    time_rollup_entry, apply_time_rollup_delta, project_period_stats, period_start, TIME_GRAINS
+)
+from .pivot import pivot, PIVOT_DIMENSIONS, PIVOT_MEASURES
+from .search import search_transactions, SEARCH_LIMIT
+from .cash import cash_position, CASH_HISTORY_WEEKS
+from .simulation import scenario_inputs, run_simulation, DEFAULT_SCENARIO, MAX_TRIALS
+from .timesheets import (
+    FORMATS as TIMESHEET_FORMATS, import_time_csv, insert_time_entries, timesheet_entries, logged_hours, week_days
+)
+from .forecasting import get_history_forecast_data, FORECAST_MODES
+from .reconcile import reconcile_statement, RECONCILE_TOLERANCE_DAYS
+from .importers import (
+    stage_import, flag_duplicates, review_page, apply_review_edits, commit_import, REVIEW_PAGE_SIZE
+)
+from .categorizer import suggest_for_batch, learn as learn_categories
 from .utils import (
     login_required, calculate_agi, get_kansas_tax_deadlines,
-    get_forecast_data, process_recurring_transactions
+    get_forecast_data, process_recurring_transactions, apply_ledger_delta,
+    FORECAST_HORIZONS, FORECAST_GRANULARITIES, schedule_recurring, unschedule_recurring,
+    get_upcoming_occurrences, get_project_stats, allocation_rows, allocate_transactions, parse_split_weight,
+    get_project_totals, get_project_summaries, PROJECT_SORTS, PROJECT_FILTERS,
+    CATEGORIES, parse_ledger_filters, decode_ledger_cursor, ledger_page,
+    transaction_fingerprint, index_transaction_ngrams
 )
 from datetime import datetime, timedelta
 from decimal import Decimal
-from sqlalchemy import func
 
 @budget_bp.route('/login', methods=['GET', 'POST'])
 def login():
@@ -39,20 +64,30 @@ def inject_now():
 @budget_bp.route('/')
 @login_required
 def dashboard():
-    process_recurring_transactions()
+    # With the scheduler or `flask budget run-recurring` in charge, the dashboard stays read-only.
+    if current_app.config.get('BUDGET_RECURRING_ON_REQUEST', True):
+        process_recurring_transactions()
     transactions = Transaction.query.order_by(Transaction.date.desc()).limit(10).all()
     agi = calculate_agi()
     deadlines = get_kansas_tax_deadlines()
     projects = Project.query.filter_by(status='ACTIVE').all()
-    forecast_data = get_forecast_data()
+    horizon = request.args.get('horizon', current_app.config.get('BUDGET_FORECAST_WEEKS', 13), type=int)
+    if horizon not in FORECAST_HORIZONS:
+        horizon = FORECAST_HORIZONS[0]
+    granularity = request.args.get('granularity', 'week')
+    if granularity not in FORECAST_GRANULARITIES:
+        granularity = 'week'
+    mode = request.args.get('mode', 'schedule')
+    if mode not in FORECAST_MODES:
+        mode = 'schedule'
+    if mode == 'history':
+        forecast_data = get_history_forecast_data(weeks=horizon, granularity=granularity)
+        # Keep any weeks folded into the fit by the lazy refit.
+        db.session.commit()
+    else:
+        forecast_data = get_forecast_data(weeks=horizon, granularity=granularity)
 
-    project_stats = {}
-    for p in projects:
-        total_hours = db.session.query(func.sum(TimeEntry.hours)).filter(TimeEntry.project_id == p.id).scalar() or Decimal('0')
-        ahr = p.monthly_retainer / total_hours if total_hours > 0 else Decimal('0')
-        cost = total_hours * p.cost_rate
-        margin = (p.monthly_retainer - cost) / p.monthly_retainer * 100 if p.monthly_retainer > 0 else Decimal('0')
-        project_stats[p.id] = {'total_hours': total_hours, 'ahr': ahr, 'margin': margin}
+    project_stats = get_project_stats(projects)
 
     return render_template(
         'budget/dashboard.html',
@@ -62,6 +97,10 @@ def dashboard():
         projects=projects,
         project_stats=project_stats,
         forecast_data=forecast_data,
+        horizon=horizon,
+        granularity=granularity,
+        mode=mode,
+        horizons=FORECAST_HORIZONS,
         now_date=datetime.utcnow().strftime('%Y-%m-%d')
     )
 
@@ -69,28 +108,35 @@ def dashboard():
 @login_required
 def projects():
     show_inactive = request.args.get('show_inactive', '0') == '1'
-    if show_inactive:
-        projects_list = Project.query.all()
-    else:
-        projects_list = Project.query.filter_by(status='ACTIVE').all()
+    sort = request.args.get('sort', 'name')
+    if sort not in PROJECT_SORTS:
+        sort = 'name'
+    filter_key = request.args.get('filter')
+    if filter_key not in PROJECT_FILTERS:
+        filter_key = None
 
-    project_totals = {}
-    for p in projects_list:
-        # Split transactions equally among linked projects
-        total = sum(t.amount / len(t.projects) for t in p.transactions) if p.transactions else Decimal('0')
-        project_totals[p.id] = total
+    project_rows = get_project_summaries(show_inactive=show_inactive, sort=sort, filter_key=filter_key)
 
-    return render_template('budget/projects.html', projects=projects_list, show_inactive=show_inactive, project_totals=project_totals)
+    return render_template(
+        'budget/projects.html',
+        project_rows=project_rows,
+        show_inactive=show_inactive,
+        sort=sort,
+        filter_key=filter_key,
+        sorts=PROJECT_SORTS,
+        filters=PROJECT_FILTERS
+    )
 
 @budget_bp.route('/projects/<int:id>')
 @login_required
 def project_details(id):
     project = Project.query.get_or_404(id)
 
-    # Split transactions equally among linked projects
-    total_income = sum(t.amount / len(t.projects) for t in project.transactions if t.amount > 0)
-    total_expenses = sum(abs(t.amount) / len(t.projects) for t in project.transactions if t.amount < 0)
-    net_total = total_income - total_expenses
+    # Allocated (split) transaction shares for this project, summed in SQL
+    totals = get_project_totals([project.id])[project.id]
+    total_income = totals['income']
+    total_expenses = totals['expenses']
+    net_total = totals['net']
 
     # Calculate margin based on split transactions
     margin = (total_income - total_expenses) / total_income * 100 if total_income > 0 else 0
@@ -98,6 +144,9 @@ def project_details(id):
     # Get linked recurring items
     recurring_items = project.recurring_transactions
 
+    filters = parse_ledger_filters(request.args)
+    transactions, next_cursor = ledger_page(filters, project_id=project.id)
+
     return render_template(
         'budget/project_details.html',
         project=project,
@@ -105,20 +154,107 @@ def project_details(id):
         total_expenses=total_expenses,
         net_total=net_total,
         margin=margin,
-        recurring_items=recurring_items
+        recurring_items=recurring_items,
+        transactions=transactions,
+        next_url=_ledger_next_url('budget.project_ledger', next_cursor, filters, id=project.id),
+        filters=filters,
+        categories=CATEGORIES
+    )
+
+def _ledger_next_url(endpoint, next_cursor, filters, **values):
+    if not next_cursor:
+        return None
+    return url_for(endpoint, after=next_cursor, **_ledger_filter_args(filters), **values)
+
+def _ledger_filter_args(filters):
+    """Filters back in the query-string form parse_ledger_filters reads."""
+    args = {}
+    for key, value in filters.items():
+        if isinstance(value, bool):
+            value = '1' if value else '0'
+        elif hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        args[key] = str(value)
+    return args
+
+@budget_bp.route('/projects/<int:id>/ledger')
+@login_required
+def project_ledger(id):
+    project = Project.query.get_or_404(id)
+    filters = parse_ledger_filters(request.args)
+    transactions, next_cursor = ledger_page(
+        filters, cursor=decode_ledger_cursor(request.args.get('after')), project_id=project.id
+    )
+    return render_template(
+        'budget/partials/transaction_rows.html',
+        transactions=transactions,
+        next_url=_ledger_next_url('budget.project_ledger', next_cursor, filters, id=project.id),
+        show_actions=False
+    )
+
+@budget_bp.route('/ledger')
+@login_required
+def ledger():
+    filters = parse_ledger_filters(request.args)
+    q = request.args.get('q', '').strip()
+    transactions, next_url = _ledger_results(q, filters)
+    return render_template(
+        'budget/ledger.html',
+        transactions=transactions,
+        next_url=next_url,
+        filters=filters,
+        q=q,
+        categories=CATEGORIES,
+        projects=Project.query.order_by(Project.name).all()
+    )
+
+@budget_bp.route('/ledger/rows')
+@login_required
+def ledger_rows():
+    filters = parse_ledger_filters(request.args)
+    transactions, next_cursor = ledger_page(filters, cursor=decode_ledger_cursor(request.args.get('after')))
+    return render_template(
+        'budget/partials/transaction_rows.html',
+        transactions=transactions,
+        next_url=_ledger_next_url('budget.ledger_rows', next_cursor, filters),
+        show_actions=False,
+        empty_message='No transactions match these filters.'
     )
 
+@budget_bp.route('/ledger/search')
+@login_required
+def ledger_search():
+    filters = parse_ledger_filters(request.args)
+    q = request.args.get('q', '').strip()
+    transactions, next_url = _ledger_results(q, filters)
+    return render_template(
+        'budget/partials/transaction_rows.html',
+        transactions=transactions,
+        next_url=next_url,
+        show_actions=False,
+        empty_message=f'No transactions match "{q}".' if q else 'No transactions match these filters.'
+    )
+
+def _ledger_results(q, filters):
+    """Ranked search results for `q` (one page, no scroll), or the first keyset page of the ledger."""
+    if q:
+        return search_transactions(q, filters, limit=SEARCH_LIMIT), None
+    transactions, next_cursor = ledger_page(filters)
+    return transactions, _ledger_next_url('budget.ledger_rows', next_cursor, filters)
+
 @budget_bp.route('/projects/add', methods=['POST'])
 @login_required
 def add_project():
     name = request.form.get('name')
     retainer = Decimal(request.form.get('monthly_retainer', '0'))
     cost_rate = Decimal(request.form.get('cost_rate', '0'))
+    planned_hours = Decimal(request.form.get('planned_hours') or '0')
 
     new_project = Project(
         name=name,
         monthly_retainer=retainer,
         cost_rate=cost_rate,
+        planned_hours=planned_hours,
         status='ACTIVE'
     )
     db.session.add(new_project)
@@ -134,6 +270,7 @@ def update_project(id):
     project.name = request.form.get('name')
     project.monthly_retainer = Decimal(request.form.get('monthly_retainer', '0'))
     project.cost_rate = Decimal(request.form.get('cost_rate', '0'))
+    project.planned_hours = Decimal(request.form.get('planned_hours') or '0')
     project.status = request.form.get('status')
 
     db.session.commit()
@@ -145,23 +282,25 @@ def update_project(id):
 def time_tracking():
     projects = Project.query.filter_by(status='ACTIVE').all()
     time_entries = TimeEntry.query.order_by(TimeEntry.date.desc()).limit(50).all()
+    grain = _time_grain(request.args.get('grain'))
 
-    project_stats = {}
-    for p in projects:
-        total_hours = db.session.query(func.sum(TimeEntry.hours)).filter(TimeEntry.project_id == p.id).scalar() or Decimal('0')
-        ahr = p.monthly_retainer / total_hours if total_hours > 0 else Decimal('0')
-        cost = total_hours * p.cost_rate
-        margin = (p.monthly_retainer - cost) / p.monthly_retainer * 100 if p.monthly_retainer > 0 else Decimal('0')
-        project_stats[p.id] = {'total_hours': total_hours, 'ahr': ahr, 'margin': margin}
+    project_stats, period, previous_period = project_period_stats(projects, grain)
 
     return render_template(
         'budget/time_tracking.html',
         projects=projects,
         time_entries=time_entries,
         project_stats=project_stats,
+        grain=grain,
+        grains=TIME_GRAINS,
+        period=period,
+        previous_period=previous_period,
         now_date=datetime.utcnow().strftime('%Y-%m-%d')
     )
 
+def _time_grain(value):
+    return value if value in TIME_GRAINS else 'month'
+
 @budget_bp.route('/time-tracking/add', methods=['POST'])
 @login_required
 def add_time_entry():
@@ -173,30 +312,90 @@ def add_time_entry():
 
     new_entry = TimeEntry(project_id=project_id, hours=hours, date=date, description=description)
     db.session.add(new_entry)
+    apply_time_rollup_delta([time_rollup_entry(project_id, date, hours)])
     db.session.commit()
 
     if request.headers.get('HX-Request'):
         projects = Project.query.filter_by(status='ACTIVE').all()
         time_entries = TimeEntry.query.order_by(TimeEntry.date.desc()).limit(50).all()
-        project_stats = {}
-        for p in projects:
-            total_hours = db.session.query(func.sum(TimeEntry.hours)).filter(TimeEntry.project_id == p.id).scalar() or Decimal('0')
-            ahr = p.monthly_retainer / total_hours if total_hours > 0 else Decimal('0')
-            cost = total_hours * p.cost_rate
-            margin = (p.monthly_retainer - cost) / p.monthly_retainer * 100 if p.monthly_retainer > 0 else Decimal('0')
-            project_stats[p.id] = {'total_hours': total_hours, 'ahr': ahr, 'margin': margin}
+        grain = _time_grain(request.form.get('grain'))
+        project_stats, period, previous_period = project_period_stats(projects, grain)
         return render_template('budget/partials/time_entry_list.html', time_entries=time_entries) + \
                f'<div id="project-stats-container" hx-swap-oob="true">' + \
-               render_template('budget/partials/project_time_stats.html', projects=projects, project_stats=project_stats) + \
+               render_template(
+                   'budget/partials/project_time_stats.html', projects=projects, project_stats=project_stats,
+                   grain=grain, period=period, previous_period=previous_period
+               ) + \
                '</div>'
     return redirect(url_for('budget.time_tracking'))
 
+@budget_bp.route('/time-tracking/timesheet', methods=['GET', 'POST'])
+@login_required
+def timesheet():
+    try:
+        week = datetime.strptime(request.values.get('week', ''), '%Y-%m-%d').date()
+    except ValueError:
+        week = datetime.utcnow().date()
+    week_start = period_start(week, 'week')
+    projects = Project.query.filter_by(status='ACTIVE').order_by(Project.name).all()
+
+    if request.method == 'POST':
+        try:
+            entries = timesheet_entries(request.form, projects, week_start)
+        except ValueError as e:
+            flash(str(e), 'danger')
+            return redirect(url_for('budget.timesheet', week=week_start.isoformat()))
+        hours = insert_time_entries(entries)
+        db.session.commit()
+        flash(f'Logged {hours}h in {len(entries)} entries for the week of {week_start.strftime("%b %d")}.', 'success')
+        return redirect(url_for('budget.timesheet', week=week_start.isoformat()))
+
+    return render_template(
+        'budget/timesheet.html',
+        projects=projects,
+        week_start=week_start,
+        days=week_days(week_start),
+        logged=logged_hours(week_start),
+        previous_week=(week_start - timedelta(days=7)).isoformat(),
+        next_week=(week_start + timedelta(days=7)).isoformat(),
+        formats=[fmt.label for fmt in TIMESHEET_FORMATS],
+        all_projects=Project.query.order_by(Project.name).all()
+    )
+
+@budget_bp.route('/time-tracking/import', methods=['POST'])
+@login_required
+def import_time():
+    file = request.files.get('file')
+    if not file or not file.filename.lower().endswith('.csv'):
+        flash('Please upload a CSV export.', 'danger')
+        return redirect(url_for('budget.timesheet'))
+    fallback = request.form.get('fallback_project_id', type=int)
+
+    started = time.perf_counter()
+    try:
+        result = import_time_csv(file.stream, fallback_project_id=fallback)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        flash(f'Error importing time entries: {str(e)}', 'danger')
+        return redirect(url_for('budget.timesheet'))
+    elapsed = time.perf_counter() - started
+
+    flash(f'Imported {result["imported"]} {result["format"]} entries ({result["hours"]}h) in {elapsed:.1f}s.', 'success')
+    if result['unmatched']:
+        names = ', '.join(f'{name} ({count})' for name, count in result['unmatched'].most_common(5))
+        flash(f'Skipped {sum(result["unmatched"].values())} row(s) for unknown projects: {names}.', 'danger')
+    if result['unreadable']:
+        flash(f'Skipped {result["unreadable"]} row(s) with an unreadable date or duration.', 'danger')
+    return redirect(url_for('budget.time_tracking', grain='week'))
+
 @budget_bp.route('/recurring')
 @login_required
 def recurring():
     recurring_items = RecurringTransaction.query.all()
     projects = Project.query.filter_by(status='ACTIVE').all()
-    return render_template('budget/recurring.html', recurring_items=recurring_items, projects=projects)
+    upcoming = get_upcoming_occurrences(days=30)
+    return render_template('budget/recurring.html', recurring_items=recurring_items, projects=projects, upcoming=upcoming)
 
 @budget_bp.route('/recurring/add', methods=['POST'])
 @login_required
@@ -232,6 +431,8 @@ def add_recurring():
         new_recurring.projects = projects
 
     db.session.add(new_recurring)
+    db.session.flush()
+    schedule_recurring(new_recurring)
     db.session.commit()
 
     if create_immediate:
@@ -245,6 +446,7 @@ def add_recurring():
 @login_required
 def delete_recurring(id):
     recurring = RecurringTransaction.query.get_or_404(id)
+    unschedule_recurring(recurring.id)
     db.session.delete(recurring)
     db.session.commit()
     flash('Recurring transaction deleted.', 'success')
@@ -271,6 +473,108 @@ def roi():
         })
     return render_template('budget/roi.html', roi_data=roi_data)
 
+@budget_bp.route('/cash')
+@login_required
+def cash():
+    history = request.args.get('history', 26, type=int)
+    if history not in CASH_HISTORY_WEEKS:
+        history = 26
+    horizon = request.args.get('horizon', current_app.config.get('BUDGET_FORECAST_WEEKS', 13), type=int)
+    if horizon not in FORECAST_HORIZONS:
+        horizon = FORECAST_HORIZONS[0]
+    position = cash_position(history_weeks=history, forecast_weeks=horizon)
+    # New month checkpoints may have been added on the way.
+    db.session.commit()
+
+    projects = Project.query.filter(Project.status == 'ACTIVE', Project.monthly_retainer > 0).order_by(Project.name).all()
+    scenario = _scenario_args(request.args, projects)
+    simulation = None
+    if 'simulate' in request.args:
+        inputs = scenario_inputs(horizon, position['current'], churn=scenario['project_churn'])
+        simulation = run_simulation(
+            inputs, trials=scenario['trials'], late_probability=scenario['late_probability'],
+            late_days=scenario['late_days'], expense_variance=scenario['expense_variance'], seed=scenario['seed']
+        )
+
+    return render_template(
+        'budget/cash.html',
+        position=position,
+        history=history,
+        histories=CASH_HISTORY_WEEKS,
+        horizon=horizon,
+        horizons=FORECAST_HORIZONS,
+        projects=projects,
+        scenario=scenario,
+        simulation=simulation,
+        max_trials=MAX_TRIALS
+    )
+
+def _scenario_args(args, projects):
+    """Scenario parameters from the Cash page form; percentages become fractions, bad values fall back to defaults."""
+    def number(name, default):
+        value = args.get(name, type=float)
+        return value if value is not None and math.isfinite(value) else default
+
+    def percent(name, default):
+        value = number(name, None)
+        return min(max(value, 0), 100) / 100 if value is not None else default
+
+    churn = percent('churn', DEFAULT_SCENARIO['churn'])
+    seed = args.get('seed', type=int)
+    return {
+        'trials': min(max(args.get('trials', DEFAULT_SCENARIO['trials'], type=int), 100), MAX_TRIALS),
+        'churn': churn,
+        'project_churn': {p.id: percent(f'churn-{p.id}', churn) for p in projects},
+        'late_probability': percent('late', DEFAULT_SCENARIO['late_probability']),
+        'late_days': min(max(number('late_days', DEFAULT_SCENARIO['late_days']), 0), 365),
+        'expense_variance': percent('variance', DEFAULT_SCENARIO['expense_variance']),
+        'seed': seed if seed is not None and seed >= 0 else None,
+    }
+
+@budget_bp.route('/reports')
+@login_required
+def reports():
+    months = request.args.get('months', 12, type=int)
+    if months not in REPORT_MONTHS:
+        months = 12
+    pnl = monthly_pnl(months)
+    return render_template(
+        'budget/reports.html',
+        pnl=pnl,
+        trends=category_trends(months),
+        months=months,
+        report_months=REPORT_MONTHS,
+        chart_data={
+            'labels': [row['label'] for row in pnl],
+            'agi': [float(row['agi']) for row in pnl],
+            'net': [float(row['net']) for row in pnl]
+        }
+    )
+
+@budget_bp.route('/reports/pivot')
+@login_required
+def pivot_report():
+    rows = request.args.get('rows') if request.args.get('rows') in PIVOT_DIMENSIONS else 'month'
+    cols = request.args.get('cols') if request.args.get('cols') in PIVOT_DIMENSIONS else None
+    if cols == rows:
+        cols = None
+    measure = request.args.get('measure') if request.args.get('measure') in PIVOT_MEASURES else 'net'
+    filters = parse_ledger_filters(request.args)
+    table = pivot(rows, cols, measure, start=filters.get('start'), end=filters.get('end'))
+
+    if request.args.get('format') == 'json':
+        return jsonify(dict(table, rows=rows, cols=cols, measure=measure, unit='count' if measure == 'count' else 'cents'))
+    return render_template(
+        'budget/pivot.html',
+        table=table,
+        rows=rows,
+        cols=cols,
+        measure=measure,
+        filters=filters,
+        dimensions=PIVOT_DIMENSIONS,
+        measures=PIVOT_MEASURES
+    )
+
 @budget_bp.route('/assets')
 @login_required
 def assets():
@@ -304,87 +608,127 @@ def delete_asset(id):
 def import_csv():
     if request.method == 'POST':
         file = request.files.get('file')
-        if not file or not file.filename.endswith('.csv'):
-            flash('Please upload a valid CSV file.', 'danger')
+        if not file or not file.filename.lower().endswith(accepted_extensions()):
+            flash(f"Please upload a statement file ({', '.join(accepted_extensions())}).", 'danger')
+            return redirect(url_for('budget.import_csv'))
+        parser = detect_parser(file.stream)
+        if parser is None:
+            flash('Could not recognise the layout of this statement.', 'danger')
             return redirect(url_for('budget.import_csv'))
 
         try:
-            stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-            reader = csv.DictReader(stream)
-
-            pending_items = []
-            for row in reader:
-                # Expecting columns: Date, Description, Amount
-                # Flexible names
-                date_val = row.get('Date') or row.get('date')
-                desc_val = row.get('Description') or row.get('description') or row.get('Desc')
-                amount_val = row.get('Amount') or row.get('amount')
-
-                if date_val and amount_val:
-                    pending_items.append({
-                        'date': date_val,
-                        'description': desc_val,
-                        'amount': amount_val
-                    })
-
-            projects = Project.query.filter_by(status='ACTIVE').all()
-            return render_template('budget/import_review.html', items=pending_items, projects=projects)
+            batch = stage_import(parser.parse(file.stream), filename=file.filename)
+            duplicates = flag_duplicates(batch, fuzzy='fuzzy' in request.form)
+            suggest_for_batch(batch)
+            db.session.commit()
         except Exception as e:
-            flash(f'Error parsing CSV: {str(e)}', 'danger')
+            db.session.rollback()
+            flash(f'Error parsing {parser.label} statement: {str(e)}', 'danger')
             return redirect(url_for('budget.import_csv'))
+        if duplicates:
+            flash(f'{duplicates} row(s) look like transactions already in the ledger and were unchecked.', 'success')
+        return redirect(url_for('budget.import_review', batch_id=batch.id))
 
-    return render_template('budget/import.html')
+    pending_batches = ImportBatch.query.filter_by(status='PENDING').order_by(ImportBatch.created_at.desc()).all()
+    return render_template(
+        'budget/import.html',
+        pending_batches=pending_batches,
+        formats=[p.label for p in PARSERS],
+        extensions=accepted_extensions()
+    )
+
+@budget_bp.route('/import/<int:batch_id>')
+@login_required
+def import_review(batch_id):
+    batch = ImportBatch.query.get_or_404(batch_id)
+    page_count = max(1, -(-batch.row_count // REVIEW_PAGE_SIZE))
+    page = min(max(request.args.get('page', 1, type=int), 1), page_count)
+    items = review_page(batch, page)
+    projects = Project.query.filter_by(status='ACTIVE').all()
+    return render_template(
+        'budget/import_review.html',
+        batch=batch,
+        items=items,
+        page=page,
+        page_count=page_count,
+        projects=projects,
+        categories=CATEGORIES
+    )
+
+@budget_bp.route('/import/<int:batch_id>/page', methods=['POST'])
+@login_required
+def update_import_page(batch_id):
+    batch = ImportBatch.query.get_or_404(batch_id)
+    apply_review_edits(request.form, batch)
+    db.session.commit()
+    return redirect(url_for('budget.import_review', batch_id=batch.id, page=request.form.get('goto', 1, type=int)))
+
+@budget_bp.route('/import/<int:batch_id>/discard', methods=['POST'])
+@login_required
+def discard_import(batch_id):
+    batch = ImportBatch.query.get_or_404(batch_id)
+    ImportRow.query.filter_by(batch_id=batch.id).delete()
+    db.session.delete(batch)
+    db.session.commit()
+    flash('Import discarded.', 'success')
+    return redirect(url_for('budget.import_csv'))
 
 @budget_bp.route('/import/save', methods=['POST'])
 @login_required
 def save_import():
-    indices = request.form.getlist('import_index')
-
-    for i in indices:
-        if f'save_{i}' in request.form:
-            date_str = request.form.get(f'date_{i}')
-            description = request.form.get(f'description_{i}')
-            amount = Decimal(request.form.get(f'amount_{i}'))
-            category = request.form.get(f'category_{i}')
-            is_pass_through = f'is_pass_through_{i}' in request.form
-            project_ids = request.form.getlist(f'project_ids_{i}')
-
-            try:
-                # Ensure sign matches category
-                if category == 'Income':
-                    amount = abs(amount)
-                else:
-                    amount = -abs(amount)
-
-                # Try common date formats
-                date = None
-                for fmt in ('%Y-%m-%d', '%m/%d/%Y', '%d/%m/%Y'):
-                    try:
-                        date = datetime.strptime(date_str, fmt).date()
-                        break
-                    except: continue
-
-                if not date: date = datetime.utcnow().date()
-
-                new_transaction = Transaction(
-                    date=date,
-                    description=description,
-                    amount=amount,
-                    category=category,
-                    is_pass_through=is_pass_through
-                )
-                if project_ids:
-                    projects = Project.query.filter(Project.id.in_(project_ids)).all()
-                    new_transaction.projects = projects
-
-                db.session.add(new_transaction)
-            except Exception as e:
-                flash(f'Error saving item {description}: {str(e)}', 'danger')
-
+    batch = ImportBatch.query.get_or_404(request.form.get('batch_id', type=int))
+    # Keep the edits from the page the reviewer was on when they hit import.
+    apply_review_edits(request.form, batch)
+
+    started = time.perf_counter()
+    posted, errors = commit_import(batch)
+    if not errors:
+        batch.status = 'COMMITTED'
     db.session.commit()
-    flash('Imported transactions saved.', 'success')
+    learn_categories(
+        (row['description'], row['category'], row['is_pass_through'], row['project_ids']) for row in posted
+    )
+    saved = len(posted)
+    elapsed = time.perf_counter() - started
+    rate = (saved + errors) / elapsed if elapsed else 0
+    current_app.logger.info('Import %s: %d saved, %d errors in %.2fs (%.0f rows/sec)', batch.id, saved, errors, elapsed, rate)
+    flash(f'Imported {saved} transactions ({rate:,.0f} rows/sec).', 'success')
+    if errors:
+        # Leave the batch open so the failed rows can be fixed and saved again.
+        flash(f'{errors} row(s) could not be imported; fix them below and import again.', 'danger')
+        return redirect(url_for('budget.import_review', batch_id=batch.id))
     return redirect(url_for('budget.dashboard'))
 
+@budget_bp.route('/reconcile', methods=['GET', 'POST'])
+@login_required
+def reconcile():
+    tolerance = request.form.get('tolerance', RECONCILE_TOLERANCE_DAYS, type=int)
+    result = None
+    if request.method == 'POST':
+        file = request.files.get('file')
+        if not file or not file.filename.lower().endswith(accepted_extensions()):
+            flash(f"Please upload a statement file ({', '.join(accepted_extensions())}).", 'danger')
+            return redirect(url_for('budget.reconcile'))
+        parser = detect_parser(file.stream)
+        if parser is None:
+            flash('Could not recognise the layout of this statement.', 'danger')
+            return redirect(url_for('budget.reconcile'))
+
+        try:
+            result = reconcile_statement(parser.parse(file.stream), tolerance_days=max(tolerance, 0))
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            flash(f'Error reconciling {parser.label} statement: {str(e)}', 'danger')
+            return redirect(url_for('budget.reconcile'))
+
+    return render_template(
+        'budget/reconcile.html',
+        result=result,
+        tolerance=tolerance,
+        extensions=accepted_extensions()
+    )
+
 @budget_bp.route('/transactions/add', methods=['POST'])
 @login_required
 def add_transaction():
@@ -411,15 +755,26 @@ def add_transaction():
             amount=amount,
             date=date,
             category=category,
-            is_pass_through=is_pass_through
+            is_pass_through=is_pass_through,
+            fingerprint=transaction_fingerprint(date, amount, description)
         )
 
+        db.session.add(new_transaction)
+        db.session.flush()
+        index_transaction_ngrams([(new_transaction.id, description)])
+        allocations = []
         if project_ids:
             projects = Project.query.filter(Project.id.in_(project_ids)).all()
             new_transaction.projects = projects
+            # Optional per-project weights (weight_<project_id>); equal split by default
+            weights = {p.id: parse_split_weight(request.form.get(f'weight_{p.id}')) for p in projects}
+            allocations = allocation_rows(new_transaction.id, date, amount, [p.id for p in projects], weights)
+            allocate_transactions(allocations)
 
-        db.session.add(new_transaction)
+        apply_ledger_delta([new_transaction])
+        apply_rollup_delta([rollup_entry(date, amount, category, is_pass_through, allocations)])
         db.session.commit()
+        learn_categories([(description, category, is_pass_through, [p.id for p in new_transaction.projects])])
 
         if request.headers.get('HX-Request'):
             transactions = Transaction.query.order_by(Transaction.date.desc()).limit(10).all()
@@ -441,8 +796,23 @@ def add_transaction():
 @login_required
 def delete_transaction(id):
     transaction = Transaction.query.get_or_404(id)
+    # Recurring postings were never learned (see categorizer.train_from_ledger).
+    learned = [] if transaction.recurring_transaction_id else [(
+        transaction.description, transaction.category, transaction.is_pass_through, [p.id for p in transaction.projects]
+    )]
+    allocations = [
+        {'project_id': a.project_id, 'amount': a.amount}
+        for a in TransactionAllocation.query.filter_by(transaction_id=transaction.id)
+    ]
+    TransactionAllocation.query.filter_by(transaction_id=transaction.id).delete()
+    TransactionNgram.query.filter_by(transaction_id=transaction.id).delete()
     db.session.delete(transaction)
+    apply_ledger_delta([transaction], sign=-1)
+    apply_rollup_delta([rollup_entry(
+        transaction.date, transaction.amount, transaction.category, transaction.is_pass_through, allocations
+    )], sign=-1)
     db.session.commit()
+    learn_categories(learned, sign=-1)
 
     if request.headers.get('HX-Request'):
         transactions = Transaction.query.order_by(Transaction.date.desc()).limit(10).all()
@@ -0,0 +1,34 @@
+import threading
+from .models import db
+from .utils import process_recurring_transactions
+
+def start_recurring_scheduler(app, interval=None):
+    """Run the recurring catch-up on a daemon thread every `interval` seconds.
+
+    Disabled (returns None) unless `BUDGET_RECURRING_INTERVAL` or `interval` is set.
+    The first run happens one interval after start-up, so short-lived CLI
+    processes that build the app never race the command they were started for.
+    """
+    interval = interval or app.config.get('BUDGET_RECURRING_INTERVAL', 0)
+    if not interval:
+        return None
+
+    stop_event = threading.Event()
+
+    def run():
+        while not stop_event.wait(interval):
+            with app.app_context():
+                try:
+                    created = process_recurring_transactions()
+                    if created:
+                        app.logger.info('Recurring scheduler created %s transaction(s).', created)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception('Recurring scheduler run failed.')
+                finally:
+                    db.session.remove()
+
+    thread = threading.Thread(target=run, name='budget-recurring-scheduler', daemon=True)
+    thread.stop_event = stop_event
+    thread.start()
+    return thread
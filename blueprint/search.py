@@ -0,0 +1,78 @@
+"""Full-text search over transaction descriptions and categories.
+
+`transactions_fts` is an FTS5 external-content table: it stores only the
+inverted index and reads the text back from `transactions` by rowid.
+Triggers keep it in step with every insert, update and delete, including
+bulk statements that bypass the ORM. Prefix indexes on 2 and 3 characters
+keep type-ahead queries on index seeks.
+"""
+import re
+from sqlalchemy import select, text, literal_column, func, table, column
+from .models import db, Transaction
+from .utils import filter_ledger
+
+SEARCH_LIMIT = 100
+# Description matches outrank category matches.
+SEARCH_WEIGHTS = (4.0, 1.0)
+
+_SCHEMA = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+        description, category,
+        content='transactions', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_insert AFTER INSERT ON transactions BEGIN
+        INSERT INTO transactions_fts(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_delete AFTER DELETE ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS transactions_fts_update AFTER UPDATE OF description, category ON transactions BEGIN
+        INSERT INTO transactions_fts(transactions_fts, rowid, description, category)
+        VALUES ('delete', old.id, old.description, old.category);
+        INSERT INTO transactions_fts(rowid, description, category) VALUES (new.id, new.description, new.category);
+    END""",
+]
+
+transactions_fts = table('transactions_fts', column('rowid'), column('description'), column('category'))
+# FTS5 takes the table name itself as the MATCH target and as bm25()'s first argument.
+_fts = literal_column('transactions_fts')
+
+def create_search_index(conn):
+    """Create the FTS table and its sync triggers if they are missing."""
+    for statement in _SCHEMA:
+        conn.execute(text(statement))
+
+def rebuild_search_index():
+    """Re-read every transaction into the FTS index."""
+    db.session.execute(text("INSERT INTO transactions_fts(transactions_fts) VALUES ('rebuild')"))
+    return db.session.scalar(select(func.count()).select_from(Transaction))
+
+def match_expression(query):
+    """FTS5 MATCH string for free-text input: every word must appear, as a prefix.
+
+    Words are quoted, so FTS operators and punctuation typed by the user are
+    taken literally. Returns None when there is nothing to search for.
+    """
+    words = re.findall(r'\w+', query or '')
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+def search_query(match, filters=None, limit=SEARCH_LIMIT):
+    """SELECT for the best-ranked matches (bm25), narrowed by the usual ledger filters."""
+    rank = func.bm25(_fts, *SEARCH_WEIGHTS)
+    query = (
+        select(Transaction)
+        .join(transactions_fts, transactions_fts.c.rowid == Transaction.id)
+        .where(_fts.op('MATCH')(match))
+    )
+    return filter_ledger(query, filters or {}).order_by(rank, Transaction.date.desc()).limit(limit)
+
+def search_transactions(query, filters=None, limit=SEARCH_LIMIT):
+    """Transactions matching free-text `query`, best first; [] for an empty query."""
+    match = match_expression(query)
+    if match is None:
+        return []
+    return db.session.execute(search_query(match, filters, limit)).scalars().all()
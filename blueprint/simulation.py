@@ -0,0 +1,150 @@
+"""Monte Carlo cash-flow scenarios on top of the deterministic forecast.
+
+The forecast inputs (retainers per project, scheduled recurring items and
+today's balance) are read once and packed into NumPy arrays. Trials are
+then run in chunks, each chunk fully vectorized over its trials, and the
+chunks are spread across a process pool. Every chunk draws from its own
+child of one SeedSequence, and the chunk count does not depend on the
+pool size, so a seeded run gives the same bands on any machine.
+
+Per trial:
+- each project churns in a month drawn from its monthly churn probability,
+  and its retainers stop from that month on;
+- each incoming payment (retainer or recurring income) is late with
+  `late_probability`, by an exponentially distributed number of days;
+- each recurring expense is scaled by a mean-one lognormal factor whose
+  coefficient of variation is `expense_variance`.
+"""
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from flask import current_app
+from sqlalchemy import select
+from .models import db, Project, ScheduledOccurrence
+from .utils import retainer_occurrences
+
+SIMULATION_CHUNK_SIZE = 1000
+MAX_TRIALS = 50000
+# A chunk costs ~10ms in-process and a process pool ~50ms to start and feed,
+# so smaller runs are faster without one.
+PARALLEL_MIN_TRIALS = 20000
+PERCENTILES = (10, 50, 90)
+DEFAULT_SCENARIO = {
+    'trials': 10000,
+    'churn': 0.02,             # monthly probability that a client leaves
+    'late_probability': 0.2,   # share of payments that arrive late
+    'late_days': 14,           # mean delay of a late payment
+    'expense_variance': 0.1,   # coefficient of variation on recurring expenses
+    'seed': None,
+}
+
+def scenario_inputs(weeks, start_balance, churn=None, today=None):
+    """Plain arrays describing the next `weeks` weeks, picklable for the worker processes.
+
+    `churn` maps project id -> monthly churn probability; projects not in it
+    use DEFAULT_SCENARIO['churn'].
+    """
+    today = today or datetime.utcnow().date()
+    end_date = today + timedelta(days=weeks * 7 - 1)
+    churn = churn or {}
+
+    projects = db.session.execute(
+        select(Project.id, Project.monthly_retainer).where(Project.status == 'ACTIVE', Project.monthly_retainer > 0)
+    ).all()
+    retainer_dates = list(retainer_occurrences(today, end_date))
+    occurrences = db.session.execute(
+        select(ScheduledOccurrence.occurrence_date, ScheduledOccurrence.amount)
+        .where(ScheduledOccurrence.occurrence_date.between(today, end_date))
+    ).all()
+
+    return {
+        'weeks': weeks,
+        'start_balance': float(start_balance),
+        'retainers': np.array([float(amount) for _, amount in projects], dtype=np.float64),
+        'churn': np.array([churn.get(pid, DEFAULT_SCENARIO['churn']) for pid, _ in projects], dtype=np.float64),
+        'retainer_days': np.array([(d - today).days for d in retainer_dates], dtype=np.int64),
+        'occurrence_days': np.array([(d - today).days for d, _ in occurrences], dtype=np.int64),
+        'occurrence_amounts': np.array([float(amount) for _, amount in occurrences], dtype=np.float64),
+    }
+
+def _bucket_sums(trials, weeks, days, amounts):
+    """(trials, weeks) totals of `amounts` landing on day offsets `days` (both (trials, k)); beyond the horizon is dropped."""
+    buckets = days // 7
+    inside = buckets < weeks
+    index = (np.arange(trials)[:, None] * weeks + buckets)[inside]
+    return np.bincount(index, weights=amounts[inside], minlength=trials * weeks).reshape(trials, weeks)
+
+def _delays(rng, shape, late_probability, late_days):
+    """Whole-day delays: 0 for on-time payments, exponential for late ones."""
+    late = rng.random(shape) < late_probability
+    return np.where(late, np.ceil(rng.exponential(max(late_days, 1e-9), shape)), 0).astype(np.int64)
+
+def simulate_chunk(inputs, params, trials, seed_sequence):
+    """Balances at the end of each week, shape (trials, weeks), for one chunk of trials."""
+    rng = np.random.default_rng(seed_sequence)
+    weeks = inputs['weeks']
+    net = np.zeros((trials, weeks))
+
+    retainers, retainer_days = inputs['retainers'], inputs['retainer_days']
+    if len(retainers) and len(retainer_days):
+        # Month in which each client churns (0 = before the first retainer); never if p == 0.
+        churn = np.clip(inputs['churn'], 0, 1)
+        churn_month = np.where(churn > 0, rng.geometric(np.where(churn > 0, churn, 1), (trials, len(retainers))) - 1,
+                               len(retainer_days))
+        paid = np.arange(len(retainer_days))[None, None, :] < churn_month[:, :, None]
+        amounts = np.where(paid, retainers[None, :, None], 0.0).reshape(trials, -1)
+        days = np.broadcast_to(retainer_days, paid.shape).reshape(trials, -1)
+        days = days + _delays(rng, days.shape, params['late_probability'], params['late_days'])
+        net += _bucket_sums(trials, weeks, days, amounts)
+
+    occurrence_amounts, occurrence_days = inputs['occurrence_amounts'], inputs['occurrence_days']
+    if len(occurrence_amounts):
+        income = occurrence_amounts > 0
+        # Mean-one lognormal factor with the requested coefficient of variation.
+        sigma = math.sqrt(math.log1p(params['expense_variance'] ** 2))
+        factors = rng.lognormal(-sigma ** 2 / 2, sigma, (trials, len(occurrence_amounts)))
+        amounts = np.where(income, occurrence_amounts, occurrence_amounts * factors)
+        days = np.broadcast_to(occurrence_days, amounts.shape)
+        days = days + np.where(income, _delays(rng, amounts.shape, params['late_probability'], params['late_days']), 0)
+        net += _bucket_sums(trials, weeks, days, amounts)
+
+    return inputs['start_balance'] + np.cumsum(net, axis=1)
+
+def _pool_size():
+    workers = current_app.config.get('BUDGET_SIMULATION_WORKERS')
+    return int(workers) if workers is not None else (os.cpu_count() or 1)
+
+def run_simulation(inputs, trials=None, late_probability=None, late_days=None,
+                   expense_variance=None, seed=None, workers=None):
+    """Run the scenario and summarize it. Churn is part of `inputs` (see `scenario_inputs`).
+
+    Returns {'percentiles': {10: [...], 50: [...], 90: [...]} (weekly
+    balances), 'negative_probability' (share of trials that dip below zero),
+    'trials'}. Runs below PARALLEL_MIN_TRIALS, or with `workers` <= 1, stay
+    in this process; the bands are the same either way.
+    """
+    trials = min(int(trials or DEFAULT_SCENARIO['trials']), MAX_TRIALS)
+    params = {
+        'late_probability': DEFAULT_SCENARIO['late_probability'] if late_probability is None else late_probability,
+        'late_days': DEFAULT_SCENARIO['late_days'] if late_days is None else late_days,
+        'expense_variance': DEFAULT_SCENARIO['expense_variance'] if expense_variance is None else expense_variance,
+    }
+    chunks = [min(SIMULATION_CHUNK_SIZE, trials - start) for start in range(0, trials, SIMULATION_CHUNK_SIZE)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+    workers = _pool_size() if workers is None else workers
+
+    if workers > 1 and trials >= PARALLEL_MIN_TRIALS:
+        with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+            results = list(pool.map(simulate_chunk, [inputs] * len(chunks), [params] * len(chunks), chunks, seeds))
+    else:
+        results = [simulate_chunk(inputs, params, n, s) for n, s in zip(chunks, seeds)]
+    balances = np.concatenate(results)
+
+    bands = np.percentile(balances, PERCENTILES, axis=0)
+    return {
+        'percentiles': {p: np.round(band, 2).tolist() for p, band in zip(PERCENTILES, bands)},
+        'negative_probability': float((balances.min(axis=1) < 0).mean()),
+        'trials': trials,
+    }
@@ -0,0 +1,218 @@
+"""Bank statement parsers for the import flow.
+
+Each parser turns an uploaded binary stream into {'date', 'description',
+'amount'} dicts of strings, yielded lazily so a multi-year statement is never
+held in memory. Parsers register themselves with `@statement_parser`;
+`detect_parser` picks the first one whose `sniff` accepts the start of the
+file, so more specific layouts are registered first.
+"""
+import io
+import re
+import csv
+import html
+from collections import namedtuple
+from decimal import Decimal, InvalidOperation
+
+HEAD_BYTES = 4096
+OFX_CHUNK_SIZE = 65536
+CSV_DELIMITERS = (',', ';', '\t', '|')
+
+DATE_COLUMNS = ('date', 'transaction date', 'posting date', 'posted date', 'trans date', 'booking date', 'value date')
+DESCRIPTION_COLUMNS = ('description', 'desc', 'payee', 'name', 'transaction description', 'narrative', 'memo', 'details')
+AMOUNT_COLUMNS = ('amount', 'transaction amount', 'amount (usd)')
+DEBIT_COLUMNS = ('debit', 'debit amount', 'withdrawal', 'withdrawals', 'money out', 'paid out')
+CREDIT_COLUMNS = ('credit', 'credit amount', 'deposit', 'deposits', 'money in', 'paid in')
+
+StatementParser = namedtuple('StatementParser', 'name label extensions sniff parse')
+
+PARSERS = []
+
+def statement_parser(name, label, extensions, sniff):
+    def register(parse):
+        PARSERS.append(StatementParser(name, label, tuple(extensions), sniff, parse))
+        return parse
+    return register
+
+def accepted_extensions():
+    """File extensions the import form accepts, e.g. ('.csv', '.ofx', '.qfx')."""
+    return tuple(dict.fromkeys(ext for parser in PARSERS for ext in parser.extensions))
+
+def detect_parser(binary_stream):
+    """The parser for this upload, judged from its first HEAD_BYTES; None if nothing matches.
+
+    The stream is rewound afterwards, so the parser reads it from the start.
+    """
+    head = binary_stream.read(HEAD_BYTES)
+    binary_stream.seek(0)
+    text = head.decode('utf-8-sig', errors='replace')
+    for parser in PARSERS:
+        if parser.sniff(text):
+            return parser
+    return None
+
+def _text_lines(binary_stream):
+    """Decode the upload line by line; the underlying stream stays open for the caller."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+    try:
+        yield from text_stream
+    finally:
+        text_stream.detach()
+
+_DECIMAL_COMMA = re.compile(r'^-?[\d.]*,\d{1,2}$')
+
+def _clean_amount(value, decimal_comma=False):
+    """'$1,234.50' -> '1234.50', '(12.00)' -> '-12.00'; anything unparseable is passed through for review.
+
+    ',' is the decimal mark and '.' the grouping mark ('-1.200,00' -> '-1200.00')
+    when the value can only be read that way, or with `decimal_comma` (set for
+    ';'-delimited files) unless a '.' follows the last ','.
+    """
+    value = (value or '').strip()
+    cleaned = value.replace('$', '').replace(' ', '')
+    if cleaned.startswith('(') and cleaned.endswith(')'):
+        cleaned = '-' + cleaned[1:-1]
+    if _DECIMAL_COMMA.match(cleaned) or (decimal_comma and cleaned.rfind(',') > cleaned.rfind('.')):
+        cleaned = cleaned.replace('.', '').replace(',', '.')
+    else:
+        cleaned = cleaned.replace(',', '')
+    try:
+        return str(Decimal(cleaned))
+    except InvalidOperation:
+        return value
+
+def _pick(header, names):
+    """Index of the first column in `header` matching one of `names` (in preference order)."""
+    for name in names:
+        if name in header:
+            return header.index(name)
+    return None
+
+# --- OFX / QFX ---------------------------------------------------------------
+
+_OFX_TAG = re.compile(r'<(/?)([A-Za-z0-9.]+)>([^<]*)')
+
+def _sniff_ofx(head):
+    return 'OFXHEADER' in head or '<OFX>' in head.upper()
+
+@statement_parser('ofx', 'OFX / QFX', ('.ofx', '.qfx'), _sniff_ofx)
+def parse_ofx(binary_stream):
+    """Yield <STMTTRN> records from OFX 1.x (SGML) or 2.x (XML) statements, a chunk at a time."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace')
+    buffer = ''
+    current = None
+    try:
+        while True:
+            chunk = text_stream.read(OFX_CHUNK_SIZE)
+            buffer += chunk
+            # Only tokenize up to the last '<'; the tag after it may be cut off mid-chunk.
+            cut = len(buffer) if not chunk else buffer.rfind('<')
+            if cut <= 0 and chunk:
+                continue
+            for closing, tag, value in _OFX_TAG.findall(buffer[:cut]):
+                tag = tag.upper()
+                if tag == 'STMTTRN':
+                    if not closing:
+                        current = {}
+                    elif current is not None:
+                        if current.get('DTPOSTED') and current.get('TRNAMT'):
+                            posted = current['DTPOSTED']
+                            yield {
+                                'date': f'{posted[:4]}-{posted[4:6]}-{posted[6:8]}',
+                                'description': current.get('NAME') or current.get('MEMO') or '',
+                                'amount': _clean_amount(current['TRNAMT'])
+                            }
+                        current = None
+                elif current is not None and not closing and value.strip():
+                    current.setdefault(tag, html.unescape(value.strip()))
+            buffer = buffer[cut:]
+            if not chunk:
+                break
+    finally:
+        text_stream.detach()
+
+# --- CSV layouts -------------------------------------------------------------
+
+def _csv_header(head, require_split):
+    """(delimiter, header line number, normalized header) for a CSV whose header has a
+    date column plus either an amount column or debit/credit columns.
+
+    Banks often put a summary block above the real header, so the first
+    lines of the sample are searched rather than just the first.
+    """
+    lines = head.splitlines()
+    if len(head) >= HEAD_BYTES and len(lines) > 1:
+        lines = lines[:-1]  # last line may be cut off
+    for delimiter in CSV_DELIMITERS:
+        for line_no, cells in enumerate(csv.reader(lines[:20], delimiter=delimiter)):
+            header = [cell.strip().lower() for cell in cells]
+            if _pick(header, DATE_COLUMNS) is None:
+                continue
+            has_split = _pick(header, DEBIT_COLUMNS) is not None and _pick(header, CREDIT_COLUMNS) is not None
+            has_amount = _pick(header, AMOUNT_COLUMNS) is not None
+            if has_split if require_split else has_amount:
+                return delimiter, line_no, header
+    return None
+
+def _csv_records(binary_stream, require_split):
+    """(header, lazy reader over the data rows, delimiter) for a headed CSV."""
+    head = binary_stream.read(HEAD_BYTES).decode('utf-8-sig', errors='replace')
+    binary_stream.seek(0)
+    delimiter, header_line, header = _csv_header(head, require_split)
+    reader = csv.reader(_text_lines(binary_stream), delimiter=delimiter)
+    for _ in range(header_line + 1):
+        next(reader, None)
+    return header, reader, delimiter
+
+def _cell(cells, index):
+    return cells[index].strip() if index is not None and index < len(cells) else ''
+
+@statement_parser('csv_split', 'CSV (debit / credit columns)', ('.csv',),
+                  lambda head: _csv_header(head, require_split=True) is not None)
+def parse_split_csv(binary_stream):
+    """Statements with separate money-out and money-in columns; amount = credit - debit."""
+    header, reader, delimiter = _csv_records(binary_stream, require_split=True)
+    decimal_comma = delimiter == ';'
+    date_col, desc_col = _pick(header, DATE_COLUMNS), _pick(header, DESCRIPTION_COLUMNS)
+    debit_col, credit_col = _pick(header, DEBIT_COLUMNS), _pick(header, CREDIT_COLUMNS)
+    for cells in reader:
+        date_val = _cell(cells, date_col)
+        debit = _clean_amount(_cell(cells, debit_col), decimal_comma)
+        credit = _clean_amount(_cell(cells, credit_col), decimal_comma)
+        if not date_val or not (debit or credit):
+            continue
+        try:
+            amount = str(Decimal(credit or 0) - abs(Decimal(debit or 0)))
+        except InvalidOperation:
+            amount = debit or credit
+        yield {'date': date_val, 'description': _cell(cells, desc_col), 'amount': amount}
+
+@statement_parser('csv', 'CSV (single amount column)', ('.csv',),
+                  lambda head: _csv_header(head, require_split=False) is not None)
+def parse_amount_csv(binary_stream):
+    """Date / Description / Amount exports, whatever the column names and delimiter."""
+    header, reader, delimiter = _csv_records(binary_stream, require_split=False)
+    decimal_comma = delimiter == ';'
+    date_col, desc_col, amount_col = _pick(header, DATE_COLUMNS), _pick(header, DESCRIPTION_COLUMNS), _pick(header, AMOUNT_COLUMNS)
+    for cells in reader:
+        date_val, amount_val = _cell(cells, date_col), _cell(cells, amount_col)
+        if date_val and amount_val:
+            yield {'date': date_val, 'description': _cell(cells, desc_col), 'amount': _clean_amount(amount_val, decimal_comma)}
+
+_DATE_LIKE = re.compile(r'^\d{1,4}[/-]\d{1,2}[/-]\d{1,4}$')
+_NUMBER_LIKE = re.compile(r'^\(?-?\$?[\d,]+(\.\d+)?\)?$')
+
+def _headerless_row(cells):
+    return len(cells) >= 3 and _DATE_LIKE.match(cells[0].strip()) and _NUMBER_LIKE.match(cells[1].strip())
+
+def _sniff_headerless(head):
+    first = next(csv.reader(head.splitlines()[:1]), [])
+    return bool(_headerless_row(first))
+
+@statement_parser('csv_headerless', 'CSV without header (date, amount, ..., description)', ('.csv',), _sniff_headerless)
+def parse_headerless_csv(binary_stream):
+    """Header-less exports (e.g. Wells Fargo): date, amount, then the description as the last filled column."""
+    for cells in csv.reader(_text_lines(binary_stream)):
+        if not _headerless_row(cells):
+            continue
+        description = next((c.strip() for c in reversed(cells[2:]) if c.strip() and c.strip() != '*'), '')
+        yield {'date': cells[0].strip(), 'description': description, 'amount': _clean_amount(cells[1])}
@@ -0,0 +1,174 @@
+"""Bulk time entry: the weekly timesheet grid and time-tracker CSV exports.
+
+Both paths end in `insert_time_entries`, which writes every TimeEntry with
+one executemany INSERT and folds them into `time_rollup` with one upsert,
+so a month of hours costs a handful of statements rather than one request
+(and one stats refresh) per entry.
+
+CSV formats register themselves with `@timesheet_format`; `detect_format`
+picks the first whose required columns are all in the header.
+"""
+import io
+import csv
+import itertools
+from collections import namedtuple, Counter
+from decimal import Decimal, InvalidOperation
+from datetime import timedelta
+from sqlalchemy import select, insert, func
+from .models import db, Project, TimeEntry
+from .rollups import time_rollup_entry, apply_time_rollup_delta
+from .importers import detect_date_format, parse_import_date, DATE_SAMPLE_SIZE
+
+TIME_IMPORT_CHUNK_SIZE = 1000
+
+TimesheetFormat = namedtuple('TimesheetFormat', 'name label columns read')
+
+FORMATS = []
+
+def timesheet_format(name, label, columns):
+    def register(read):
+        FORMATS.append(TimesheetFormat(name, label, frozenset(columns), read))
+        return read
+    return register
+
+def detect_format(header):
+    """The format whose required columns all appear in `header`; None if nothing matches."""
+    columns = {cell.strip().lower() for cell in header}
+    for fmt in FORMATS:
+        if fmt.columns <= columns:
+            return fmt
+    return None
+
+def parse_hours(value):
+    """Decimal hours from '1.5', '1,5' or a duration such as '01:30:00'."""
+    value = (value or '').strip()
+    try:
+        if ':' in value:
+            parts = [int(part) for part in value.split(':')]
+            hours, minutes, seconds = (parts + [0, 0])[:3]
+            result = Decimal(hours) + Decimal(minutes) / 60 + Decimal(seconds) / 3600
+        else:
+            result = Decimal(value.replace(',', '.'))
+        # NaN survives quantize(), and would only fail later on a comparison.
+        if not result.is_finite():
+            raise ValueError
+        return result.quantize(Decimal('0.01'))
+    except (ValueError, InvalidOperation):
+        raise ValueError(f'Invalid hours: {value!r}')
+
+def _describe(*parts):
+    return ' - '.join(part.strip() for part in parts if part and part.strip())[:255] or None
+
+# Each reader maps one CSV record (keys lower-cased) to (project name, date string, hours string, description).
+
+@timesheet_format('toggl', 'Toggl Track', ('project', 'start date', 'duration'))
+def _toggl_record(record):
+    return record['project'], record['start date'], record['duration'], _describe(record.get('description'), record.get('task'))
+
+@timesheet_format('harvest', 'Harvest', ('project', 'date', 'hours'))
+def _harvest_record(record):
+    return record['project'], record['date'], record['hours'], _describe(record.get('task'), record.get('notes'))
+
+def _records(binary_stream):
+    """(format, lazy iterator of lower-cased record dicts) for an uploaded CSV."""
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', errors='replace', newline='')
+    reader = csv.reader(text_stream)
+    header = [cell.strip().lower() for cell in next(reader, [])]
+    fmt = detect_format(header)
+    if fmt is None:
+        text_stream.detach()
+        raise ValueError('Unrecognised time export; expected a Toggl or Harvest CSV.')
+
+    def records():
+        try:
+            for cells in reader:
+                if any(cell.strip() for cell in cells):
+                    yield dict(zip(header, (cell.strip() for cell in cells)))
+        finally:
+            text_stream.detach()
+    return fmt, records()
+
+def import_time_csv(binary_stream, fallback_project_id=None, chunk_size=TIME_IMPORT_CHUNK_SIZE):
+    """Stream a time-tracker export into TimeEntry rows, `chunk_size` rows per INSERT.
+
+    Projects are matched by name (case-insensitive); rows for unknown
+    projects go to `fallback_project_id`, or are skipped if there is none.
+    Returns {'format', 'imported', 'hours', 'unmatched' (Counter of project
+    names), 'unreadable'}. The caller commits.
+    """
+    fmt, records = _records(binary_stream)
+    project_ids = {name.strip().lower(): pid for pid, name in db.session.execute(select(Project.id, Project.name))}
+    result = {'format': fmt.label, 'imported': 0, 'hours': Decimal('0'), 'unmatched': Counter(), 'unreadable': 0}
+
+    rows = (fmt.read(record) for record in records)
+    # The date format is judged from a sample at the top of the file, as for statements.
+    sample = list(itertools.islice(rows, DATE_SAMPLE_SIZE))
+    date_format = detect_date_format([row[1] for row in sample])
+
+    chunk = []
+    for project_name, date_value, hours_value, description in itertools.chain(sample, rows):
+        project_id = project_ids.get((project_name or '').strip().lower(), fallback_project_id)
+        if project_id is None:
+            result['unmatched'][project_name or '(no project)'] += 1
+            continue
+        try:
+            date = parse_import_date(date_value, date_format)
+            hours = parse_hours(hours_value)
+        except ValueError:
+            result['unreadable'] += 1
+            continue
+        if hours <= 0:
+            continue
+        chunk.append({'project_id': project_id, 'date': date, 'hours': hours, 'description': description})
+        if len(chunk) >= chunk_size:
+            result['hours'] += insert_time_entries(chunk)
+            result['imported'] += len(chunk)
+            chunk = []
+    if chunk:
+        result['hours'] += insert_time_entries(chunk)
+        result['imported'] += len(chunk)
+    return result
+
+def insert_time_entries(entries):
+    """Bulk-insert TimeEntry dicts (project_id, date, hours, description) and update the rollup.
+
+    Returns the total hours written. The caller commits.
+    """
+    if not entries:
+        return Decimal('0')
+    db.session.execute(insert(TimeEntry), entries)
+    apply_time_rollup_delta(time_rollup_entry(e['project_id'], e['date'], e['hours']) for e in entries)
+    return sum((e['hours'] for e in entries), Decimal('0'))
+
+def week_days(week_start):
+    return [week_start + timedelta(days=offset) for offset in range(7)]
+
+def logged_hours(week_start):
+    """{(project_id, date): hours} already logged in the week starting `week_start`."""
+    return {
+        (project_id, date): Decimal(str(hours))
+        for project_id, date, hours in db.session.execute(
+            select(TimeEntry.project_id, TimeEntry.date, func.sum(TimeEntry.hours))
+            .where(TimeEntry.date.between(week_start, week_start + timedelta(days=6)))
+            .group_by(TimeEntry.project_id, TimeEntry.date)
+        )
+    }
+
+def timesheet_entries(form, projects, week_start):
+    """TimeEntry dicts from a submitted grid: fields `hours-<project id>-<day index>`
+    and one `description-<project id>` per row. Blank and zero cells are skipped;
+    unreadable ones raise ValueError.
+    """
+    entries = []
+    for project in projects:
+        description = (form.get(f'description-{project.id}') or '').strip()[:255] or None
+        for offset, day in enumerate(week_days(week_start)):
+            value = (form.get(f'hours-{project.id}-{offset}') or '').strip()
+            if not value:
+                continue
+            hours = parse_hours(value)
+            if hours < 0:
+                raise ValueError(f'Negative hours for {project.name} on {day:%a %b %d}')
+            if hours:
+                entries.append({'project_id': project.id, 'date': day, 'hours': hours, 'description': description})
+    return entries
@@ -1,9 +1,21 @@
 import os
+import re
+import calendar
+import hashlib
 from functools import wraps
-from flask import session, redirect, url_for, flash
-from decimal import Decimal
+from flask import session, redirect, url_for, flash, current_app
+from decimal import Decimal, InvalidOperation
 from datetime import datetime, timedelta
-from .models import Transaction, Project, RecurringTransaction, db
+from sqlalchemy import func, case, update, select, insert, delete, cast, type_coerce, Float, or_, and_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from .models import (
+    Transaction, Project, RecurringTransaction, ScheduledOccurrence, LedgerSummary,
+    TransactionAllocation, TransactionNgram, TimeRollup, db,
+    transaction_projects, recurring_transaction_projects
+)
+from .rollups import rollup_entry, apply_rollup_delta, apply_balance_delta, project_period_stats, period_start
+
+LEDGER_SUMMARY_ID = 1
 
 def login_required(f):
     @wraps(f)
@@ -13,17 +25,422 @@ def login_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def compute_agi_totals():
+    """Total revenue and pass-through spend from one conditional-SUM query over the ledger."""
+    revenue, pass_through = db.session.query(
+        func.coalesce(func.sum(case((Transaction.amount > 0, Transaction.amount), else_=0)), 0),
+        func.coalesce(func.sum(case(
+            ((Transaction.is_pass_through == True) & (Transaction.amount < 0), -Transaction.amount),
+            else_=0
+        )), 0)
+    ).one()
+    return Decimal(str(revenue)).quantize(Decimal('0.01')), Decimal(str(pass_through)).quantize(Decimal('0.01'))
+
+def rebuild_ledger_summary():
+    """Recompute the ledger summary row from scratch (first write, or a backfill)."""
+    total_revenue, total_pass_through = compute_agi_totals()
+    summary = db.session.get(LedgerSummary, LEDGER_SUMMARY_ID)
+    if summary is None:
+        summary = LedgerSummary(id=LEDGER_SUMMARY_ID)
+        db.session.add(summary)
+    summary.total_revenue = total_revenue
+    summary.total_pass_through = total_pass_through
+    summary.version = (summary.version or 0) + 1
+    return summary
+
+def ledger_version():
+    """Counter bumped by every ledger write; caches built from the ledger compare against it."""
+    return db.session.scalar(select(LedgerSummary.version).where(LedgerSummary.id == LEDGER_SUMMARY_ID)) or 0
+
+def bump_ledger_version():
+    """Invalidate ledger caches after a change that does not go through `apply_ledger_delta`."""
+    updated = db.session.execute(
+        update(LedgerSummary).where(LedgerSummary.id == LEDGER_SUMMARY_ID).values(version=LedgerSummary.version + 1)
+    ).rowcount
+    if not updated:
+        rebuild_ledger_summary()
+
+def apply_ledger_delta(transactions, sign=1):
+    """Fold added (sign=1) or deleted (sign=-1) transactions into the ledger summary.
+
+    Call after `db.session.add`/`delete` and before the commit, so the summary
+    lands in the same DB transaction as the rows it describes. Also shifts the
+    balance checkpoints, bumps the ledger version and moves
+    `forecast_stale_from` back to the earliest non-recurring date written.
+    """
+    transactions = list(transactions)
+    if not transactions:
+        return
+    apply_balance_delta(transactions, sign)
+    revenue = Decimal('0')
+    pass_through = Decimal('0')
+    stale_from = None
+    for t in transactions:
+        # Bulk paths hand in plain row dicts rather than Transaction objects.
+        if isinstance(t, dict):
+            amount, is_pass_through, date, recurring_id = t['amount'], t['is_pass_through'], t['date'], t.get('recurring_transaction_id')
+        else:
+            amount, is_pass_through, date, recurring_id = t.amount, t.is_pass_through, t.date, t.recurring_transaction_id
+        if amount > 0:
+            revenue += amount
+        elif is_pass_through and amount < 0:
+            pass_through += abs(amount)
+        if recurring_id is None and (stale_from is None or date < stale_from):
+            stale_from = date
+
+    values = {
+        'total_revenue': LedgerSummary.total_revenue + sign * revenue,
+        'total_pass_through': LedgerSummary.total_pass_through + sign * pass_through,
+        'version': LedgerSummary.version + 1,
+    }
+    if stale_from is not None:
+        values['forecast_stale_from'] = case(
+            (LedgerSummary.forecast_stale_from.is_(None) | (LedgerSummary.forecast_stale_from > stale_from), stale_from),
+            else_=LedgerSummary.forecast_stale_from
+        )
+    updated = db.session.execute(
+        update(LedgerSummary).where(LedgerSummary.id == LEDGER_SUMMARY_ID).values(**values)
+    ).rowcount
+    if not updated:
+        # No summary yet: seed it from the (already flushed) ledger instead.
+        rebuild_ledger_summary()
+
+def split_amount(amount, weights):
+    """Split `amount` in proportion to `weights`, to the cent.
+
+    The last share absorbs the rounding remainder so the shares always add
+    back up to `amount` exactly. Weights must be non-negative; all zeros
+    means an equal split.
+    """
+    amount = Decimal(amount)
+    weights = [Decimal(str(w)) for w in weights]
+    if any(not w.is_finite() or w < 0 for w in weights):
+        raise ValueError('Split weights must be non-negative numbers')
+    total_weight = sum(weights)
+    if total_weight <= 0:
+        weights = [Decimal('1')] * len(weights)
+        total_weight = Decimal(len(weights))
+    shares = [(amount * w / total_weight).quantize(Decimal('0.01')) for w in weights[:-1]]
+    shares.append(amount - sum(shares))
+    return shares
+
+def parse_split_weight(value):
+    """Decimal weight from a form field; blank means 1. Raises ValueError unless finite and non-negative."""
+    value = (value or '').strip()
+    if not value:
+        return Decimal('1')
+    try:
+        weight = Decimal(value)
+    except InvalidOperation:
+        raise ValueError(f'Invalid split weight: {value!r}')
+    if not weight.is_finite() or weight < 0:
+        raise ValueError(f'Invalid split weight: {value!r}')
+    return weight
+
+def allocation_rows(transaction_id, date, amount, project_ids, weights=None):
+    """`transaction_allocations` rows for one transaction; equal split unless `weights` maps project id -> weight.
+
+    Projects are taken in id order, so the rounding remainder lands on the
+    same share however the ids were listed (and as `rebuild_allocations` does).
+    """
+    project_ids = sorted({int(pid) for pid in project_ids})
+    if not project_ids:
+        return []
+    project_weights = [Decimal(str((weights or {}).get(pid, 1))) for pid in project_ids]
+    return [
+        {'transaction_id': transaction_id, 'project_id': pid, 'weight': weight, 'amount': share, 'date': date}
+        for pid, weight, share in zip(project_ids, project_weights, split_amount(amount, project_weights))
+    ]
+
+def allocate_transactions(rows):
+    """Bulk insert allocation rows built by `allocation_rows`."""
+    if rows:
+        db.session.execute(insert(TransactionAllocation), rows)
+
+def rebuild_allocations():
+    """Re-derive allocations for every linked transaction (backfill).
+
+    Weights already on record are kept; links without one split equally.
+    """
+    weights = {}
+    for transaction_id, project_id, weight in db.session.execute(
+        select(TransactionAllocation.transaction_id, TransactionAllocation.project_id, TransactionAllocation.weight)
+    ):
+        weights.setdefault(transaction_id, {})[project_id] = weight
+    db.session.execute(delete(TransactionAllocation))
+    links = {}
+    amounts = {}
+    for transaction_id, project_id, date, amount in db.session.execute(
+        select(transaction_projects.c.transaction_id, transaction_projects.c.project_id, Transaction.date, Transaction.amount)
+        .join(Transaction, Transaction.id == transaction_projects.c.transaction_id)
+        .order_by(transaction_projects.c.transaction_id, transaction_projects.c.project_id)
+    ):
+        links.setdefault(transaction_id, []).append(project_id)
+        amounts[transaction_id] = (date, amount)
+    rows = []
+    for transaction_id, project_ids in links.items():
+        rows.extend(allocation_rows(transaction_id, *amounts[transaction_id], project_ids, weights.get(transaction_id)))
+    allocate_transactions(rows)
+    return len(rows)
+
+def normalize_description(description):
+    """Lowercase, punctuation-free, single-spaced description used for matching."""
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', (description or '').lower()).split())
+
+def transaction_fingerprint(date, amount, description):
+    """Duplicate-detection key for a ledger entry.
+
+    The amount is unsigned so a statement line matches its ledger entry
+    whichever category the reviewer picks.
+    """
+    amount = abs(Decimal(str(amount))).quantize(Decimal('0.01'))
+    key = f'{date.isoformat()}|{amount}|{normalize_description(description)}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def description_ngrams(description):
+    """Trigrams of each word in the normalized description, padded so short words still count."""
+    grams = set()
+    for word in normalize_description(description).split():
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+def index_transaction_ngrams(rows):
+    """Bulk insert `transaction_ngrams` postings for (transaction_id, description) pairs."""
+    postings = [
+        {'ngram': gram, 'transaction_id': transaction_id}
+        for transaction_id, description in rows
+        for gram in description_ngrams(description)
+    ]
+    if postings:
+        db.session.execute(insert(TransactionNgram), postings)
+
+def rebuild_fingerprints(chunk_size=1000):
+    """Recompute every transaction's fingerprint and the trigram index (backfill)."""
+    db.session.execute(delete(TransactionNgram))
+    ledger = db.session.execute(
+        select(Transaction.id, Transaction.date, Transaction.amount, Transaction.description)
+    ).all()
+    for start in range(0, len(ledger), chunk_size):
+        chunk = ledger[start:start + chunk_size]
+        db.session.execute(update(Transaction), [
+            {'id': t.id, 'fingerprint': transaction_fingerprint(t.date, t.amount, t.description)} for t in chunk
+        ])
+        index_transaction_ngrams((t.id, t.description) for t in chunk)
+    return len(ledger)
+
+def get_project_totals(project_ids):
+    """Allocated income, expenses and net per project from one SUM ... GROUP BY."""
+    totals = {pid: {'income': Decimal('0'), 'expenses': Decimal('0'), 'net': Decimal('0')} for pid in project_ids}
+    if not project_ids:
+        return totals
+    for project_id, income, expenses in db.session.execute(
+        select(
+            TransactionAllocation.project_id,
+            func.sum(case((TransactionAllocation.amount > 0, TransactionAllocation.amount), else_=0)),
+            func.sum(case((TransactionAllocation.amount < 0, -TransactionAllocation.amount), else_=0))
+        )
+        .where(TransactionAllocation.project_id.in_(project_ids))
+        .group_by(TransactionAllocation.project_id)
+    ):
+        income = Decimal(str(income or 0)).quantize(Decimal('0.01'))
+        expenses = Decimal(str(expenses or 0)).quantize(Decimal('0.01'))
+        totals[project_id] = {'income': income, 'expenses': expenses, 'net': income - expenses}
+    return totals
+
+PROJECT_SORTS = {
+    'name': ('Name', lambda c: (c['name'],)),
+    'net_desc': ('Highest net total', lambda c: (c['net'].desc(),)),
+    'net_asc': ('Lowest net total', lambda c: (c['net'],)),
+    'margin_asc': ('Lowest margin first', lambda c: (c['margin'],)),
+    'margin_desc': ('Highest margin first', lambda c: (c['margin'].desc(),)),
+    'ahr_desc': ('Highest AHR', lambda c: (c['ahr'].desc(),)),
+    'hours_desc': ('Most hours this month', lambda c: (c['total_hours'].desc(),)),
+    'burn_desc': ('Highest burn', lambda c: (c['burn'].desc(),)),
+}
+
+PROJECT_FILTERS = {
+    'over_planned': ('Over planned hours', lambda c: c['burn'] > 100),
+    'at_risk': ('Burn over 80%', lambda c: c['burn'] > 80),
+    'low_margin': ('Margin under 50%', lambda c: c['margin'] < 50),
+    'unprofitable': ('Net loss', lambda c: c['net'] < 0),
+}
+
+def project_summary_query(show_inactive=False, sort='name', filter_key=None, on=None):
+    """Every project with its totals, and this month's hours, AHR, margin and burn, as one SELECT.
+
+    Allocation totals are pre-grouped in a subquery and the month's hours come
+    from `time_rollup`, both joined once, so the list costs the same whether it
+    shows ten projects or hundreds. Retainers and planned hours are monthly,
+    so AHR, margin and burn match `get_project_stats`. Computed columns are
+    labeled, so sorting and filtering happen in SQL.
+    """
+    money = db.Numeric(12, 2)
+    allocations = select(
+        TransactionAllocation.project_id,
+        func.sum(case((TransactionAllocation.amount > 0, TransactionAllocation.amount), else_=0)).label('income'),
+        func.sum(case((TransactionAllocation.amount < 0, -TransactionAllocation.amount), else_=0)).label('expenses')
+    ).group_by(TransactionAllocation.project_id).subquery()
+    hours = select(
+        TimeRollup.project_id,
+        TimeRollup.hours.label('total_hours')
+    ).where(
+        TimeRollup.grain == 'month',
+        TimeRollup.period_start == period_start(on or datetime.utcnow().date(), 'month')
+    ).subquery()
+
+    retainer = cast(func.coalesce(Project.monthly_retainer, 0), Float)
+    cost_rate = cast(func.coalesce(Project.cost_rate, 0), Float)
+    planned = cast(func.coalesce(Project.planned_hours, 0), Float)
+    total_hours = cast(func.coalesce(hours.c.total_hours, 0), Float)
+    income = func.coalesce(allocations.c.income, 0)
+    expenses = func.coalesce(allocations.c.expenses, 0)
+
+    columns = {
+        'name': Project.name,
+        'income': type_coerce(income, money),
+        'expenses': type_coerce(expenses, money),
+        'net': type_coerce(income - expenses, money),
+        'total_hours': type_coerce(total_hours, money),
+        'ahr': type_coerce(case((total_hours > 0, retainer / total_hours), else_=0), money),
+        'margin': type_coerce(case((retainer > 0, (retainer - total_hours * cost_rate) / retainer * 100), else_=0), money),
+        'burn': type_coerce(case((planned > 0, total_hours / planned * 100), else_=0), money),
+    }
+
+    query = (
+        select(Project, *(expr.label(name) for name, expr in columns.items() if name != 'name'))
+        .outerjoin(allocations, allocations.c.project_id == Project.id)
+        .outerjoin(hours, hours.c.project_id == Project.id)
+    )
+    if not show_inactive:
+        query = query.where(Project.status == 'ACTIVE')
+    if filter_key in PROJECT_FILTERS:
+        query = query.where(PROJECT_FILTERS[filter_key][1](columns))
+    _, order_by = PROJECT_SORTS.get(sort, PROJECT_SORTS['name'])
+    return query.order_by(*order_by(columns), Project.id)
+
+def get_project_summaries(show_inactive=False, sort='name', filter_key=None, on=None):
+    return db.session.execute(project_summary_query(show_inactive, sort, filter_key, on)).all()
+
+CATEGORIES = ('Income', 'Software', 'Payroll', 'Marketing', 'Other')
+LEDGER_PAGE_SIZE = 50
+
+def parse_ledger_filters(args):
+    """Ledger filters from request args; anything malformed is ignored."""
+    filters = {}
+    for key in ('start', 'end'):
+        try:
+            filters[key] = datetime.strptime(args.get(key, ''), '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    if args.get('category') in CATEGORIES:
+        filters['category'] = args['category']
+    if args.get('pass_through') in ('0', '1'):
+        filters['pass_through'] = args['pass_through'] == '1'
+    project = args.get('project', '')
+    if project.isdigit():
+        filters['project'] = int(project)
+    # Amount bounds are on the magnitude, matching how amounts are displayed.
+    for key in ('min_amount', 'max_amount'):
+        try:
+            value = Decimal(args.get(key, ''))
+        except InvalidOperation:
+            continue
+        if value.is_finite():
+            filters[key] = abs(value).quantize(Decimal('0.01'))
+    return filters
+
+def encode_ledger_cursor(t):
+    return f'{t.date.isoformat()}:{t.id}'
+
+def decode_ledger_cursor(value):
+    try:
+        date_str, id_str = (value or '').split(':')
+        return datetime.strptime(date_str, '%Y-%m-%d').date(), int(id_str)
+    except ValueError:
+        return None
+
+def filter_ledger(query, filters, project_id=None):
+    """Apply parsed ledger filters (and an optional project) to a SELECT over Transaction.
+
+    With a project, the date range is taken on the allocation's copy of the
+    date, so it becomes a range on ix_transaction_allocations_project_date.
+    """
+    if project_id is None:
+        project_id = filters.get('project')
+    date_column = Transaction.date
+    if project_id is not None:
+        query = query.join(TransactionAllocation, TransactionAllocation.transaction_id == Transaction.id) \
+                     .where(TransactionAllocation.project_id == project_id)
+        date_column = TransactionAllocation.date
+    if 'start' in filters:
+        query = query.where(date_column >= filters['start'])
+    if 'end' in filters:
+        query = query.where(date_column <= filters['end'])
+    if 'category' in filters:
+        query = query.where(Transaction.category == filters['category'])
+    if 'pass_through' in filters:
+        query = query.where(func.coalesce(Transaction.is_pass_through, False) == filters['pass_through'])
+    if 'min_amount' in filters:
+        query = query.where(func.abs(Transaction.amount) >= filters['min_amount'])
+    if 'max_amount' in filters:
+        query = query.where(func.abs(Transaction.amount) <= filters['max_amount'])
+    return query
+
+def ledger_query(filters=None, cursor=None, project_id=None, limit=LEDGER_PAGE_SIZE):
+    """SELECT for one ledger page (plus one look-ahead row), newest first.
+
+    A project's page (`project_id`, or the 'project' filter) is ordered and
+    seeked on its allocations' (date, transaction_id), so it reads straight
+    down ix_transaction_allocations_project_date instead of sorting the
+    project's whole history.
+    """
+    filters = filters or {}
+    if project_id is None:
+        project_id = filters.get('project')
+    query = filter_ledger(select(Transaction), filters, project_id)
+    if project_id is not None:
+        date_key, id_key = TransactionAllocation.date, TransactionAllocation.transaction_id
+    else:
+        date_key, id_key = Transaction.date, Transaction.id
+    if cursor:
+        cursor_date, cursor_id = cursor
+        query = query.where(or_(
+            date_key < cursor_date,
+            and_(date_key == cursor_date, id_key < cursor_id)
+        ))
+
+    return query.order_by(date_key.desc(), id_key.desc()).limit(limit + 1)
+
+def ledger_page(filters=None, cursor=None, project_id=None, limit=LEDGER_PAGE_SIZE):
+    """One page of the ledger, newest first, using keyset pagination on (date, id).
+
+    `cursor` is the (date, id) of the last row already shown, so deep pages
+    seek straight to their position instead of counting past an OFFSET.
+    Returns (transactions, next_cursor); next_cursor is None on the last page.
+    """
+    rows = db.session.execute(ledger_query(filters, cursor, project_id, limit)).scalars().all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_ledger_cursor(rows[-1])
+    return rows, None
+
 def calculate_agi():
     """AGI (Agency Gross Income): Total Revenue - Total Pass-Through Expenses."""
-    transactions = Transaction.query.all()
-    # Total Income: positive transactions that are NOT pass-through (though usually income isn't pass-through)
-    # Actually, the rule says AGI = Total Revenue - (Sum of Pass-Through Transactions).
-    # Revenue is income. Pass-through are specific expenses.
+    summary = db.session.get(LedgerSummary, LEDGER_SUMMARY_ID)
+    if summary is None:
+        # Ledger written before the summary existed; answer with the aggregate query.
+        total_revenue, total_pass_through = compute_agi_totals()
+        return total_revenue - total_pass_through
+    return summary.total_revenue - summary.total_pass_through
 
-    total_revenue = sum(t.amount for t in transactions if t.amount > 0)
-    total_pass_through = sum(abs(t.amount) for t in transactions if t.is_pass_through and t.amount < 0)
+def get_project_stats(projects, on=None):
+    """This month's hours, AHR, margin and budget burn per project, from `time_rollup`.
 
-    return total_revenue - total_pass_through
+    Retainers and planned hours are monthly figures, so they are measured
+    against the month's hours, the same numbers the time tracking page shows.
+    """
+    return project_period_stats(projects, 'month', on)[0]
 
 def get_kansas_tax_deadlines():
     return [
@@ -33,124 +450,265 @@ def get_kansas_tax_deadlines():
         {"date": "Apr 15", "event": "Kansas State Tax"},
     ]
 
-def process_recurring_transactions():
-    """Check for due recurring transactions and create entries."""
+FORECAST_HORIZONS = (13, 26, 52)
+FORECAST_GRANULARITIES = ('week', 'day')
+
+def add_months(anchor, months):
+    """`anchor` moved by whole months, clamped to the last day of shorter months."""
+    month_index = anchor.month - 1 + months
+    year = anchor.year + month_index // 12
+    month = month_index % 12 + 1
+    last_day = calendar.monthrange(year, month)[1]
+    return anchor.replace(year=year, month=month, day=min(anchor.day, last_day))
+
+def expand_occurrences(anchor, frequency, start, end=None):
+    """Yield each date of a schedule anchored at `anchor` within [start, end].
+
+    Jumps straight to the first occurrence on or after `start` instead of
+    stepping through the gap, so expanding a window costs O(occurrences).
+    Monthly/annual dates are computed from the anchor, so a 31st that clamps
+    to Feb 28 comes back to the 31st in March. `end=None` is unbounded.
+    """
+    start = max(start, anchor)
+    if frequency == 'WEEKLY':
+        occurrence = anchor + timedelta(weeks=-(-(start - anchor).days // 7))
+        while end is None or occurrence <= end:
+            yield occurrence
+            occurrence += timedelta(weeks=1)
+        return
+
+    if frequency == 'MONTHLY':
+        step = 1
+    elif frequency == 'ANNUAL':
+        step = 12
+    else:
+        raise ValueError(f'Unknown recurring frequency: {frequency}')
+
+    months_to_start = (start.year - anchor.year) * 12 + start.month - anchor.month
+    n = max(0, months_to_start // step - 1)
+    occurrence = add_months(anchor, n * step)
+    while occurrence < start:
+        n += 1
+        occurrence = add_months(anchor, n * step)
+    while end is None or occurrence <= end:
+        yield occurrence
+        n += 1
+        occurrence = add_months(anchor, n * step)
+
+def retainer_occurrences(start, end):
+    """Retainers are assumed to land on the 1st of each month."""
+    return expand_occurrences(start.replace(day=1), 'MONTHLY', start, end)
+
+def _schedule_horizon():
+    days = current_app.config.get('BUDGET_SCHEDULE_HORIZON_DAYS', 400)
+    return datetime.utcnow().date() + timedelta(days=days)
+
+def schedule_recurring(item, until=None):
+    """(Re)materialize one template's occurrences from its next_date to the horizon."""
+    unschedule_recurring(item.id)
+    rows = [
+        {'recurring_transaction_id': item.id, 'occurrence_date': d, 'amount': item.amount}
+        for d in expand_occurrences(item.next_date, item.frequency, item.next_date, until or _schedule_horizon())
+    ]
+    if rows:
+        db.session.execute(insert(ScheduledOccurrence), rows)
+    return len(rows)
+
+def unschedule_recurring(recurring_id):
+    db.session.execute(
+        delete(ScheduledOccurrence)
+        .where(ScheduledOccurrence.recurring_transaction_id == recurring_id)
+        .execution_options(synchronize_session=False)
+    )
+
+def extend_schedule(until=None):
+    """Roll every template's scheduled occurrences forward to the horizon.
+
+    Only dates past each template's last materialized occurrence are added,
+    so a daily run inserts a handful of rows. Returns the number added.
+    """
+    until = until or _schedule_horizon()
+    last_scheduled = dict(db.session.execute(
+        select(ScheduledOccurrence.recurring_transaction_id, func.max(ScheduledOccurrence.occurrence_date))
+        .group_by(ScheduledOccurrence.recurring_transaction_id)
+    ).all())
+
+    rows = []
+    for recurring_id, next_date, frequency, amount in db.session.execute(
+        select(RecurringTransaction.id, RecurringTransaction.next_date, RecurringTransaction.frequency, RecurringTransaction.amount)
+    ):
+        last = last_scheduled.get(recurring_id)
+        start = last + timedelta(days=1) if last else next_date
+        rows.extend(
+            {'recurring_transaction_id': recurring_id, 'occurrence_date': d, 'amount': amount}
+            for d in expand_occurrences(next_date, frequency, start, until)
+        )
+    if rows:
+        db.session.execute(insert(ScheduledOccurrence), rows)
+    return len(rows)
+
+def get_upcoming_occurrences(days=30):
+    """Scheduled recurring items due within the next `days` days, soonest first."""
     today = datetime.utcnow().date()
-    recurring_items = RecurringTransaction.query.filter(RecurringTransaction.next_date <= today).all()
-
-    for item in recurring_items:
-        while item.next_date <= today:
-            # Create transaction
-            new_t = Transaction(
-                date=item.next_date,
-                description=f"{item.description} (Recurring)",
-                amount=item.amount,
-                category=item.category,
-                is_pass_through=item.is_pass_through
-            )
-            if item.projects:
-                new_t.projects = item.projects
-
-            db.session.add(new_t)
-
-            # Update next date
-            if item.frequency == 'MONTHLY':
-                # Simple month increment
-                month = item.next_date.month
-                year = item.next_date.year + (month // 12)
-                month = (month % 12) + 1
-                try:
-                    item.next_date = item.next_date.replace(year=year, month=month)
-                except ValueError:
-                    # Handle last day of month issues
-                    # If 31st isn't in next month, use last day of next month
-                    import calendar
-                    last_day = calendar.monthrange(year, month)[1]
-                    item.next_date = item.next_date.replace(year=year, month=month, day=last_day)
-            elif item.frequency == 'WEEKLY':
-                item.next_date += timedelta(weeks=1)
-            elif item.frequency == 'ANNUAL':
-                item.next_date = item.next_date.replace(year=item.next_date.year + 1)
-
-            # Commit inside loop to avoid skipping if one fails?
-            # Better to commit all at once at the end.
+    return db.session.execute(
+        select(ScheduledOccurrence.occurrence_date, ScheduledOccurrence.amount, RecurringTransaction)
+        .join(RecurringTransaction, RecurringTransaction.id == ScheduledOccurrence.recurring_transaction_id)
+        .where(ScheduledOccurrence.occurrence_date.between(today, today + timedelta(days=days)))
+        .order_by(ScheduledOccurrence.occurrence_date, ScheduledOccurrence.id)
+    ).all()
 
+def process_recurring_transactions(batch_size=None):
+    """Post due scheduled occurrences to the ledger.
+
+    Due templates are handled `batch_size` at a time with one commit per batch.
+    A worker claims occurrences by deleting their `scheduled_occurrences` rows
+    (DELETE ... RETURNING), so parallel workers never post the same occurrence
+    twice; the unique (recurring_transaction_id, occurrence_date) index on
+    transactions backs that up, and an occurrence that collides with it is
+    skipped without holding up the rest of its batch. Returns the number of
+    ledger entries created.
+    """
+    if batch_size is None:
+        batch_size = current_app.config.get('BUDGET_RECURRING_BATCH_SIZE', 100)
+    today = datetime.utcnow().date()
+    extend_schedule()
     db.session.commit()
+    total_created = 0
+    last_id = 0
 
-def get_forecast_data():
-    """Generate 13-week forecast data."""
-    weeks = []
-    income_data = []
-    expense_data = []
+    while True:
+        template_ids = db.session.execute(
+            select(ScheduledOccurrence.recurring_transaction_id)
+            .where(ScheduledOccurrence.occurrence_date <= today, ScheduledOccurrence.recurring_transaction_id > last_id)
+            .group_by(ScheduledOccurrence.recurring_transaction_id)
+            .order_by(ScheduledOccurrence.recurring_transaction_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not template_ids:
+            break
+        last_id = template_ids[-1]
+
+        claimed = db.session.execute(
+            delete(ScheduledOccurrence)
+            .where(ScheduledOccurrence.recurring_transaction_id.in_(template_ids), ScheduledOccurrence.occurrence_date <= today)
+            .returning(ScheduledOccurrence.recurring_transaction_id, ScheduledOccurrence.occurrence_date)
+            .execution_options(synchronize_session=False)
+        ).all()
+        if not claimed:
+            # Another worker got here first.
+            db.session.rollback()
+            continue
+
+        templates = {
+            item.id: item for item in RecurringTransaction.query.filter(
+                RecurringTransaction.id.in_({recurring_id for recurring_id, _ in claimed})
+            )
+        }
+        project_links = {}
+        for recurring_id, project_id in db.session.execute(
+            select(recurring_transaction_projects.c.recurring_transaction_id, recurring_transaction_projects.c.project_id)
+            .where(recurring_transaction_projects.c.recurring_transaction_id.in_(templates.keys()))
+        ):
+            project_links.setdefault(recurring_id, []).append(project_id)
+
+        rows = [{
+            'date': occurrence_date,
+            'description': f"{templates[recurring_id].description} (Recurring)",
+            'amount': templates[recurring_id].amount,
+            'category': templates[recurring_id].category,
+            'is_pass_through': templates[recurring_id].is_pass_through,
+            'recurring_transaction_id': recurring_id,
+            'occurrence_date': occurrence_date,
+            'fingerprint': transaction_fingerprint(
+                occurrence_date, templates[recurring_id].amount, f"{templates[recurring_id].description} (Recurring)"
+            )
+        } for recurring_id, occurrence_date in sorted(claimed)]
 
+        for item in templates.values():
+            if item.next_date <= today:
+                item.next_date = next(expand_occurrences(item.next_date, item.frequency, today + timedelta(days=1)))
+
+        # An occurrence that is already in the ledger is skipped on its own; its
+        # schedule row was deleted by the claim above, so it is not retried.
+        posted = {
+            (recurring_id, occurrence_date): transaction_id
+            for transaction_id, recurring_id, occurrence_date in db.session.execute(
+                sqlite_insert(Transaction)
+                .on_conflict_do_nothing(index_elements=['recurring_transaction_id', 'occurrence_date'])
+                .returning(Transaction.id, Transaction.recurring_transaction_id, Transaction.occurrence_date),
+                rows
+            )
+        }
+        if len(posted) < len(rows):
+            current_app.logger.warning('Skipped %d recurring occurrence(s) already in the ledger.', len(rows) - len(posted))
+            rows = [row for row in rows if (row['recurring_transaction_id'], row['occurrence_date']) in posted]
+        transaction_ids = [posted[(row['recurring_transaction_id'], row['occurrence_date'])] for row in rows]
+
+        index_transaction_ngrams(zip(transaction_ids, (row['description'] for row in rows)))
+        links = [
+            {'transaction_id': transaction_id, 'project_id': project_id}
+            for transaction_id, row in zip(transaction_ids, rows)
+            for project_id in project_links.get(row['recurring_transaction_id'], [])
+        ]
+        allocations = [
+            allocation_rows(transaction_id, row['date'], row['amount'], project_links.get(row['recurring_transaction_id'], []))
+            for transaction_id, row in zip(transaction_ids, rows)
+        ]
+        if links:
+            db.session.execute(transaction_projects.insert(), links)
+            allocate_transactions([allocation for shares in allocations for allocation in shares])
+        apply_ledger_delta(rows)
+        apply_rollup_delta(
+            rollup_entry(row['date'], row['amount'], row['category'], row['is_pass_through'], shares)
+            for row, shares in zip(rows, allocations)
+        )
+        db.session.commit()
+        total_created += len(rows)
+
+    return total_created
+
+def get_forecast_data(weeks=13, granularity='week', retainers=True):
+    """Generate a `weeks`-long cash forecast bucketed by week (or by day).
+
+    Recurring items come from a date-range scan of `scheduled_occurrences`,
+    retainers are expanded straight into their dates, and each occurrence is
+    dropped into its bucket in a single pass. `retainers=False` leaves the
+    retainers out (the history forecast already sees them as income).
+    """
     today = datetime.utcnow().date()
+    bucket_days = 1 if granularity == 'day' else 7
+    bucket_count = weeks * 7 // bucket_days
+    end_date = today + timedelta(days=weeks * 7 - 1)
+
+    labels = [(today + timedelta(days=i * bucket_days)).strftime('%b %d') for i in range(bucket_count)]
+    income_data = [Decimal('0')] * bucket_count
+    expense_data = [Decimal('0')] * bucket_count
+
+    def add(amount, dates):
+        for d in dates:
+            i = (d - today).days // bucket_days
+            if amount > 0:
+                income_data[i] += amount
+            else:
+                expense_data[i] -= amount
+
+    if retainers:
+        # Active project retainers, paid on the 1st of the month
+        retainer_dates = list(retainer_occurrences(today, end_date))
+        for (retainer,) in db.session.execute(
+            select(Project.monthly_retainer).where(Project.status == 'ACTIVE', Project.monthly_retainer > 0)
+        ):
+            add(retainer, retainer_dates)
 
-    # Active projects retainers
-    active_projects = Project.query.filter_by(status='ACTIVE').all()
-    recurring_items = RecurringTransaction.query.all()
-
-    for i in range(13):
-        start_date = today + timedelta(weeks=i)
-        end_date = start_date + timedelta(days=6)
-
-        weeks.append(start_date.strftime('%b %d'))
-
-        week_income = Decimal('0')
-        week_expense = Decimal('0')
-
-        # Approximate project income
-        # If we assume retainers are paid on the 1st of the month
-        for p in active_projects:
-            # Simple logic: if the 1st of any month falls in this week
-            # Or just spread it out? The prompt says "upcoming retainers".
-            # Let's assume retainers are paid monthly on the day they were created?
-            # Or just use the 1st of the month for simplicity in the forecast.
-
-            # For now, let's distribute monthly retainer into 4 weeks for a smoother chart,
-            # OR better: pick a day (e.g., 1st of month).
-
-            # Let's try to see if 'today's day' of the month falls in this week
-            # This simulates a monthly payment cycle based on "now"
-            payment_day = 1 # Assume 1st of the month
-
-            current_check = start_date
-            while current_check <= end_date:
-                if current_check.day == payment_day:
-                    week_income += p.monthly_retainer
-                current_check += timedelta(days=1)
-
-        # Recurring items
-        for item in recurring_items:
-            # Calculate occurrences in this week
-            temp_date = item.next_date
-            # This is a bit complex to project exactly without a robust rrule engine
-            # But let's do a simple approximation
-
-            # If it's MONTHLY
-            if item.frequency == 'MONTHLY':
-                # Check if any "monthly anniversary" falls in this week
-                # (Simple check: is (current_date.day == item.next_date.day))
-                current_check = start_date
-                while current_check <= end_date:
-                    if current_check.day == item.next_date.day:
-                        if item.amount > 0: week_income += item.amount
-                        else: week_expense += abs(item.amount)
-                    current_check += timedelta(days=1)
-            elif item.frequency == 'WEEKLY':
-                # Weekly always hits once a week
-                if item.amount > 0: week_income += item.amount
-                else: week_expense += abs(item.amount)
-            # ANNUAL is rarer, skip for simple forecast unless it hits
-            elif item.frequency == 'ANNUAL':
-                if start_date <= item.next_date <= end_date:
-                    if item.amount > 0: week_income += item.amount
-                    else: week_expense += abs(item.amount)
-
-        income_data.append(float(week_income))
-        expense_data.append(float(week_expense))
+    # Recurring items, from the materialized schedule
+    for occurrence_date, amount in db.session.execute(
+        select(ScheduledOccurrence.occurrence_date, ScheduledOccurrence.amount)
+        .where(ScheduledOccurrence.occurrence_date.between(today, end_date))
+    ):
+        add(amount, (occurrence_date,))
 
     return {
-        "labels": weeks,
-        "income": income_data,
-        "expenses": expense_data
+        "labels": labels,
+        "income": [float(v) for v in income_data],
+        "expenses": [float(v) for v in expense_data]
     }
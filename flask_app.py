@@ -56,7 +56,9 @@ ROUTES_WITHOUT_CSRF = [
     'budget.login', 'budget.add_project', 'budget.update_project',
     'budget.add_time_entry', 'budget.add_recurring', 'budget.delete_recurring',
     'budget.add_asset', 'budget.delete_asset', 'budget.import_csv',
-    'budget.save_import', 'budget.add_transaction', 'budget.delete_transaction'
+    'budget.save_import', 'budget.add_transaction', 'budget.delete_transaction',
+    'budget.update_import_page', 'budget.discard_import', 'budget.reconcile',
+    'budget.timesheet', 'budget.import_time'
 ]
 
 db = SQLAlchemy(app)
@@ -2,11 +2,13 @@ import os
 from flask import Flask
 from dotenv import load_dotenv
 from blueprint import budget_bp, db
+from blueprint.scheduler import start_recurring_scheduler
+from blueprint.migrations import upgrade_database
 
 # Load environment variables from .env
 load_dotenv()
 
-def create_app():
+def create_app(start_scheduler=True):
     app = Flask(__name__)
 
     # Configuration
@@ -14,6 +16,28 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///budget.db')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
+    # Recurring transactions: post them from the dashboard (legacy), a background
+    # thread every N seconds, and/or `flask budget run-recurring` on a cron.
+    app.config['BUDGET_RECURRING_ON_REQUEST'] = os.environ.get('BUDGET_RECURRING_ON_REQUEST', '1') == '1'
+    app.config['BUDGET_RECURRING_INTERVAL'] = int(os.environ.get('BUDGET_RECURRING_INTERVAL', '0'))
+    app.config['BUDGET_RECURRING_BATCH_SIZE'] = int(os.environ.get('BUDGET_RECURRING_BATCH_SIZE', '100'))
+    # How far ahead recurring templates are materialized into scheduled_occurrences
+    app.config['BUDGET_SCHEDULE_HORIZON_DAYS'] = int(os.environ.get('BUDGET_SCHEDULE_HORIZON_DAYS', '400'))
+
+    # Default dashboard forecast horizon in weeks (13, 26 or 52)
+    app.config['BUDGET_FORECAST_WEEKS'] = int(os.environ.get('BUDGET_FORECAST_WEEKS', '13'))
+
+    # Cash on hand before the first ledger entry, for the Cash page's running balance
+    app.config['BUDGET_OPENING_BALANCE'] = os.environ.get('BUDGET_OPENING_BALANCE', '0')
+
+    # Worker processes for Monte Carlo cash scenarios (defaults to the CPU count; 1 runs in-process)
+    if os.environ.get('BUDGET_SIMULATION_WORKERS'):
+        app.config['BUDGET_SIMULATION_WORKERS'] = int(os.environ['BUDGET_SIMULATION_WORKERS'])
+
+    # Token-frequency model used to pre-fill categories on imported rows
+    # (defaults to budget_categorizer.json in the instance folder)
+    app.config['BUDGET_CATEGORIZER_PATH'] = os.environ.get('BUDGET_CATEGORIZER_PATH')
+
     # Initialize extensions
     db.init_app(app)
 
@@ -27,13 +51,17 @@ def create_app():
         return redirect(url_for('budget.dashboard'))
 
     with app.app_context():
-        db.create_all()
+        upgrade_database()
         print("Database initialized.")
 
+    if start_scheduler:
+        start_recurring_scheduler(app)
+
     return app
 
 if __name__ == '__main__':
-    app = create_app()
+    # The debug reloader runs this twice; only the serving child should schedule.
+    app = create_app(start_scheduler=os.environ.get('WERKZEUG_RUN_MAIN') == 'true')
     print("Starting KC Local SEO Budget Tool standalone runner...")
     print("Access the dashboard at http://127.0.0.1:5000/admin/budget")
     app.run(debug=True, port=5000)
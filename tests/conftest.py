@@ -0,0 +1,61 @@
+import io
+import pytest
+from run_standalone import create_app
+from blueprint.models import db, Transaction, ImportBatch, ImportRow
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "budget.db"}')
+    monkeypatch.setenv('BUDGET_CATEGORIZER_PATH', str(tmp_path / 'categorizer.json'))
+    monkeypatch.setenv('BUDGET_SIMULATION_WORKERS', '1')
+    app = create_app(start_scheduler=False)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['logged_in'] = True
+    return client
+
+class LedgerWriter:
+    """Ledger writes made through the routes, the way the UI makes them."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, description, amount, category='Other', date='2026-03-02', project_ids=(), **form):
+        self.client.post('/admin/budget/transactions/add', data={
+            'description': description, 'amount': amount, 'date': date, 'category': category,
+            'project_ids': [str(pid) for pid in project_ids], **form
+        })
+        transaction = Transaction.query.filter_by(description=description).order_by(Transaction.id.desc()).first()
+        assert transaction is not None, f'{description!r} was not added'
+        return transaction
+
+    def delete(self, transaction):
+        assert self.client.delete(f'/admin/budget/transactions/delete/{transaction.id}').status_code == 302
+
+    def import_csv(self, lines, category='Other', project_ids=(), edits=None):
+        """Upload 'date,description,amount' lines, then save every row with `category`, `project_ids`
+        and any per-line-number field overrides in `edits` ({line_no: {'amount': ...}})."""
+        csv = 'Date,Description,Amount\n' + ''.join(f'{line}\n' for line in lines)
+        self.client.post('/admin/budget/import', data={'file': (io.BytesIO(csv.encode()), 'statement.csv')},
+                         content_type='multipart/form-data')
+        batch = ImportBatch.query.order_by(ImportBatch.id.desc()).first()
+        form = {'batch_id': batch.id, 'row_id': []}
+        for row in ImportRow.query.filter_by(batch_id=batch.id).order_by(ImportRow.line_no):
+            form['row_id'].append(row.id)
+            form[f'save_{row.id}'] = 'on'
+            form[f'category_{row.id}'] = category
+            form[f'project_ids_{row.id}'] = [str(pid) for pid in project_ids]
+            for field, value in (edits or {}).get(row.line_no, {}).items():
+                form[f'{field}_{row.id}'] = value
+        self.client.post('/admin/budget/import/save', data=form)
+        return batch
+
+@pytest.fixture
+def ledger(client):
+    return LedgerWriter(client)
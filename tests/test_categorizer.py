@@ -0,0 +1,45 @@
+import json
+from decimal import Decimal
+from datetime import datetime, timedelta
+from blueprint.models import db, Project, RecurringTransaction, Transaction
+from blueprint.categorizer import model_path, suggest, train_from_ledger
+from blueprint.utils import process_recurring_transactions
+
+def saved_model():
+    with open(model_path(), encoding='utf-8') as f:
+        return json.load(f)
+
+def test_learned_model_matches_a_retrain(ledger):
+    project = Project(name='Client')
+    db.session.add(project)
+    db.session.commit()
+    ledger.add('Semrush Pro subscription', '99', category='Software')
+    ledger.add('Facebook ads for Client', '400', category='Marketing', is_pass_through='on', project_ids=[project.id])
+    ledger.delete(ledger.add('Team lunch', '60'))
+    ledger.delete(ledger.add('Facebook ads refund', '40', category='Marketing', project_ids=[project.id]))
+    ledger.import_csv(['2026-03-04,SEMRUSH PRO,-99', '2026-03-05,Client A retainer,1200'],
+                      category='Software', edits={2: {'category': 'Income'}})
+    db.session.add(RecurringTransaction(description='Hosting', amount=Decimal('-20'), category='Software',
+                                        frequency='WEEKLY', next_date=datetime.utcnow().date() - timedelta(days=8)))
+    db.session.commit()
+    process_recurring_transactions()
+    # Recurring postings are never learned, so deleting one must not unlearn anything.
+    ledger.delete(Transaction.query.filter(Transaction.recurring_transaction_id.isnot(None)).first())
+
+    learned = saved_model()
+    assert learned['docs'] == 4
+    assert 'lunch' not in learned['tokens']
+    assert train_from_ledger() == 4
+    assert saved_model() == learned
+
+def test_suggestions_follow_the_amount_sign(ledger):
+    project = Project(name='Client')
+    db.session.add(project)
+    db.session.commit()
+    for _ in range(3):
+        ledger.add('Facebook ads', '400', category='Marketing', is_pass_through='on', project_ids=[project.id])
+    ledger.add('Facebook payout', '50', category='Income')
+
+    assert suggest('FACEBOOK ADS 1234', sign=-1) == ('Marketing', True, [project.id])
+    assert suggest('Facebook', sign=1)[0] == 'Income'
+    assert suggest('unknown vendor') is None
@@ -0,0 +1,77 @@
+from decimal import Decimal
+from datetime import date, timedelta
+import pytest
+from blueprint.models import db, Transaction, CategoryForecast
+from blueprint.utils import apply_ledger_delta
+from blueprint.forecasting import refit_forecast, week_index
+
+TODAY = date(2026, 6, 10)
+
+def add(day, amount, category):
+    t = Transaction(date=day, description=category, amount=Decimal(amount), category=category)
+    db.session.add(t)
+    db.session.flush()
+    apply_ledger_delta([t])
+    db.session.commit()
+    return t
+
+def state():
+    return {f.category: (f.level, f.variance, f.seasonal, f.fitted_through) for f in CategoryForecast.query}
+
+def full_state(today=TODAY):
+    refit_forecast(full=True, today=today)
+    db.session.commit()
+    return state()
+
+@pytest.fixture
+def history(app):
+    for week in range(1, 40):
+        day = TODAY - timedelta(weeks=week)
+        add(day, 2000 + 37 * (week % 5), 'Income')
+        add(day - timedelta(days=2), -150 - 11 * (week % 3), 'Software')
+
+def test_incremental_refit_matches_full_refit(history):
+    refit_forecast(today=TODAY - timedelta(weeks=12))
+    db.session.commit()
+    assert refit_forecast(today=TODAY) == 12
+    db.session.commit()
+    incremental = state()
+    assert incremental == full_state()
+    assert refit_forecast(today=TODAY) == 0
+
+def test_backdated_entry_reaches_the_fit(history):
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    before = state()
+    add(TODAY - timedelta(weeks=20), '-900.00', 'Marketing')
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    after = state()
+    assert 'Marketing' in after and after != before
+    assert after == full_state()
+
+def test_deleting_a_fitted_entry_refits(history):
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    t = add(TODAY - timedelta(weeks=3), '5000.00', 'Income')
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    with_entry = state()
+    t = db.session.get(Transaction, t.id)
+    db.session.delete(t)
+    apply_ledger_delta([t], sign=-1)
+    db.session.commit()
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    assert state() != with_entry
+    assert state() == full_state()
+
+def test_entry_in_open_week_keeps_the_fit(history):
+    refit_forecast(today=TODAY)
+    db.session.commit()
+    before = state()
+    add(TODAY, '-75.00', 'Software')
+    assert refit_forecast(today=TODAY) == 0
+    db.session.commit()
+    assert state() == before
+    assert week_index(before['Income'][3]) == week_index(TODAY) - 1
@@ -0,0 +1,92 @@
+import io
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from blueprint.models import (db, ImportBatch, ImportRow, Project, RecurringTransaction, Transaction,
+                              TransactionAllocation, TransactionNgram)
+from blueprint.importers import stage_import, review_page, commit_import, flag_duplicates
+from blueprint.utils import process_recurring_transactions
+
+def statement(count):
+    return [{'date': f'03/{day:02d}/2026', 'description': f'  Vendor {day} ', 'amount': f'-{day}.00'} for day in range(1, count + 1)]
+
+def test_stage_import_numbers_rows_across_chunks(app):
+    batch = stage_import(iter(statement(7)), filename='march.csv', chunk_size=3)
+    db.session.commit()
+    assert batch.row_count == 7
+    assert [row.line_no for row in ImportRow.query.filter_by(batch_id=batch.id).order_by(ImportRow.id)] == list(range(1, 8))
+    assert [(row.line_no, row.description) for row in review_page(batch, 2, page_size=3)] == \
+        [(4, 'Vendor 4'), (5, 'Vendor 5'), (6, 'Vendor 6')]
+    assert [row.line_no for row in review_page(batch, 3, page_size=3)] == [7]
+
+def test_upload_stages_without_touching_the_ledger_and_discard_drops_it(client):
+    csv = 'Date,Description,Amount\n' + ''.join(f'2026-03-{day:02d},Vendor {day},-{day}\n' for day in range(1, 61))
+    response = client.post('/admin/budget/import', data={'file': (io.BytesIO(csv.encode()), 'march.csv')},
+                           content_type='multipart/form-data')
+    batch = ImportBatch.query.one()
+    assert response.headers['Location'].endswith(f'/import/{batch.id}')
+    assert (batch.row_count, Transaction.query.count()) == (60, 0)
+    assert 'Vendor 60' in client.get(f'/admin/budget/import/{batch.id}?page=2').get_data(as_text=True)
+
+    client.post(f'/admin/budget/import/{batch.id}/discard')
+    assert (ImportBatch.query.count(), ImportRow.query.count()) == (0, 0)
+
+def test_commit_import_posts_chunks_and_keeps_bad_rows_for_another_try(app):
+    project = Project(name='Client')
+    db.session.add(project)
+    db.session.flush()
+    rows = statement(5)
+    rows[3]['amount'] = 'twelve'
+    batch = stage_import(rows)
+    db.session.execute(ImportRow.__table__.update().values(category='Software', project_ids=f'{project.id},999'))
+
+    posted, errors = commit_import(batch, chunk_size=2)
+    db.session.commit()
+    assert (len(posted), errors) == (4, 1)
+    failed = ImportRow.query.filter_by(status='ERROR').one()
+    assert (failed.line_no, failed.error) == (4, "Invalid amount: 'twelve'")
+    assert [(a.project_id, a.amount) for a in TransactionAllocation.query.order_by(TransactionAllocation.amount)] == \
+        [(project.id, Decimal(f'-{day}.00')) for day in (5, 3, 2, 1)]
+
+    failed.amount_raw = '4'
+    assert len(commit_import(batch)[0]) == 1
+    db.session.commit()
+    assert sorted(t.date for t in Transaction.query) == [date(2026, 3, day) for day in range(1, 6)]
+
+def test_save_import_leaves_a_batch_with_errors_open(ledger):
+    batch = ledger.import_csv(['2026-03-01,Hosting,-20', '2026-03-02,Broken,abc'])
+    assert (batch.status, Transaction.query.count()) == ('PENDING', 1)
+    batch = ledger.import_csv(['2026-03-03,Hosting,-20'])
+    assert batch.status == 'COMMITTED'
+
+def duplicate_index():
+    db.session.expire_all()
+    return (sorted((t.id, t.fingerprint) for t in Transaction.query),
+            sorted(db.session.execute(select(TransactionNgram.ngram, TransactionNgram.transaction_id)).all()))
+
+def test_duplicate_index_matches_its_rebuild(app, ledger):
+    ledger.add('Semrush Pro', '99', date='2026-03-02')
+    ledger.delete(ledger.add('Lunch', '25', date='2026-03-02'))
+    ledger.import_csv(['2026-03-04,ADOBE *CREATIVE,-54.99', '2026-03-05,Client A,1200'], edits={2: {'category': 'Income'}})
+    db.session.add(RecurringTransaction(description='Hosting', amount=Decimal('-20'), frequency='WEEKLY',
+                                        next_date=datetime.utcnow().date() - timedelta(days=8)))
+    db.session.commit()
+    assert process_recurring_transactions() == 2
+    assert Transaction.query.count() == 5
+
+    kept = duplicate_index()
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-fingerprints']).exit_code == 0
+    assert duplicate_index() == kept
+
+def test_reimport_flags_exact_and_near_duplicates(ledger):
+    ledger.add('Semrush Pro', '99', date='2026-03-02')
+    ledger.add('Adobe Creative Cloud', '54.99', date='2026-03-04')
+    batch = stage_import(iter([
+        {'date': '2026-03-02', 'description': 'SEMRUSH PRO', 'amount': '-99.00'},
+        {'date': '2026-03-06', 'description': 'ADOBE CREATIVE CLD', 'amount': '-54.99'},
+        {'date': '2026-03-20', 'description': 'Adobe Creative Cloud', 'amount': '-54.99'},
+    ]))
+    assert flag_duplicates(batch) == 2
+    assert [(row.line_no, row.duplicate_match, row.selected) for row in review_page(batch, 1)] == \
+        [(1, 'EXACT', False), (2, 'FUZZY', False), (3, None, True)]
+    assert flag_duplicates(batch, fuzzy=False) == 1
@@ -0,0 +1,32 @@
+from decimal import Decimal
+from blueprint.models import db, LedgerSummary
+from blueprint.utils import calculate_agi, compute_agi_totals, LEDGER_SUMMARY_ID
+
+def assert_summary_matches_ledger():
+    db.session.expire_all()
+    summary = db.session.get(LedgerSummary, LEDGER_SUMMARY_ID)
+    assert (summary.total_revenue, summary.total_pass_through) == compute_agi_totals()
+
+def test_summary_follows_adds_deletes_and_imports(ledger):
+    ledger.add('Retainer', '5000', category='Income')
+    ledger.add('Ad spend', '1200', category='Marketing', is_pass_through='on')
+    office = ledger.add('Office', '300')
+    assert_summary_matches_ledger()
+    assert calculate_agi() == Decimal('3800.00')
+
+    ledger.delete(office)
+    ad_spend = ledger.add('More ad spend', '800', category='Marketing', is_pass_through='on')
+    ledger.delete(ad_spend)
+    assert_summary_matches_ledger()
+
+    # The reviewer edits an amount before saving.
+    ledger.import_csv(['2026-03-05,Client B,900', '2026-03-06,Client C,100'], category='Income',
+                      edits={2: {'amount': '150'}})
+    assert_summary_matches_ledger()
+    assert calculate_agi() == Decimal('4850.00')
+
+def test_agi_falls_back_to_the_aggregate_without_a_summary(ledger):
+    ledger.add('Retainer', '700', category='Income')
+    db.session.delete(db.session.get(LedgerSummary, LEDGER_SUMMARY_ID))
+    db.session.commit()
+    assert calculate_agi() == Decimal('700.00')
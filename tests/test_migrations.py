@@ -0,0 +1,87 @@
+import sqlite3
+from decimal import Decimal
+from datetime import date
+import pytest
+from sqlalchemy import inspect, select
+from run_standalone import create_app
+from blueprint.models import db, Transaction, TransactionAllocation, TimeRollup, LedgerRollup, BalanceCheckpoint
+from blueprint.migrations import MIGRATIONS, applied_versions, upgrade_database
+from blueprint.search import search_transactions
+
+# The schema as it stood before any migration existed.
+BASELINE_SCHEMA = """
+CREATE TABLE projects (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, monthly_retainer NUMERIC(10, 2),
+    cost_rate NUMERIC(10, 2), status VARCHAR(20), planned_hours NUMERIC(10, 2));
+CREATE TABLE transactions (id INTEGER PRIMARY KEY, date DATE NOT NULL, description VARCHAR(255) NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL, category VARCHAR(100), is_pass_through BOOLEAN);
+CREATE TABLE recurring_transactions (id INTEGER PRIMARY KEY, description VARCHAR(255) NOT NULL,
+    amount NUMERIC(10, 2) NOT NULL, category VARCHAR(100), frequency VARCHAR(50), is_pass_through BOOLEAN,
+    next_date DATE NOT NULL);
+CREATE TABLE time_entries (id INTEGER PRIMARY KEY, date DATE NOT NULL, hours NUMERIC(10, 2) NOT NULL,
+    description VARCHAR(255), project_id INTEGER NOT NULL REFERENCES projects (id));
+CREATE TABLE assets (id INTEGER PRIMARY KEY, name VARCHAR(100) NOT NULL, value NUMERIC(10, 2) NOT NULL,
+    purchase_date DATE NOT NULL);
+CREATE TABLE transaction_projects (transaction_id INTEGER NOT NULL REFERENCES transactions (id),
+    project_id INTEGER NOT NULL REFERENCES projects (id), PRIMARY KEY (transaction_id, project_id));
+CREATE TABLE recurring_transaction_projects (recurring_transaction_id INTEGER NOT NULL REFERENCES recurring_transactions (id),
+    project_id INTEGER NOT NULL REFERENCES projects (id), PRIMARY KEY (recurring_transaction_id, project_id));
+INSERT INTO projects VALUES (1, 'Legacy', 1000, 50, 'ACTIVE', 20);
+INSERT INTO transactions VALUES (1, '2026-01-05', 'Semrush', -99, 'Software', 0);
+INSERT INTO transactions VALUES (2, '2026-02-10', 'Client retainer', 1000, 'Income', 0);
+INSERT INTO transaction_projects VALUES (1, 1);
+INSERT INTO time_entries VALUES (1, '2026-02-03', 3.5, 'Audit', 1);
+"""
+
+@pytest.fixture
+def legacy_app(tmp_path, monkeypatch):
+    path = tmp_path / 'legacy.db'
+    with sqlite3.connect(path) as conn:
+        conn.executescript(BASELINE_SCHEMA)
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{path}')
+    monkeypatch.setenv('BUDGET_CATEGORIZER_PATH', str(tmp_path / 'categorizer.json'))
+    app = create_app(start_scheduler=False)
+    with app.app_context():
+        yield app
+        db.session.remove()
+
+def test_baseline_database_is_upgraded_and_backfilled(legacy_app):
+    assert applied_versions() == {version for version, _, _ in MIGRATIONS}
+    inspector = inspect(db.engine)
+    assert {'recurring_transaction_id', 'occurrence_date', 'fingerprint', 'is_cleared'} <= \
+        {column['name'] for column in inspector.get_columns('transactions')}
+    assert {'ix_transactions_date', 'uq_transactions_recurring_occurrence'} <= \
+        {index['name'] for index in inspector.get_indexes('transactions')}
+    assert 'ix_transaction_allocations_project_date' in \
+        {index['name'] for index in inspector.get_indexes('transaction_allocations')}
+
+    assert [(a.transaction_id, a.project_id, a.amount, a.date) for a in TransactionAllocation.query] == \
+        [(1, 1, Decimal('-99.00'), date(2026, 1, 5))]
+    assert all(t.fingerprint for t in Transaction.query)
+    assert {(r.period, r.project_id) for r in LedgerRollup.query} == {('2026-01', 1), ('2026-02', 0)}
+    assert {(r.grain, r.period_start, r.hours) for r in TimeRollup.query} == \
+        {('month', date(2026, 2, 1), Decimal('3.50')), ('week', date(2026, 2, 2), Decimal('3.50'))}
+    assert db.session.scalar(select(BalanceCheckpoint.balance).where(BalanceCheckpoint.checkpoint_date == date(2026, 3, 1))) \
+        == Decimal('901.00')
+    assert [t.id for t in search_transactions('sem')] == [1]
+
+def test_upgrade_is_a_no_op_once_applied(legacy_app):
+    assert upgrade_database() == []
+
+def test_allocation_dates_are_backfilled_for_existing_allocations(app):
+    conn = db.session.connection()
+    conn.exec_driver_sql("INSERT INTO projects (id, name) VALUES (1, 'P')")
+    conn.exec_driver_sql("INSERT INTO transactions (id, date, description, amount, is_cleared) VALUES (7, '2026-04-09', 'Ads', -30, 0)")
+    # transaction_allocations as step 3 left it, before dates were copied in
+    conn.exec_driver_sql('DROP TABLE transaction_allocations')
+    conn.exec_driver_sql(
+        'CREATE TABLE transaction_allocations (transaction_id INTEGER NOT NULL, project_id INTEGER NOT NULL, '
+        'weight NUMERIC(10, 4) NOT NULL, amount NUMERIC(10, 2) NOT NULL, PRIMARY KEY (transaction_id, project_id))'
+    )
+    conn.exec_driver_sql('INSERT INTO transaction_allocations VALUES (7, 1, 1, -30)')
+    conn.exec_driver_sql('DELETE FROM budget_schema_migrations WHERE version = 12')
+    db.session.commit()
+
+    assert upgrade_database() == [12]
+    assert [(a.transaction_id, a.date) for a in TransactionAllocation.query] == [(7, date(2026, 4, 9))]
+    assert 'ix_transaction_allocations_project_date' in \
+        {index['name'] for index in inspect(db.engine).get_indexes('transaction_allocations')}
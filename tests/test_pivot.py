@@ -0,0 +1,39 @@
+from run_standalone import create_app
+from blueprint.models import db, Project
+from blueprint.pivot import pivot
+from conftest import LedgerWriter
+
+def test_pivot_follows_ledger_writes(client, ledger):
+    project = Project(name='Client')
+    db.session.add(project)
+    db.session.commit()
+    ledger.add('Retainer', '1000', category='Income', date='2026-02-03', project_ids=[project.id])
+    ledger.add('Hosting', '20', category='Software', date='2026-02-10')
+    assert pivot('month', 'category') == {
+        'row_labels': ['2026-02'], 'col_labels': ['Income', 'Software'],
+        'values': [[100000, -2000]], 'row_totals': [98000], 'col_totals': [100000, -2000], 'total': 98000,
+    }
+
+    ledger.delete(ledger.add('Lunch', '35', date='2026-03-01'))
+    ledger.import_csv(['2026-03-04,Ads,-250'], category='Marketing', project_ids=[project.id])
+    table = pivot('project', 'month', 'expenses')
+    assert (table['row_labels'], table['col_labels'], table['values']) == \
+        (['No Project', 'Client'], ['2026-02', '2026-03'], [[2000, 0], [0, 25000]])
+
+    response = client.get('/admin/budget/reports/pivot?rows=category&measure=count&format=json')
+    assert response.get_json()['values'] == [[1], [1], [1]]
+
+def test_pivot_snapshot_is_not_shared_between_databases(ledger, tmp_path, monkeypatch):
+    ledger.add('Retainer', '500', category='Income', date='2026-02-03')
+    assert pivot('year')['total'] == 50000
+
+    # A second database at the same ledger version
+    monkeypatch.setenv('DATABASE_URL', f'sqlite:///{tmp_path / "other.db"}')
+    other = create_app(start_scheduler=False)
+    with other.app_context():
+        client = other.test_client()
+        with client.session_transaction() as session:
+            session['logged_in'] = True
+        LedgerWriter(client).add('Retainer', '700', category='Income', date='2026-02-03')
+        assert pivot('year')['total'] == 70000
+        db.session.remove()
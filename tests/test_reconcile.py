@@ -0,0 +1,38 @@
+from decimal import Decimal
+from datetime import date, timedelta
+from types import SimpleNamespace
+from blueprint.models import db, Transaction
+from blueprint.reconcile import _merge, reconcile_statement
+
+def entry(day, id):
+    return SimpleNamespace(id=id, date=date(2026, 3, day))
+
+def line(day):
+    return (date(2026, 3, day), Decimal('10.00'), '')
+
+def test_merge_takes_earliest_entry_within_tolerance():
+    ledger = [entry(1, 1), entry(5, 2), entry(6, 3)]
+    matches, unmatched_statement, unmatched_ledger = _merge([line(6), line(20)], ledger, timedelta(days=3))
+    assert [(l[0].day, e.id) for l, e in matches] == [(6, 2)]
+    assert unmatched_statement == [line(20)]
+    assert [e.id for e in unmatched_ledger] == [1, 3]
+
+def test_reconcile_statement_clears_matches(app):
+    db.session.add_all([
+        Transaction(date=date(2026, 3, 2), description='Semrush', amount=Decimal('-99.00'), category='Software'),
+        Transaction(date=date(2026, 3, 9), description='Client', amount=Decimal('1500.00'), category='Income'),
+        Transaction(date=date(2026, 3, 20), description='Lunch', amount=Decimal('-25.00'), category='Other'),
+    ])
+    db.session.commit()
+    result = reconcile_statement([
+        {'date': '2026-03-03', 'description': 'SEMRUSH', 'amount': '-99.00'},
+        {'date': '2026-03-09', 'description': 'DEPOSIT', 'amount': '1500'},
+        {'date': '2026-03-21', 'description': 'ATM', 'amount': '-40.00'},
+        {'date': 'someday', 'description': 'bad', 'amount': '1'},
+    ])
+    db.session.commit()
+    assert sorted(e.description for _, e in result['matched']) == ['Client', 'Semrush']
+    assert [l[1] for l in result['unmatched_statement']] == [Decimal('-40.00')]
+    assert [e.description for e in result['unmatched_ledger']] == ['Lunch']
+    assert len(result['unreadable']) == 1
+    assert {t.description: t.is_cleared for t in Transaction.query} == {'Semrush': True, 'Client': True, 'Lunch': False}
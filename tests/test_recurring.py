@@ -0,0 +1,104 @@
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from sqlalchemy import select
+from blueprint.models import db, Project, RecurringTransaction, ScheduledOccurrence, Transaction
+from blueprint.utils import process_recurring_transactions, expand_occurrences, get_forecast_data, get_upcoming_occurrences
+
+TODAY = datetime.utcnow().date()
+
+def add_recurring(client, description, amount, frequency='WEEKLY', next_date=TODAY - timedelta(days=20), **form):
+    client.post('/admin/budget/recurring/add', data={
+        'description': description, 'amount': amount, 'category': 'Software',
+        'frequency': frequency, 'next_date': next_date.isoformat(), **form
+    })
+    return RecurringTransaction.query.filter_by(description=description).one()
+
+def posted(item):
+    return sorted(t.occurrence_date for t in Transaction.query.filter_by(recurring_transaction_id=item.id))
+
+def test_dashboard_leaves_posting_to_the_cli_when_configured(app, client):
+    app.config['BUDGET_RECURRING_ON_REQUEST'] = False
+    item = add_recurring(client, 'Hosting', '20')
+    assert client.get('/admin/budget/').status_code == 200
+    assert posted(item) == []
+
+    result = app.test_cli_runner().invoke(args=['budget', 'run-recurring', '--batch-size', '1'])
+    assert 'Created 3 recurring transaction(s).' in result.output
+    assert posted(item) == [TODAY - timedelta(days=d) for d in (20, 13, 6)]
+    assert db.session.get(RecurringTransaction, item.id).next_date == TODAY + timedelta(days=1)
+
+def test_dashboard_posts_due_items_by_default(client):
+    item = add_recurring(client, 'Hosting', '20', frequency='MONTHLY')
+    client.get('/admin/budget/')
+    assert posted(item) == [TODAY - timedelta(days=20)]
+
+def test_posting_twice_creates_each_occurrence_once(client):
+    item = add_recurring(client, 'Hosting', '20')
+    assert process_recurring_transactions() == 3
+    assert process_recurring_transactions() == 0
+    assert len(posted(item)) == 3
+
+def test_occurrence_already_in_the_ledger_is_skipped_without_blocking_its_batch(client):
+    hosting = add_recurring(client, 'Hosting', '20')
+    process_recurring_transactions()
+    # A stale schedule row for a posted occurrence, as a racing worker would leave it,
+    # claimed in the same batch as a new template's due occurrence.
+    db.session.add(ScheduledOccurrence(recurring_transaction_id=hosting.id, occurrence_date=TODAY - timedelta(days=6),
+                                       amount=Decimal('-20')))
+    db.session.commit()
+    payroll = add_recurring(client, 'Payroll', '500', frequency='MONTHLY')
+
+    assert process_recurring_transactions() == 1
+    assert posted(hosting) == [TODAY - timedelta(days=d) for d in (20, 13, 6)]
+    assert posted(payroll) == [TODAY - timedelta(days=20)]
+
+def test_monthly_occurrences_return_to_the_anchor_day_after_clamping():
+    dates = expand_occurrences(date(2026, 1, 31), 'MONTHLY', date(2026, 2, 1), date(2026, 5, 1))
+    assert list(dates) == [date(2026, 2, 28), date(2026, 3, 31), date(2026, 4, 30)]
+
+def test_expansion_jumps_to_the_window():
+    assert list(expand_occurrences(date(2020, 1, 6), 'WEEKLY', date(2026, 3, 4), date(2026, 3, 16))) == \
+        [date(2026, 3, 9), date(2026, 3, 16)]
+    assert list(expand_occurrences(date(2024, 2, 29), 'ANNUAL', date(2025, 1, 1), date(2028, 12, 31))) == \
+        [date(2025, 2, 28), date(2026, 2, 28), date(2027, 2, 28), date(2028, 2, 29)]
+    assert next(expand_occurrences(date(2026, 3, 1), 'MONTHLY', date(2020, 1, 1))) == date(2026, 3, 1)
+
+def test_forecast_buckets_scheduled_items_and_retainers(client):
+    db.session.add(Project(name='Client', monthly_retainer=Decimal('1000'), status='ACTIVE'))
+    db.session.commit()
+    add_recurring(client, 'Hosting', '20', next_date=TODAY + timedelta(days=3))
+    forecast = get_forecast_data(weeks=13, granularity='day')
+
+    assert len(forecast['labels']) == 91
+    expected_expenses = [0.0] * 91
+    for day in range(3, 91, 7):
+        expected_expenses[day] = 20.0
+    assert forecast['expenses'] == expected_expenses
+    retainer_days = [(d - TODAY).days for d in expand_occurrences(TODAY.replace(day=1), 'MONTHLY', TODAY, TODAY + timedelta(days=90))]
+    assert [i for i, income in enumerate(forecast['income']) if income] == retainer_days
+    assert sum(get_forecast_data(weeks=13)['income']) == 1000.0 * len(retainer_days)
+
+def schedule():
+    return sorted(db.session.execute(
+        select(ScheduledOccurrence.recurring_transaction_id, ScheduledOccurrence.occurrence_date, ScheduledOccurrence.amount)
+    ).all())
+
+def assert_schedule_matches_rebuild(app):
+    kept = schedule()
+    result = app.test_cli_runner().invoke(args=['budget', 'rebuild-schedule'])
+    assert result.exit_code == 0
+    assert schedule() == kept
+
+def test_schedule_follows_template_writes_and_posting(app, client):
+    hosting = add_recurring(client, 'Hosting', '20')
+    payroll = add_recurring(client, 'Payroll', '500', frequency='MONTHLY', next_date=TODAY + timedelta(days=2))
+    assert_schedule_matches_rebuild(app)
+
+    process_recurring_transactions()
+    assert min(row.occurrence_date for row in schedule()) > TODAY
+    assert_schedule_matches_rebuild(app)
+
+    client.post(f'/admin/budget/recurring/delete/{hosting.id}')
+    assert {row.recurring_transaction_id for row in schedule()} == {payroll.id}
+    assert_schedule_matches_rebuild(app)
+    assert [row.occurrence_date for row in get_upcoming_occurrences(days=30)] == [TODAY + timedelta(days=2)]
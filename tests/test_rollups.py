@@ -0,0 +1,179 @@
+import io
+from decimal import Decimal
+from datetime import date, datetime, timedelta
+from sqlalchemy import event
+from blueprint.models import (db, BalanceCheckpoint, LedgerRollup, Project, RecurringTransaction, TimeEntry, TimeRollup,
+                              Transaction)
+from blueprint.rollups import time_rollup_entry, apply_time_rollup_delta
+from blueprint.cash import balance_on
+from blueprint.utils import get_project_stats, get_project_summaries, get_project_totals, process_recurring_transactions
+
+def log(project, day, hours):
+    db.session.add(TimeEntry(project_id=project.id, date=day, hours=Decimal(hours), description=''))
+    apply_time_rollup_delta([time_rollup_entry(project.id, day, Decimal(hours))])
+
+def test_dashboard_project_stats_cover_the_current_month(app):
+    project = Project(name='Retainer', monthly_retainer=Decimal('3000'), cost_rate=Decimal('50'),
+                      planned_hours=Decimal('40'), status='ACTIVE')
+    db.session.add(project)
+    db.session.flush()
+    log(project, date(2026, 2, 27), '100')
+    log(project, date(2026, 3, 2), '20')
+    log(project, date(2026, 3, 16), '10')
+    db.session.commit()
+
+    stats = get_project_stats([project], on=date(2026, 3, 20))[project.id]
+    assert stats['hours'] == Decimal('30')
+    assert stats['ahr'] == Decimal('100')
+    assert stats['margin'] == Decimal('50')
+    assert stats['burn'] == Decimal('75')
+
+def test_project_list_flags_over_planned_from_the_current_month(app):
+    busy = Project(name='Busy', monthly_retainer=Decimal('1000'), cost_rate=Decimal('0'),
+                   planned_hours=Decimal('10'), status='ACTIVE')
+    quiet = Project(name='Quiet', monthly_retainer=Decimal('1000'), cost_rate=Decimal('0'),
+                    planned_hours=Decimal('10'), status='ACTIVE')
+    db.session.add_all([busy, quiet])
+    db.session.flush()
+    log(busy, date(2026, 3, 3), '12')
+    # Lots of hours last month, but only 5 this month
+    log(quiet, date(2026, 2, 10), '40')
+    log(quiet, date(2026, 3, 4), '5')
+    db.session.commit()
+    on = date(2026, 3, 20)
+
+    rows = get_project_summaries(sort='burn_desc', on=on)
+    assert [(row.Project.name, row.burn, row.ahr) for row in rows] == [
+        ('Busy', Decimal('120'), Decimal('83.33')), ('Quiet', Decimal('50'), Decimal('200'))
+    ]
+    assert [row.Project.name for row in get_project_summaries(filter_key='over_planned', on=on)] == ['Busy']
+    stats = get_project_stats([busy, quiet], on=on)
+    assert [stats[p.id]['burn'] for p in (busy, quiet)] == [row.burn for row in rows]
+
+def count_queries(fn):
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.engine, 'before_cursor_execute', listener)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', listener)
+    return len(statements)
+
+def test_project_pages_query_count_does_not_grow_with_projects(client):
+    def add_projects(count):
+        for i in range(count):
+            project = Project(name=f'P{i}', monthly_retainer=Decimal('1000'), planned_hours=Decimal('10'), status='ACTIVE')
+            db.session.add(project)
+            db.session.flush()
+            log(project, datetime.utcnow().date(), '2')
+        db.session.commit()
+
+    def get(page):
+        assert client.get(page).status_code == 200
+
+    add_projects(2)
+    pages = ('/admin/budget/', '/admin/budget/time-tracking', '/admin/budget/projects')
+    few = [count_queries(lambda: get(page)) for page in pages]
+    add_projects(8)
+    assert [count_queries(lambda: get(page)) for page in pages] == few
+
+def test_project_list_totals_sorts_and_filters(ledger):
+    alpha = Project(name='Alpha', monthly_retainer=Decimal('1000'), cost_rate=Decimal('80'), status='ACTIVE')
+    beta = Project(name='Beta', monthly_retainer=Decimal('1000'), cost_rate=Decimal('10'), status='ACTIVE')
+    done = Project(name='Done', status='COMPLETED')
+    db.session.add_all([alpha, beta, done])
+    db.session.commit()
+    ledger.add('Shared retainer', '3000', category='Income', project_ids=[alpha.id, beta.id], **{f'weight_{alpha.id}': '2'})
+    ledger.add('Beta tools', '400', project_ids=[beta.id])
+    ledger.delete(ledger.add('Refunded', '50', project_ids=[alpha.id]))
+    ledger.add('Old work', '10', project_ids=[done.id])
+    log(alpha, datetime.utcnow().date(), '10')
+
+    rows = get_project_summaries(sort='net_desc')
+    totals = get_project_totals([alpha.id, beta.id])
+    assert [row.Project.name for row in rows] == ['Alpha', 'Beta']
+    assert [(row.income, row.expenses, row.net) for row in rows] == \
+        [(totals[p.id]['income'], totals[p.id]['expenses'], totals[p.id]['net']) for p in (alpha, beta)]
+    assert rows[0].net == Decimal('2000.00') and rows[1].net == Decimal('600.00')
+
+    assert [row.Project.name for row in get_project_summaries(filter_key='low_margin')] == ['Alpha']
+    assert [row.Project.name for row in get_project_summaries(sort='margin_desc')] == ['Beta', 'Alpha']
+    assert [row.Project.name for row in get_project_summaries(show_inactive=True, sort='bogus')] == ['Alpha', 'Beta', 'Done']
+
+def ledger_rollup():
+    db.session.expire_all()
+    return sorted(
+        (r.period, r.category, bool(r.is_pass_through), r.project_id, r.income, r.expenses, r.entry_count)
+        for r in LedgerRollup.query
+    )
+
+def test_ledger_rollup_matches_its_rebuild(app, ledger):
+    alpha, beta = Project(name='Alpha'), Project(name='Beta')
+    db.session.add_all([alpha, beta])
+    db.session.commit()
+    ledger.add('Shared retainer', '3000', category='Income', date='2026-02-03',
+               project_ids=[alpha.id, beta.id], **{f'weight_{alpha.id}': '2'})
+    ledger.add('Ads', '500', category='Marketing', date='2026-02-10', is_pass_through='on', project_ids=[alpha.id])
+    ledger.delete(ledger.add('Refunded ads', '40', category='Marketing', date='2026-02-11', project_ids=[beta.id]))
+    ledger.delete(ledger.add('Office', '120', date='2026-03-02'))
+    ledger.import_csv(['2026-03-04,Hosting,-20', '2026-04-01,Client B,700'], project_ids=[beta.id],
+                      edits={2: {'category': 'Income'}})
+    db.session.add(RecurringTransaction(description='Payroll', amount=Decimal('-900'), category='Payroll',
+                                        frequency='MONTHLY', next_date=datetime.utcnow().date() - timedelta(days=40)))
+    db.session.commit()
+    assert process_recurring_transactions() == 2
+
+    kept = ledger_rollup()
+    assert ('2026-03', 'Other', False, 0, Decimal('0'), Decimal('120'), 1) not in kept
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-rollup']).exit_code == 0
+    assert ledger_rollup() == kept
+
+def time_rollup():
+    db.session.expire_all()
+    return sorted((r.grain, r.period_start, r.project_id, r.hours, r.entry_count) for r in TimeRollup.query)
+
+def test_time_rollup_matches_its_rebuild(app, client):
+    alpha = Project(name='Alpha', status='ACTIVE')
+    beta = Project(name='Beta', status='ACTIVE')
+    db.session.add_all([alpha, beta])
+    db.session.commit()
+    client.post('/admin/budget/time-tracking/add', data={'project_id': alpha.id, 'hours': '2.5', 'date': '2026-02-27'})
+    client.post('/admin/budget/time-tracking/timesheet', data={
+        'week': '2026-03-02', f'hours-{alpha.id}-0': '1:30', f'hours-{beta.id}-6': '4'
+    })
+    csv = b'Project,Date,Hours\nBeta,2026-03-31,2\nAlpha,2026-04-01,0:45\n'
+    client.post('/admin/budget/time-tracking/import', data={'file': (io.BytesIO(csv), 'harvest.csv')},
+                content_type='multipart/form-data')
+    assert TimeEntry.query.count() == 5
+
+    kept = time_rollup()
+    assert ('week', date(2026, 3, 30), beta.id, Decimal('2.00'), 1) in kept
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-rollup']).exit_code == 0
+    assert time_rollup() == kept
+
+def checkpoints():
+    db.session.expire_all()
+    return [(c.checkpoint_date, c.balance) for c in BalanceCheckpoint.query.order_by(BalanceCheckpoint.checkpoint_date)]
+
+def test_balance_checkpoints_match_their_rebuild(app, client, ledger):
+    ledger.add('Retainer', '3000', category='Income', date='2026-01-05')
+    ledger.add('Payroll', '1800', category='Payroll', date='2026-02-15')
+    assert client.get('/admin/budget/cash').status_code == 200
+    assert checkpoints()[:3] == [(date(2026, 1, 1), 0), (date(2026, 2, 1), 3000), (date(2026, 3, 1), 1200)]
+
+    ledger.delete(ledger.add('Software', '99', date='2026-02-20'))
+    ledger.delete(Transaction.query.filter_by(description='Payroll').one())
+    ledger.import_csv(['2026-01-20,Client B,500', '2026-03-03,Hosting,-20'], edits={1: {'category': 'Income'}})
+    # Dated before the first checkpoint; the cash page adds the missing months.
+    ledger.add('Deposit', '250', category='Income', date='2025-11-10')
+    client.get('/admin/budget/cash')
+
+    kept = checkpoints()
+    assert kept[:5] == [(date(2025, 11, 1), 0), (date(2025, 12, 1), 250), (date(2026, 1, 1), 250),
+                        (date(2026, 2, 1), 3750), (date(2026, 3, 1), 3750)]
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-balances']).exit_code == 0
+    assert checkpoints() == kept
+    for day in (date(2025, 10, 31), date(2026, 1, 19), date(2026, 1, 20), date(2026, 3, 3)):
+        expected = sum((t.amount for t in Transaction.query.filter(Transaction.date <= day)), Decimal('0'))
+        assert balance_on(day) == expected
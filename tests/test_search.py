@@ -0,0 +1,45 @@
+from decimal import Decimal
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from blueprint.models import db, Project, RecurringTransaction, Transaction
+from blueprint.search import match_expression, search_transactions
+from blueprint.utils import process_recurring_transactions
+
+QUERIES = ('adobe', 'ado', 'creative cloud', 'lunch', 'hosting', 'software', 'client', 'marketing')
+
+def results():
+    db.session.expire_all()
+    return {q: [t.id for t in search_transactions(q)] for q in QUERIES}
+
+def test_search_index_matches_its_rebuild(app, ledger):
+    ledger.add('Adobe Creative Cloud', '54.99', category='Software')
+    ledger.delete(ledger.add('Team lunch', '60'))
+    ledger.import_csv(['2026-03-04,ADOBE *CREATIVE,-54.99', '2026-03-05,Client A,1200'],
+                      edits={2: {'category': 'Income'}})
+    # Recategorizing goes through the UPDATE trigger
+    adobe = Transaction.query.filter_by(description='ADOBE *CREATIVE').one()
+    adobe.category = 'Marketing'
+    db.session.add(RecurringTransaction(description='Hosting', amount=Decimal('-20'), category='Software',
+                                        frequency='WEEKLY', next_date=datetime.utcnow().date() - timedelta(days=1)))
+    db.session.commit()
+    process_recurring_transactions()
+
+    kept = results()
+    assert kept['lunch'] == [] and kept['marketing'] == [adobe.id] and len(kept['ado']) == 2
+    db.session.execute(text("INSERT INTO transactions_fts(transactions_fts, rank) VALUES ('integrity-check', 1)"))
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-search']).exit_code == 0
+    assert results() == kept
+
+def test_search_ranks_description_matches_first_and_applies_filters(ledger):
+    project = Project(name='Client')
+    db.session.add(project)
+    db.session.commit()
+    in_description = ledger.add('Monthly software bundle', '10', category='Other', date='2026-03-01')
+    in_category = ledger.add('Bundle', '10', category='Software', date='2026-02-01', project_ids=[project.id])
+    assert [t.id for t in search_transactions('software')] == [in_description.id, in_category.id]
+    assert [t.id for t in search_transactions('software', {'project': project.id})] == [in_category.id]
+    assert [t.id for t in search_transactions('software', {'start': datetime(2026, 3, 1).date()})] == [in_description.id]
+
+def test_match_expression_quotes_user_input():
+    assert match_expression('AND "x" OR*') == '"AND"* "x"* "OR"*'
+    assert match_expression(' -- ') is None
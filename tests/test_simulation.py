@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+from blueprint.simulation import run_simulation, PARALLEL_MIN_TRIALS
+
+def inputs(churn=0.0):
+    # Two clients paid on days 0, 28 and 56; a weekly tool and one client invoice.
+    return {
+        'weeks': 10,
+        'start_balance': 1000.0,
+        'retainers': np.array([500.0, 250.0]),
+        'churn': np.array([churn, churn]),
+        'retainer_days': np.array([0, 28, 56]),
+        'occurrence_days': np.array([3, 10, 17, 24, 40]),
+        'occurrence_amounts': np.array([-50.0, -50.0, -50.0, -50.0, 400.0]),
+    }
+
+def deterministic(data):
+    net = np.zeros(data['weeks'])
+    for day in data['retainer_days']:
+        net[day // 7] += data['retainers'].sum()
+    for day, amount in zip(data['occurrence_days'], data['occurrence_amounts']):
+        net[day // 7] += amount
+    return data['start_balance'] + np.cumsum(net)
+
+def test_seeded_runs_repeat_on_any_pool_size():
+    a = run_simulation(inputs(0.1), trials=PARALLEL_MIN_TRIALS, seed=7, workers=1)
+    b = run_simulation(inputs(0.1), trials=PARALLEL_MIN_TRIALS, seed=7, workers=2)
+    assert a == b
+    assert run_simulation(inputs(0.1), trials=2500, seed=8, workers=2) != run_simulation(inputs(0.1), trials=2500, seed=7, workers=2)
+
+def test_without_randomness_every_band_is_the_forecast():
+    result = run_simulation(inputs(), trials=300, late_probability=0, expense_variance=0, seed=1, workers=1)
+    for band in result['percentiles'].values():
+        assert np.allclose(band, deterministic(inputs()))
+    assert result['negative_probability'] == 0
+
+def test_certain_churn_stops_every_retainer():
+    data = inputs(1.0)
+    result = run_simulation(data, trials=200, late_probability=0, expense_variance=0, seed=1, workers=1)
+    data['retainers'] = np.zeros(2)
+    assert np.allclose(result['percentiles'][90], deterministic(data))
+
+def test_late_payments_only_delay_income():
+    result = run_simulation(inputs(), trials=2000, late_probability=1, late_days=5, expense_variance=0, seed=3, workers=1)
+    forecast = deterministic(inputs())
+    assert np.all(np.array(result['percentiles'][90]) <= forecast + 1e-9)
+    assert result['percentiles'][50][0] < forecast[0]
+
+def test_trials_are_capped():
+    assert run_simulation(inputs(), trials=10 ** 9, seed=1, workers=1)['trials'] == 50000
+
+def test_churn_is_not_a_run_option():
+    with pytest.raises(TypeError):
+        run_simulation(inputs(), trials=10, churn={1: 0.5}, workers=1)
+
+@pytest.mark.parametrize('query', ['churn=nan&late=inf&late_days=nan&variance=-inf', 'churn=abc&late_days=1e999'])
+def test_cash_page_ignores_non_finite_scenario_values(client, query):
+    response = client.get(f'/admin/budget/cash?simulate=1&trials=100&seed=1&{query}')
+    assert response.status_code == 200
+    assert b'value="nan"' not in response.data and b'value="inf"' not in response.data
+    assert b'value="2"' in response.data  # default churn, in percent
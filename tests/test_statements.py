@@ -0,0 +1,105 @@
+import io
+import pytest
+from blueprint.statements import detect_parser, _clean_amount
+
+def parse(data):
+    stream = io.BytesIO(data)
+    parser = detect_parser(stream)
+    assert parser is not None
+    return parser.name, list(parser.parse(stream))
+
+OFX_SGML = b"""OFXHEADER:100
+DATA:OFXSGML
+VERSION:102
+
+<OFX>
+<BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN>
+<TRNTYPE>DEBIT
+<DTPOSTED>20260203120000[-5:EST]
+<TRNAMT>-42.10
+<NAME>SEMRUSH &amp; CO
+</STMTTRN>
+<STMTTRN>
+<TRNTYPE>CREDIT
+<DTPOSTED>20260205
+<TRNAMT>1500.00
+<MEMO>Client X retainer
+</STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1>
+</OFX>
+"""
+
+OFX_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<?OFX OFXHEADER="200" VERSION="220"?>
+<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>
+<STMTTRN><TRNTYPE>DEBIT</TRNTYPE><DTPOSTED>20260110</DTPOSTED><TRNAMT>-9.99</TRNAMT><NAME>Hosting</NAME></STMTTRN>
+</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>
+"""
+
+def test_ofx_sgml():
+    name, rows = parse(OFX_SGML)
+    assert name == 'ofx'
+    assert rows == [
+        {'date': '2026-02-03', 'description': 'SEMRUSH & CO', 'amount': '-42.10'},
+        {'date': '2026-02-05', 'description': 'Client X retainer', 'amount': '1500.00'},
+    ]
+
+def test_ofx_xml():
+    name, rows = parse(OFX_XML)
+    assert name == 'ofx'
+    assert rows == [{'date': '2026-01-10', 'description': 'Hosting', 'amount': '-9.99'}]
+
+def test_ofx_read_across_chunks(monkeypatch):
+    monkeypatch.setattr('blueprint.statements.OFX_CHUNK_SIZE', 7)
+    assert parse(OFX_SGML)[1][1]['amount'] == '1500.00'
+
+def test_split_csv_below_summary_block():
+    data = (b"Account,12345678\nBalance,\"2,000.00\"\n\n"
+            b"Posting Date,Description,Debit,Credit\n"
+            b"02/01/2026,Semrush,\"1,099.00\",\n"
+            b"02/03/2026,Client X,,1500\n")
+    name, rows = parse(data)
+    assert name == 'csv_split'
+    assert [(row['date'], row['amount']) for row in rows] == [('02/01/2026', '-1099.00'), ('02/03/2026', '1500')]
+
+def test_amount_csv_with_thousands_separators():
+    name, rows = parse(b'Date,Description,Amount\n2026-02-01,Payroll,"-1,234.50"\n2026-02-02,Refund,(12.00)\n')
+    assert name == 'csv'
+    assert [row['amount'] for row in rows] == ['-1234.50', '-12.00']
+
+def test_semicolon_csv_with_decimal_comma():
+    data = 'Date;Description;Amount\n01.02.2026;Café;-3,50\n02.02.2026;Rent;-1.200,00\n03.02.2026;Client;2500\n'.encode()
+    name, rows = parse(data)
+    assert name == 'csv'
+    assert [row['amount'] for row in rows] == ['-3.50', '-1200.00', '2500']
+    assert rows[0]['description'] == 'Café'
+
+def test_semicolon_split_csv_with_decimal_comma():
+    name, rows = parse(b'Booking Date;Payee;Money Out;Money In\n2026-03-01;Tools;1.049,90;\n2026-03-02;Client;;750,5\n')
+    assert name == 'csv_split'
+    assert [row['amount'] for row in rows] == ['-1049.90', '750.5']
+
+def test_headerless_csv():
+    name, rows = parse(b'"02/03/2026","-25.00","*","","ADOBE CREATIVE CLOUD"\n"02/04/2026","300.00","*","","DEPOSIT"\n')
+    assert name == 'csv_headerless'
+    assert rows == [
+        {'date': '02/03/2026', 'description': 'ADOBE CREATIVE CLOUD', 'amount': '-25.00'},
+        {'date': '02/04/2026', 'description': 'DEPOSIT', 'amount': '300.00'},
+    ]
+
+def test_unrecognised_upload():
+    assert detect_parser(io.BytesIO(b'just some text\nwithout columns\n')) is None
+
+@pytest.mark.parametrize('value, decimal_comma, expected', [
+    ('$1,234.50', False, '1234.50'),
+    ('1,234', False, '1234'),
+    ('-3,50', False, '-3.50'),
+    ('-1.200,00', False, '-1200.00'),
+    ('(1.200,00)', False, '-1200.00'),
+    ('1.234,5', True, '1234.5'),
+    ('1,234.50', True, '1234.50'),
+    ('n/a', False, 'n/a'),
+])
+def test_clean_amount(value, decimal_comma, expected):
+    assert _clean_amount(value, decimal_comma) == expected
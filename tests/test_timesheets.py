@@ -0,0 +1,58 @@
+import io
+from decimal import Decimal
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from blueprint.models import db, Project, TimeEntry
+from blueprint.timesheets import parse_hours, timesheet_entries, import_time_csv
+
+WEEK = date(2026, 3, 2)
+
+@pytest.mark.parametrize('value, expected', [
+    ('1.5', Decimal('1.50')),
+    ('1,5', Decimal('1.50')),
+    ('01:30:00', Decimal('1.50')),
+    ('2:45', Decimal('2.75')),
+    ('0:00:36', Decimal('0.01')),
+    ('-2', Decimal('-2.00')),
+])
+def test_parse_hours(value, expected):
+    assert parse_hours(value) == expected
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-Infinity', 'snan', 'abc', '1:xx', ''])
+def test_parse_hours_rejects(value):
+    with pytest.raises(ValueError):
+        parse_hours(value)
+
+PROJECTS = [SimpleNamespace(id=1, name='Acme'), SimpleNamespace(id=2, name='Globex')]
+
+def test_timesheet_entries_reads_the_grid():
+    form = {'hours-1-0': '1,5', 'hours-1-2': '02:15:00', 'hours-1-3': '0', 'hours-2-6': '3', 'description-1': ' Audit '}
+    assert timesheet_entries(form, PROJECTS, WEEK) == [
+        {'project_id': 1, 'date': date(2026, 3, 2), 'hours': Decimal('1.50'), 'description': 'Audit'},
+        {'project_id': 1, 'date': date(2026, 3, 4), 'hours': Decimal('2.25'), 'description': 'Audit'},
+        {'project_id': 2, 'date': date(2026, 3, 8), 'hours': Decimal('3.00'), 'description': None},
+    ]
+
+@pytest.mark.parametrize('value', ['nan', '-1', 'two'])
+def test_timesheet_entries_rejects_bad_cells(value):
+    with pytest.raises(ValueError):
+        timesheet_entries({'hours-1-0': '1', 'hours-2-1': value}, PROJECTS, WEEK)
+
+def test_timesheet_post_with_nan_is_refused(client):
+    project = Project(name='Acme', status='ACTIVE')
+    db.session.add(project)
+    db.session.commit()
+    response = client.post('/admin/budget/time-tracking/timesheet', data={'week': '2026-03-02', f'hours-{project.id}-0': 'nan'})
+    assert response.status_code == 302
+    assert TimeEntry.query.count() == 0
+
+def test_import_counts_nan_rows_as_unreadable(app):
+    project = Project(name='Acme', status='ACTIVE')
+    db.session.add(project)
+    db.session.commit()
+    data = b'Project,Date,Hours\nAcme,2026-03-02,1.5\nAcme,2026-03-03,nan\nAcme,2026-03-04,-1\nNobody,2026-03-04,2\n'
+    result = import_time_csv(io.BytesIO(data))
+    db.session.commit()
+    assert (result['imported'], result['hours'], result['unreadable']) == (1, Decimal('1.50'), 1)
+    assert dict(result['unmatched']) == {'Nobody': 1}
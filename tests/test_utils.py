@@ -0,0 +1,121 @@
+from decimal import Decimal
+from datetime import date
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import text
+from blueprint.models import db, Project, Transaction, TransactionAllocation
+from blueprint.utils import (split_amount, parse_split_weight, encode_ledger_cursor, decode_ledger_cursor,
+                             parse_ledger_filters, allocation_rows, allocate_transactions, ledger_query, ledger_page)
+
+def test_split_amount_equal_shares_add_up():
+    shares = split_amount(Decimal('100.00'), [1, 1, 1])
+    assert shares == [Decimal('33.33'), Decimal('33.33'), Decimal('33.34')]
+    assert sum(shares) == Decimal('100.00')
+
+def test_split_amount_weighted_and_negative_amount():
+    assert split_amount(Decimal('-90.00'), [2, 1]) == [Decimal('-60.00'), Decimal('-30.00')]
+
+def test_split_amount_all_zero_weights_split_equally():
+    assert split_amount(Decimal('10.00'), [0, 0]) == [Decimal('5.00'), Decimal('5.00')]
+
+@pytest.mark.parametrize('weights', [[2, -1], [1, 'NaN'], [1, 'Infinity']])
+def test_split_amount_rejects_bad_weights(weights):
+    with pytest.raises(ValueError):
+        split_amount(Decimal('100.00'), weights)
+
+@pytest.mark.parametrize('value, expected', [(None, Decimal('1')), ('', Decimal('1')), ('2.5', Decimal('2.5')), ('0', Decimal('0'))])
+def test_parse_split_weight(value, expected):
+    assert parse_split_weight(value) == expected
+
+@pytest.mark.parametrize('value', ['-1', 'nan', 'inf', 'abc'])
+def test_parse_split_weight_rejects(value):
+    with pytest.raises(ValueError):
+        parse_split_weight(value)
+
+def test_ledger_cursor_round_trip():
+    cursor = encode_ledger_cursor(SimpleNamespace(date=date(2026, 2, 3), id=42))
+    assert cursor == '2026-02-03:42'
+    assert decode_ledger_cursor(cursor) == (date(2026, 2, 3), 42)
+
+@pytest.mark.parametrize('value', [None, '', '2026-02-03', '2026-02-30:1', '2026-02-03:x', 'a:b:c'])
+def test_ledger_cursor_rejects_malformed(value):
+    assert decode_ledger_cursor(value) is None
+
+def test_parse_ledger_filters_ignores_malformed_values():
+    filters = parse_ledger_filters({
+        'start': '2026-01-01', 'end': 'soon', 'category': 'Nope', 'pass_through': '1',
+        'project': '7', 'min_amount': '-12.345', 'max_amount': 'NaN'
+    })
+    assert filters == {'start': date(2026, 1, 1), 'pass_through': True, 'project': 7, 'min_amount': Decimal('12.34')}
+
+def _project_ledger(days):
+    """Two projects; every `days` entry goes to the first, every other one also to the second."""
+    first, second = Project(name='First'), Project(name='Second')
+    db.session.add_all([first, second])
+    db.session.flush()
+    for i, day in enumerate(days):
+        t = Transaction(date=day, description=f'Entry {i}', amount=Decimal('-10.00'), category='Other')
+        db.session.add(t)
+        db.session.flush()
+        allocate_transactions(allocation_rows(t.id, t.date, t.amount, [first.id] + ([second.id] if i % 2 else [])))
+    db.session.commit()
+    return first, second
+
+def _all_pages(**kwargs):
+    seen, cursor = [], None
+    while True:
+        rows, next_cursor = ledger_page(cursor=cursor, limit=3, **kwargs)
+        seen += [t.id for t in rows]
+        if next_cursor is None:
+            return seen
+        cursor = decode_ledger_cursor(next_cursor)
+
+def _plan(query):
+    compiled = query.compile(db.engine, compile_kwargs={'literal_binds': True})
+    return ' '.join(row[-1] for row in db.session.execute(text(f'EXPLAIN QUERY PLAN {compiled}')))
+
+def test_project_ledger_pages_follow_date_then_id(app):
+    days = [date(2026, 1, d) for d in (5, 2, 5, 9, 2, 5, 1, 9)]
+    first, second = _project_ledger(days)
+    newest_first = Transaction.query.order_by(Transaction.date.desc(), Transaction.id.desc()).all()
+    assert _all_pages(project_id=first.id) == [t.id for t in newest_first]
+    assert _all_pages(project_id=second.id) == [t.id for t in newest_first if int(t.description.split()[1]) % 2]
+
+def test_project_ledger_page_reads_the_allocation_index(app):
+    _project_ledger([date(2026, 1, 1)])
+    plan = _plan(ledger_query(cursor=(date(2026, 1, 1), 5), project_id=1))
+    assert 'ix_transaction_allocations_project_date' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def test_project_filter_pages_match_project_pages(app):
+    first, second = _project_ledger([date(2026, 1, d) for d in (3, 8, 3, 20, 8, 14, 1)])
+    assert _all_pages(filters={'project': second.id}) == _all_pages(project_id=second.id)
+    in_range = _all_pages(filters={'project': first.id, 'start': date(2026, 1, 3), 'end': date(2026, 1, 14)})
+    assert in_range == [t.id for t in Transaction.query.filter(Transaction.date.between(date(2026, 1, 3), date(2026, 1, 14)))
+                        .order_by(Transaction.date.desc(), Transaction.id.desc())]
+
+def test_project_filter_with_range_reads_the_allocation_index(app):
+    _project_ledger([date(2026, 1, 1)])
+    plan = _plan(ledger_query({'project': 1, 'start': date(2026, 1, 1), 'end': date(2026, 1, 31)}))
+    assert 'ix_transaction_allocations_project_date (project_id=? AND date>? AND date<?)' in plan
+    assert 'TEMP B-TREE' not in plan
+
+def allocations():
+    db.session.expire_all()
+    return sorted((a.transaction_id, a.project_id, a.weight, a.amount, a.date) for a in TransactionAllocation.query)
+
+def test_allocations_match_their_rebuild(app, ledger):
+    projects = [Project(name=name) for name in ('A', 'B', 'C')]
+    db.session.add_all(projects)
+    db.session.commit()
+    a, b, c = (p.id for p in projects)
+    # Listed out of id order, with a remainder cent to place
+    ledger.add('Three ways', '100', project_ids=[c, a, b])
+    ledger.add('Weighted', '1000', category='Income', project_ids=[a, b], **{f'weight_{b}': '3'})
+    ledger.delete(ledger.add('Gone', '10', project_ids=[a]))
+    ledger.import_csv(['2026-03-04,Hosting,-20.01'], project_ids=[b, a])
+
+    kept = allocations()
+    assert len(kept) == 7
+    assert app.test_cli_runner().invoke(args=['budget', 'rebuild-allocations']).exit_code == 0
+    assert allocations() == kept